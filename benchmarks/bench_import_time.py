@@ -0,0 +1,78 @@
+"""
+Import-time benchmark for the pw_bdt modules.
+
+Every module is imported in a fresh interpreter, as a worker process would,
+and the wall time of the import is reported together with the heavy
+libraries (matplotlib, pymc, arviz, ...) it pulled in.
+
+    python benchmarks/bench_import_time.py --repeats 10
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import pandas as pd
+from pathlib import Path
+
+MODULES = [
+    'pw_bdt',
+    'pw_bdt.helpers.utils',
+    'pw_bdt.trial_store',
+    'pw_bdt.sensitivity_fits',
+    'pw_bdt.meta_d_mle',
+    'pw_bdt.bootstrap',
+    'pw_bdt.precision_weighted_fits',
+    'pw_bdt.posterior_summary',
+    'pw_bdt.hierarchical_bayesian_model',
+    'pw_bdt.compare_dprime_empirical_fits',
+    'pw_bdt.batch',
+]
+
+HEAVY = ['matplotlib', 'pymc', 'pytensor', 'arviz', 'xarray', 'scipy.stats']
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'import_s': elapsed, 'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_time(module, repeats=5):
+    """
+    Median import time of `module` over fresh interpreters, and the heavy modules it loaded.
+    """
+    times, heavy = [], []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY)],
+                             capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result['import_s'])
+        heavy = result['heavy']
+    return {'module': module, 'median_s': statistics.median(times), 'min_s': min(times),
+            'max_s': max(times), 'heavy_imports': ' '.join(heavy)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--modules', nargs='*', default=MODULES)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', type=Path, default=Path(__file__).resolve().parent / "results" / "import_time.csv")
+    args = parser.parse_args()
+
+    rows = []
+    for module in args.modules:
+        row = import_time(module, repeats=args.repeats)
+        print(json.dumps(row))
+        rows.append(row)
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print("Saved benchmark results to", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Benchmark of every stage of the analysis pipeline at several data scales.
+
+Synthetic cohorts (pw_bdt.simulate) of increasing size go through the
+CSV load, warm-up trimming, per-group d′/meta-d′, the hierarchical model
+build and sampling, the posterior summaries and the comparison scripts
+(against the simulation's ground truth); the comparison scripts also run
+on the bundled data. Every stage can have several engines: each is timed
+(best of --repeats runs), its peak traced memory is taken in a separate
+run under tracemalloc, and its output is checked against the first
+engine of the stage. Sampling stages run once and untraced: tracemalloc
+slows NUTS down about tenfold and does not see the chain processes.
+
+The groupby_apply / per_group_apply engines are the pandas routes of the
+baseline sensitivity_fits, kept here as the reference for the speedups.
+
+    python benchmarks/bench_pipeline.py --sizes 10 100 1000 --baseline results/pipeline_old.csv
+"""
+import argparse
+import json
+import shutil
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy.stats import norm
+from pw_bdt.sensitivity_fits import (
+    build_count_tensor, discard_warmup_trials, dprime_from_counts, meta_dprime_from_counts, store_count_tensor,
+    stream_count_tensor)
+from pw_bdt.simulate import random_cohort, session_table, write_simulation
+from pw_bdt.trial_store import TRIAL_SCHEMA, TrialStore, ingest_csv
+
+ROOT = Path(__file__).resolve().parent.parent
+LOCKE_DIR = ROOT / "data" / "locke"
+KEYS = ['subject', 'session']
+
+# Stages that sample: too slow to repeat or to trace, and their output is random
+SAMPLING_STAGES = {'hierarchical_sample'}
+
+
+def measure(fn, repeats=3, trace_memory=True):
+    """
+    Result of fn(), best wall time over `repeats` runs and peak traced memory (MB)
+    of one more run (None without trace_memory).
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    if not trace_memory:
+        return result, min(times), None
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, min(times), peak
+
+
+def max_abs_diff(result, reference):
+    """
+    Largest absolute difference between two results (frames are aligned on their
+    common numeric columns), or inf if their shapes differ.
+    """
+    if isinstance(reference, pd.DataFrame):
+        cols = [c for c in reference.columns if c in result.columns and reference[c].dtype.kind in 'biuf']
+        result, reference = result[cols].to_numpy(dtype=float), reference[cols].to_numpy(dtype=float)
+    result, reference = np.asarray(result, dtype=float), np.asarray(reference, dtype=float)
+    if result.shape != reference.shape:
+        return np.inf
+    return float(np.nanmax(np.abs(result - reference), initial=0.0))
+
+
+def _table(groups, counts):
+    return groups.assign(d_prime=dprime_from_counts(counts), meta_d_prime=meta_dprime_from_counts(counts))
+
+
+def _baseline_z_transform(p, n, correction=0.5):
+    # helpers.utils.z_transform of the baseline: scalar, one norm.ppf call per rate
+    if p == 1.0:
+        p = (n - correction) / n
+    elif p == 0.0:
+        p = correction / n
+    return norm.ppf(p)
+
+
+def _baseline_dprime(group):
+    stim, resp = group['stimulus'], group['r1']
+    hits = ((stim == 1) & (resp == 1)).sum()
+    n_signal = (stim == 1).sum()
+    false_alarms = ((stim == 0) & (resp == 1)).sum()
+    n_noise = (stim == 0).sum()
+    p_hit = hits / n_signal if n_signal > 0 else 0.5
+    p_fa = false_alarms / n_noise if n_noise > 0 else 0.5
+    return _baseline_z_transform(p_hit, n_signal) - _baseline_z_transform(p_fa, n_noise)
+
+
+def _baseline_meta_dprime(group):
+    stim, resp, conf = group['stimulus'], group['r1'], group['r2']
+    z = []
+    for s, r in ((0, 0), (1, 0), (0, 1), (1, 1)):      # CR (A), Miss (B), FA (C), Hit (D)
+        n = ((stim == s) & (resp == r)).sum()
+        high = ((stim == s) & (resp == r) & (conf == 1)).sum()
+        z.append(_baseline_z_transform(high / n if n > 0 else 0.5, n))
+    z_high_CR, z_high_M, z_high_FA, z_high_H = z
+    return 0.5 * ((z_high_CR - z_high_M) + (z_high_H - z_high_FA))
+
+
+def _groupby_apply_warmup(df, warmup_count):
+    # the baseline discard_warmup_trials: one iloc slice per group
+    return df.groupby(KEYS, group_keys=False).apply(lambda g: g.iloc[warmup_count:])
+
+
+def _per_group_apply(df):
+    # the baseline per-group route: one pandas apply over the groups, scalar statistics per group
+    return df.groupby(KEYS).apply(lambda g: pd.Series({
+        'd_prime': _baseline_dprime(g),
+        'meta_d_prime': _baseline_meta_dprime(g),
+    })).reset_index()
+
+
+def pipeline_stages(csv_path, warmup_count, hierarchical, summaries):
+    """
+    (stage, {engine: callable}) pairs for one dataset, in pipeline order.
+
+    Callables take the results of the earlier stages (a dict keyed by stage)
+    so that every stage times only its own work.
+    """
+    store_path = csv_path.with_suffix('.store')
+    stages = [
+        ('csv_load', {
+            'pandas_read_csv': lambda r: pd.read_csv(csv_path, dtype=TRIAL_SCHEMA),
+            'store_ingest': lambda r: ingest_csv(csv_path, store_path).load(),
+            'store_load': lambda r: TrialStore(store_path).load(),
+        }),
+        ('discard_warmup', {
+            'by_position': lambda r: discard_warmup_trials(r['csv_load'], warmup_count).reset_index(drop=True),
+            'by_trial': lambda r: discard_warmup_trials(r['csv_load'], warmup_count, by='trial').reset_index(drop=True),
+            'groupby_apply': lambda r: _groupby_apply_warmup(r['csv_load'], warmup_count).reset_index(drop=True),
+        }),
+        ('sensitivity', {
+            'count_tensor': lambda r: _table(*build_count_tensor(r['discard_warmup'])),
+            'per_group_apply': lambda r: _per_group_apply(r['discard_warmup']),
+            'store': lambda r: _table(*store_count_tensor(TrialStore(store_path), warmup_count)),
+            'streaming_csv': lambda r: _table(*stream_count_tensor(csv_path, warmup_count=warmup_count)),
+        }),
+    ]
+    if hierarchical:
+        from pw_bdt.hierarchical_bayesian_model import build_model, sample_model
+
+        def sensitivity_input(r):
+            df = r['sensitivity'].copy()
+            subjects = sorted(df['subject'].unique())
+            df['subject_idx'] = df['subject'].map({s: i for i, s in enumerate(subjects)})
+            return df, len(subjects)
+
+        def logp_at_initial_point(model):
+            return model.compile_logp()(model.initial_point())
+
+        stages += [
+            ('hierarchical_build', {
+                variant: (lambda r, likelihood=variant: logp_at_initial_point(
+                    build_model(*sensitivity_input(r), likelihood=likelihood)))
+                for variant in ('observations', 'sufficient')
+            }),
+            ('hierarchical_sample', {
+                'nuts_sufficient': lambda r: sample_model(
+                    build_model(*sensitivity_input(r), likelihood='sufficient'), progressbar=False,
+                    compute_convergence_checks=False, **hierarchical),
+            }),
+        ]
+        if summaries:
+            import arviz as az
+            from pw_bdt.posterior_summary import summarize_posterior
+            var_names = ['d_subj', 'meta_d_subj', 'sigma_subj']
+
+            def az_summary(trace):
+                summary = az.summary(trace, var_names=var_names, hdi_prob=0.95, kind='stats', round_to='none')
+                return summary[['mean', 'hdi_2.5%', 'hdi_97.5%']].to_numpy()
+
+            def chunked_summary(trace):
+                stats = summarize_posterior(trace, var_names, hdi_prob=0.95)
+                return np.concatenate([np.column_stack(stats[v]) for v in var_names])
+
+            stages.append(('posterior_summary', {
+                'az_summary': lambda r: az_summary(r['hierarchical_sample']),
+                'chunked': lambda r: chunked_summary(r['hierarchical_sample']),
+            }))
+    return stages
+
+
+def comparison_stages(session_path, locke_raw_path, fit_path=None, locke_fit_path=None, n_sessions=70,
+                      n_subjects=10):
+    """
+    The empirical (and, given fit paths, hierarchical) comparison scripts on one set of input files.
+    """
+    from pw_bdt.compare_dprime_empirical_fits import compare_empirical_fits
+    from pw_bdt.compare_dprime_hierarchical_fits import compare_hierarchical_fits
+    stages = [
+        ('compare_empirical', {'compare_empirical_fits': lambda r: np.ravel(list(compare_empirical_fits(
+            session_path, locke_raw_path, n_expected=n_sessions)[1].values()))}),
+    ]
+    if fit_path is not None:
+        stages.append(
+            ('compare_hierarchical', {'compare_hierarchical_fits': lambda r: np.ravel(list(compare_hierarchical_fits(
+                fit_path, locke_fit_path, n_expected=n_subjects)[1].values()))}))
+    return stages
+
+
+def write_comparison_inputs(prefix, sessions, results):
+    """
+    Comparison-script inputs for a synthetic dataset: our estimates from the
+    pipeline results, and the simulation's ground truth in Locke's layouts.
+    Returns the keyword arguments of comparison_stages.
+    """
+    session_path = prefix.with_name(prefix.name + '_session.csv')
+    results['sensitivity'].to_csv(session_path, index=False)
+    locke_raw_path = prefix.with_name(prefix.name + '_truth_rawData.txt')
+    sessions.rename(columns={'subject': 'sidx', 'd_prime': 'dPrime', 'meta_d_prime': 'metadPrime'}).assign(
+        sID=lambda d: d['sidx'])[['sID', 'sidx', 'dPrime', 'metadPrime']].to_csv(locke_raw_path, sep=' ', index=False)
+    kwargs = {'session_path': session_path, 'locke_raw_path': locke_raw_path, 'n_sessions': len(sessions),
+              'n_subjects': sessions['subject'].nunique()}
+
+    if 'hierarchical_sample' in results:
+        from pw_bdt.hierarchical_bayesian_model import summarize_trace
+        subjects = sorted(sessions['subject'].unique())
+        kwargs['fit_path'] = prefix.with_name(prefix.name + '_fitData.txt')
+        summarize_trace(results['hierarchical_sample'], subjects)[0].to_csv(kwargs['fit_path'], sep='\t', index=False)
+        kwargs['locke_fit_path'] = prefix.with_name(prefix.name + '_truth_fitData.txt')
+        truth = sessions.groupby('subject')[['d_prime', 'meta_d_prime']].mean().reset_index()
+        truth.rename(columns={'subject': 'sID', 'd_prime': 'muEst', 'meta_d_prime': 'mu2Est'}).to_csv(
+            kwargs['locke_fit_path'], sep=' ', index=False)
+    return kwargs
+
+
+def run_stages(dataset, stages, repeats, tolerance, info, results=None):
+    """
+    Time every engine of every stage; later stages get the first engine's results,
+    which are collected in `results` (a dict keyed by stage).
+    """
+    rows = []
+    results = {} if results is None else results
+    for stage, engines in stages:
+        reference = None
+        for engine, fn in engines.items():
+            sampling = stage in SAMPLING_STAGES
+            result, wall_s, peak_mb = measure(lambda: fn(results), repeats=1 if sampling else repeats,
+                                              trace_memory=not sampling)
+            row = {'dataset': dataset, **info, 'stage': stage, 'engine': engine, 'wall_s': wall_s,
+                   'peak_mb': peak_mb, 'rows_out': len(result) if isinstance(result, pd.DataFrame) else None}
+            if reference is None:
+                reference = result
+                results[stage] = result
+            elif not sampling:
+                row['max_abs_diff'] = max_abs_diff(result, reference)
+                row['equivalent'] = row['max_abs_diff'] <= tolerance
+            print(json.dumps(row, default=str))
+            rows.append(row)
+    return rows
+
+
+def compare_to_baseline(results, baseline_path, threshold):
+    """
+    Ratio of every (dataset, stage, engine) wall time to a previous run; flags slowdowns above threshold.
+    """
+    baseline = pd.read_csv(baseline_path)
+    keys = ['dataset', 'stage', 'engine']
+    merged = results.merge(baseline[keys + ['wall_s']], on=keys, suffixes=('', '_baseline'))
+    merged['ratio'] = merged['wall_s'] / merged['wall_s_baseline']
+    merged['regression'] = merged['ratio'] > threshold
+    return merged[keys + ['wall_s_baseline', 'wall_s', 'ratio', 'regression']]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10, 100, 1000], help="synthetic subjects")
+    parser.add_argument('--trials', type=int, default=700, help="trials per session")
+    parser.add_argument('--warmup', type=int, default=100)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=1e-9, help="max abs difference between engines")
+    parser.add_argument('--hierarchical-max-subjects', type=int, default=1000,
+                        help="skip the hierarchical stages above this many subjects")
+    parser.add_argument('--draws', type=int, default=500)
+    parser.add_argument('--tune', type=int, default=500)
+    parser.add_argument('--chains', type=int, default=2)
+    parser.add_argument('--cores', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', type=Path, default=None, help="earlier results CSV to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25, help="slowdown ratio reported as a regression")
+    parser.add_argument('--output', type=Path, default=Path(__file__).resolve().parent / "results" / "pipeline.csv")
+    args = parser.parse_args()
+
+    rows = []
+    workdir = Path(tempfile.mkdtemp(prefix='pw_bdt_bench_'))
+    try:
+        for n in args.sizes:
+            csv_path = workdir / f"synthetic_{n}.csv"
+            sessions = session_table(random_cohort(n, seed=args.seed), n_trials=args.trials)
+            start = time.perf_counter()
+            n_trials = write_simulation(sessions, csv_path=csv_path, seed=args.seed)
+            info = {'n_subjects': n, 'n_trials': n_trials}
+            rows.append({'dataset': f'synthetic_{n}', **info, 'stage': 'simulate', 'engine': 'write_csv',
+                         'wall_s': time.perf_counter() - start})
+
+            hierarchical = None
+            if n <= args.hierarchical_max_subjects:
+                hierarchical = dict(draws=args.draws, tune=args.tune, chains=args.chains, cores=args.cores,
+                                    random_seed=args.seed)
+            stages = pipeline_stages(csv_path, args.warmup, hierarchical, summaries=True)
+            results = {}
+            rows += run_stages(f'synthetic_{n}', stages, args.repeats, args.tolerance, info, results)
+            comparison = comparison_stages(**write_comparison_inputs(workdir / f"synthetic_{n}", sessions, results))
+            rows += run_stages(f'synthetic_{n}', comparison, args.repeats, args.tolerance, info)
+        bundled = comparison_stages(ROOT / "data" / "sensitivity_per_subject_per_session.csv",
+                                    LOCKE_DIR / "fit_dPrime_hierarchicalBayes_rawData.txt",
+                                    LOCKE_DIR / "my_fit_dPrime_hierarchicalBayes_fitData.txt",
+                                    LOCKE_DIR / "fit_dPrime_hierarchicalBayes_fitData2.txt")
+        rows += run_stages('bundled', bundled, args.repeats, args.tolerance, {})
+    finally:
+        shutil.rmtree(workdir)
+
+    results = pd.DataFrame(rows)
+    print(results.to_string(index=False))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print("Saved benchmark results to", args.output)
+
+    failed = results[results.get('equivalent', pd.Series(dtype=object)) == False]  # noqa: E712
+    if len(failed):
+        print("Engines that disagree with their stage's reference:")
+        print(failed[['dataset', 'stage', 'engine', 'max_abs_diff']].to_string(index=False))
+    if args.baseline is not None:
+        comparison = compare_to_baseline(results, args.baseline, args.threshold)
+        print(comparison.to_string(index=False))
+        if comparison['regression'].any():
+            print(f"{comparison['regression'].sum()} stage(s) slower than {args.threshold}x the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark of the CSV writers for simulated trials.
+
+One chunk of simulate_trials is formatted by pw_bdt.simulate.csv_bytes,
+DataFrame.to_csv and np.savetxt; every writer is timed (best of --repeats
+runs) and its text is parsed back and checked against the chunk.
+
+    python benchmarks/bench_simulate_csv.py --rows 1000000
+"""
+import argparse
+import io
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pw_bdt.simulate import csv_bytes, random_cohort, session_table, simulate_trials
+from pw_bdt.trial_store import TRIAL_SCHEMA
+
+FORMATS = ['%d', '%d', '%.4f', '%.4f', '%d', '%d', '%d', '%d', '%.4f', '%.4f']
+
+
+def to_csv_bytes(chunk):
+    return pd.DataFrame(chunk).to_csv(header=False, index=False, float_format='%.4f').encode()
+
+
+def savetxt_bytes(chunk):
+    f = io.BytesIO()
+    np.savetxt(f, np.column_stack([chunk[name] for name in TRIAL_SCHEMA]), fmt=FORMATS, delimiter=',')
+    return f.getvalue()
+
+
+WRITERS = {'csv_bytes': csv_bytes, 'to_csv': to_csv_bytes, 'savetxt': savetxt_bytes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000, help="trials in the chunk")
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--output', type=Path,
+                        default=Path(__file__).resolve().parent / "results" / "simulate_csv.csv")
+    args = parser.parse_args()
+
+    sessions = session_table(random_cohort(-(-args.rows // 4900)), n_trials=700)
+    chunk = next(simulate_trials(sessions, chunk_size=args.rows))
+    expected = pd.DataFrame(chunk).astype(float)
+
+    rows = []
+    for name, writer in WRITERS.items():
+        times = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            text = writer(chunk)
+            times.append(time.perf_counter() - start)
+        parsed = pd.read_csv(io.BytesIO(text), header=None, names=list(TRIAL_SCHEMA), dtype=TRIAL_SCHEMA)
+        rows.append({'writer': name, 'rows': len(expected), 'best_s': min(times),
+                     'rows_per_s': len(expected) / min(times),
+                     'max_abs_diff': float(np.abs(parsed.astype(float) - expected).max().max())})
+        print(rows[-1])
+
+    results = pd.DataFrame(rows)
+    results['relative_time'] = results['best_s'] / results.loc[results['writer'] == 'csv_bytes', 'best_s'].iloc[0]
+    print(results.to_string(index=False))
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print("Saved benchmark results to", args.output)
+
+
+if __name__ == "__main__":
+    main()
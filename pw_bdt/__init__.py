@@ -1 +1,64 @@
 __version__ = '0.1.0'
+
+import importlib
+
+# Public functions and the modules defining them. They are imported on first
+# access, so `import pw_bdt` stays cheap and pymc/arviz/matplotlib are only
+# loaded by the functions that sample or plot.
+_API = {
+    # loading
+    'load_trials': 'pw_bdt.trial_store',
+    'open_store': 'pw_bdt.trial_store',
+    'describe_trials': 'pw_bdt.preprocessing',
+    # trimming
+    'warmup_mask': 'pw_bdt.sensitivity_fits',
+    'discard_warmup_trials': 'pw_bdt.sensitivity_fits',
+    # sensitivity
+    'build_count_tensor': 'pw_bdt.sensitivity_fits',
+    'dprime_from_counts': 'pw_bdt.sensitivity_fits',
+    'meta_dprime_from_counts': 'pw_bdt.sensitivity_fits',
+    'sensitivity_table': 'pw_bdt.sensitivity_fits',
+    'run_sensitivity': 'pw_bdt.sensitivity_fits',
+    'sweep_sensitivity': 'pw_bdt.sensitivity_sweep',
+    'fit_meta_dprime_mle': 'pw_bdt.meta_d_mle',
+    'bootstrap_sensitivity': 'pw_bdt.bootstrap',
+    'rt_count_tensor': 'pw_bdt.rt_sensitivity',
+    'rt_sensitivity_table': 'pw_bdt.rt_sensitivity',
+    'run_rt_sensitivity': 'pw_bdt.rt_sensitivity',
+    # hierarchical fitting
+    'load_sensitivity': 'pw_bdt.hierarchical_bayesian_model',
+    'build_model': 'pw_bdt.hierarchical_bayesian_model',
+    'fit_model': 'pw_bdt.hierarchical_bayesian_model',
+    'summarize_trace': 'pw_bdt.hierarchical_bayesian_model',
+    'run_hierarchical': 'pw_bdt.hierarchical_bayesian_model',
+    'HierarchicalFitter': 'pw_bdt.hierarchical_fitter',
+    'build_joint_model': 'pw_bdt.joint_hierarchical_model',
+    'run_joint': 'pw_bdt.joint_hierarchical_model',
+    # simulation
+    'random_cohort': 'pw_bdt.simulate',
+    'session_table': 'pw_bdt.simulate',
+    'simulate_trials': 'pw_bdt.simulate',
+    'write_simulation': 'pw_bdt.simulate',
+    # profiling
+    'instrument': 'pw_bdt.instrumentation',
+    'sampler_stats': 'pw_bdt.instrumentation',
+    # comparison
+    'compare_empirical_fits': 'pw_bdt.compare_dprime_empirical_fits',
+    'compare_hierarchical_fits': 'pw_bdt.compare_dprime_hierarchical_fits',
+    'compare_models': 'pw_bdt.model_comparison',
+    'run_comparison': 'pw_bdt.model_comparison',
+}
+
+__all__ = list(_API)
+
+
+def __getattr__(name):
+    if name in _API:
+        value = getattr(importlib.import_module(_API[name]), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
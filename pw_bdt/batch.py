@@ -0,0 +1,249 @@
+"""
+Batch runner for many cohorts and analysis variants.
+
+A manifest lists the jobs; each job names a kind (one of JOB_KINDS) and
+the keyword arguments of its run function, e.g.
+
+    {
+      "defaults": {"hierarchical": {"draws": 2000, "tune": 2000, "chains": 4}},
+      "jobs": [
+        {"name": "cohortA_w100", "kind": "sensitivity", "data_path": "cohortA/rawChoiceData.txt",
+         "save_path_session": "out/A_w100_session.csv", "save_path_subject": "out/A_w100_subject.csv",
+         "warmup_count": 100, "correction": 0.5},
+        {"name": "cohortA_w100_hb", "kind": "hierarchical", "data_path": "out/A_w100_session.csv",
+         "fit_path": "out/A_w100_fitData.txt", "population_path": "out/A_w100_population.txt",
+         "prior_mce": 0.8}
+      ]
+    }
+
+Relative paths are resolved against the manifest's directory. A job whose
+input is another job's output waits for it. Jobs run in a process pool,
+one fresh worker process per job, and the CPUs are split between the
+workers so that concurrent NUTS runs and bootstraps do not oversubscribe
+them. A job is skipped when its outputs are newer than its inputs and were
+produced with the same settings. Every job appends a timing/resource
+record to a JSON lines log.
+
+    python -m pw_bdt.batch manifest.json --max-workers 4
+"""
+import argparse
+import importlib
+import json
+import os
+import resource
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from pathlib import Path
+from pw_bdt.trace_cache import hash_spec
+
+JOB_KINDS = {
+    'sensitivity': {'run': 'pw_bdt.sensitivity_fits:run_sensitivity', 'inputs': ('data_path',),
+                    'outputs': ('save_path_session', 'save_path_subject')},
+    'hierarchical': {'run': 'pw_bdt.hierarchical_bayesian_model:run_hierarchical', 'inputs': ('data_path',),
+                     'outputs': ('fit_path', 'population_path', 'trace_path')},
+}
+
+PATH_KEYS = {'data_path', 'save_path_session', 'save_path_subject', 'state_path', 'fit_path', 'population_path',
+             'trace_path', 'reference_path', 'calibration_path', 'cache_dir'}
+
+# Settings that change how a job runs but not what it produces
+SCHEDULING_KEYS = {'cores', 'max_workers'}
+
+
+def load_manifest(manifest_path):
+    """
+    Jobs of a manifest file, with defaults applied and paths made absolute.
+    """
+    manifest_path = Path(manifest_path).resolve()
+    manifest = json.loads(manifest_path.read_text())
+    defaults = manifest.get('defaults', {})
+
+    jobs, names = [], set()
+    for entry in manifest['jobs']:
+        if entry.get('kind') not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {entry.get('kind')!r}")
+        if entry['name'] in names:
+            raise ValueError(f"Duplicate job name: {entry['name']!r}")
+        names.add(entry['name'])
+        params = {**defaults.get(entry['kind'], {}), **entry}
+        name, kind = params.pop('name'), params.pop('kind')
+        for key in PATH_KEYS & params.keys():
+            if params[key] is not None:
+                params[key] = str(manifest_path.parent / params[key])
+        jobs.append({'name': name, 'kind': kind, 'params': params})
+    return jobs
+
+
+def job_paths(job, role):
+    """
+    Input or output paths (role='inputs' / 'outputs') of a job.
+    """
+    return [Path(job['params'][key]) for key in JOB_KINDS[job['kind']][role] if job['params'].get(key)]
+
+
+def job_spec_hash(job):
+    settings = {k: v for k, v in job['params'].items() if k not in SCHEDULING_KEYS}
+    return hash_spec(job['kind'], settings)
+
+
+def _stamp_path(stamp_dir, job):
+    return Path(stamp_dir) / f"{job['name']}.json"
+
+
+def is_up_to_date(job, stamp_dir):
+    """
+    Whether all outputs exist, are newer than every input, and were written
+    by a run with the same settings.
+    """
+    stamp = _stamp_path(stamp_dir, job)
+    outputs = job_paths(job, 'outputs')
+    if not stamp.exists() or not all(p.exists() for p in outputs):
+        return False
+    if json.loads(stamp.read_text()).get('spec') != job_spec_hash(job):
+        return False
+    inputs = job_paths(job, 'inputs')
+    if not all(p.exists() for p in inputs):
+        return False
+    newest_input = max((p.stat().st_mtime for p in inputs), default=0)
+    return min(p.stat().st_mtime for p in outputs) >= newest_input
+
+
+def dependencies(jobs):
+    """
+    For every job name, the names of the jobs that produce its inputs.
+    """
+    producers = {p: job['name'] for job in jobs for p in job_paths(job, 'outputs')}
+    return {job['name']: {producers[p] for p in job_paths(job, 'inputs') if p in producers} - {job['name']}
+            for job in jobs}
+
+
+def split_cores(n_jobs, max_workers=None, total_cores=None):
+    """
+    Number of concurrent workers and the CPUs each of them may use.
+    """
+    total_cores = total_cores or os.cpu_count() or 1
+    n_workers = max(1, min(n_jobs, max_workers or total_cores))
+    return n_workers, max(1, total_cores // n_workers)
+
+
+def _usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu_s = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 / 1024 ** 2 if sys.platform == 'darwin' else 1 / 1024
+    return cpu_s, max(own.ru_maxrss, children.ru_maxrss) * scale
+
+
+def run_job(job):
+    """
+    Run one job in the current process and return its log record.
+    """
+    module_name, func_name = JOB_KINDS[job['kind']]['run'].split(':')
+    record = {'name': job['name'], 'kind': job['kind'], 'pid': os.getpid(),
+              'started_at': datetime.now(timezone.utc).isoformat(),
+              'cores': job['params'].get('cores', job['params'].get('max_workers'))}
+    cpu_before, _ = _usage()
+    start = time.perf_counter()
+    try:
+        run = getattr(importlib.import_module(module_name), func_name)
+        run(**job['params'])
+        record['status'] = 'done'
+    except Exception:
+        record['status'] = 'failed'
+        record['error'] = traceback.format_exc()
+    record['wall_s'] = time.perf_counter() - start
+    cpu_after, max_rss_mb = _usage()
+    record['cpu_s'] = cpu_after - cpu_before
+    record['max_rss_mb'] = max_rss_mb
+    return record
+
+
+def run_batch(jobs, stamp_dir, log_path, max_workers=None, total_cores=None, force=False):
+    """
+    Run the jobs of a manifest across a process pool, in dependency order.
+
+    Returns the log records of all jobs, including the skipped ones.
+    """
+    stamp_dir = Path(stamp_dir)
+    stamp_dir.mkdir(parents=True, exist_ok=True)
+    n_workers, cores_per_worker = split_cores(len(jobs), max_workers, total_cores)
+    for job in jobs:
+        if job['kind'] == 'hierarchical':
+            # NUTS runs one process per chain; give it at most this worker's share of the CPUs
+            job['params'].setdefault('cores', min(job['params'].get('chains', 4), cores_per_worker))
+        elif job['kind'] == 'sensitivity':
+            # with n_boot, the bootstrap runs its own process pool; keep it to the same share
+            job['params'].setdefault('max_workers', cores_per_worker)
+
+    by_name = {job['name']: job for job in jobs}
+    waiting_on = dependencies(jobs)
+    rerun, failed, records = set(), set(), []
+
+    def log(record):
+        records.append(record)
+        with open(log_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        print(f"[{record['status']}] {record['name']}" +
+              (f" ({record['wall_s']:.1f}s, {record['max_rss_mb']:.0f} MB)" if 'wall_s' in record else ''))
+
+    # max_tasks_per_child gives every job a fresh process, so its peak memory is its own
+    pool_kwargs = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=n_workers, **pool_kwargs) as pool:
+        running = {}
+        pending = list(jobs)
+        while pending or running:
+            ready = [j for j in pending if not waiting_on[j['name']] - {r['name'] for r in records}]
+            if not ready and not running:
+                raise ValueError(f"Circular dependencies between jobs: {[j['name'] for j in pending]}")
+            for job in ready:
+                pending.remove(job)
+                deps = waiting_on[job['name']]
+                if deps & failed:
+                    failed.add(job['name'])
+                    log({'name': job['name'], 'kind': job['kind'], 'status': 'blocked',
+                         'error': f"failed dependencies: {sorted(deps & failed)}"})
+                elif not force and not (deps & rerun) and is_up_to_date(job, stamp_dir):
+                    log({'name': job['name'], 'kind': job['kind'], 'status': 'up_to_date'})
+                else:
+                    running[pool.submit(run_job, job)] = job['name']
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                record = future.result()
+                if record['status'] == 'done':
+                    rerun.add(name)
+                    _stamp_path(stamp_dir, by_name[name]).write_text(
+                        json.dumps({'spec': job_spec_hash(by_name[name]), 'started_at': record['started_at']}))
+                else:
+                    failed.add(name)
+                log(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a manifest of sensitivity / hierarchical fitting jobs.")
+    parser.add_argument('manifest', type=Path)
+    parser.add_argument('--max-workers', type=int, default=None, help="concurrent jobs (default: one per CPU)")
+    parser.add_argument('--cores', type=int, default=None, help="CPUs to split between the jobs")
+    parser.add_argument('--log', type=Path, default=None, help="JSON lines log (default: next to the manifest)")
+    parser.add_argument('--force', action='store_true', help="rerun jobs that are up to date")
+    args = parser.parse_args()
+
+    manifest_dir = args.manifest.resolve().parent
+    jobs = load_manifest(args.manifest)
+    log_path = args.log or manifest_dir / 'batch_log.jsonl'
+    records = run_batch(jobs, manifest_dir / '.batch', log_path, max_workers=args.max_workers,
+                        total_cores=args.cores, force=args.force)
+    n_failed = sum(r['status'] in ('failed', 'blocked') for r in records)
+    print(f"{len(records) - n_failed}/{len(records)} jobs ok, log in {log_path}")
+    sys.exit(1 if n_failed else 0)
+
+
+if __name__ == "__main__":
+    main()
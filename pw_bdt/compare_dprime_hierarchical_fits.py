@@ -0,0 +1,61 @@
+import pandas as pd
+import numpy  as np
+from pathlib import Path
+from pw_bdt.compare_dprime_empirical_fits import plot_comparison, print_stats, quick_stats
+
+
+def load_my_fit(my_path):
+    """
+    Subject-level estimates written by hierarchical_bayesian_model (tab-separated).
+    """
+    df_my = pd.read_csv(my_path, sep="\t", skipinitialspace=True)
+    df_my.columns = df_my.columns.str.strip()
+    df_my = df_my.rename(columns={"sID":"sidx"})
+    return df_my[["sidx","muEst","mu2Est"]]
+
+
+def load_locke_fit(locke_path):
+    """
+    Locke's subject-level fits (whitespace-delimited), with subjects numbered 1..N in file order.
+    """
+    df_locke = pd.read_csv(
+        locke_path,
+        sep=r'\s+',               # splits on any run of spaces
+        skipinitialspace=True
+    )
+    df_locke.columns = df_locke.columns.str.strip()
+    df_locke["sidx"] = np.arange(1, len(df_locke)+1)
+    return df_locke[["sidx","muEst","mu2Est"]]
+
+
+def compare_hierarchical_fits(my_path, locke_path, n_expected=10):
+    """
+    Join our hierarchical fits with Locke's on subject.
+
+    Returns the joined frame and the quick_stats of d′ (muEst) and meta-d′ (mu2Est).
+    """
+    df = pd.merge(load_my_fit(my_path), load_locke_fit(locke_path), on="sidx", suffixes=("_my","_locke"))
+    if n_expected is not None:
+        assert len(df)==n_expected
+
+    stats = {"d′": quick_stats(df, "muEst_my", "muEst_locke"),
+             "meta-d′": quick_stats(df, "mu2Est_my", "mu2Est_locke")}
+    return df, stats
+
+
+def main():
+    # ── Paths ───────────────────────────────────────────────────────────────
+    root        = Path(__file__).resolve().parent.parent
+    my_path     = root / "data" / "locke" / "my_fit_dPrime_hierarchicalBayes_fitData.txt"
+    locke_path  = root / "data" / "locke" / "fit_dPrime_hierarchicalBayes_fitData2.txt"
+
+    df, stats = compare_hierarchical_fits(my_path, locke_path)
+    for label, s in stats.items():
+        print_stats(label, s)
+
+    plot_comparison(df, [("muEst_my",  "muEst_locke",  "d′"),
+                         ("mu2Est_my", "mu2Est_locke", "meta-d′")])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,2 +1,11 @@
 from .utils import *
-from .plots import *
\ No newline at end of file
+
+# Plotting pulls in matplotlib, so the plot functions are only imported on first use
+_PLOTS = ('plot_shrinkage', 'plot_dprime_per_sub_per_session')
+
+
+def __getattr__(name):
+    if name in _PLOTS:
+        from . import plots
+        return getattr(plots, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
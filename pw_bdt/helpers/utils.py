@@ -1,11 +1,54 @@
-from scipy.stats import norm
+from functools import lru_cache
+
+import numpy as np
+from scipy.special import ndtri
 
 def z_transform(p, n, correction=0.5):
     # Prevent z-transform from returning inf/-inf
     # Macmillan & Kaplan, 1985 correction:
     # Detection Theory Analysis of Group Data: Estimating Sensitivity From Average Hit and False-Alarm Rates
-    if p == 1.0:
-        p = (n - correction) / n
-    elif p == 0.0:
-        p = correction / n
-    return norm.ppf(p)
\ No newline at end of file
+    return z_transform_batch(p, n, correction)[()]
+
+
+def z_transform_batch(p, n, correction=0.5):
+    """
+    Array version of z_transform: rates of exactly 0 or 1 are replaced by
+    correction / n and (n - correction) / n before taking the inverse normal.
+    """
+    p = np.asarray(p, dtype=float)
+    n = np.asarray(n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p = np.where(p == 1.0, (n - correction) / n, p)
+        p = np.where(p == 0.0, correction / n, p)
+    return ndtri(p)
+
+
+@lru_cache(maxsize=1024)
+def _ppf_lookup(n, correction):
+    # z-scores of k / n for every k in 0..n; n == 0 is chance level (z = 0)
+    if n == 0:
+        table = np.zeros(1)
+    else:
+        table = z_transform_batch(np.arange(n + 1) / n, n, correction)
+    table.setflags(write=False)
+    return table
+
+
+def z_transform_counts(k, n, correction=0.5):
+    """
+    z-transform the rates k / n, falling back to chance (p = 0.5) where n == 0.
+
+    When trial counts repeat across groups (e.g. fixed-length sessions) the
+    z-scores are read from cached per-n lookup tables instead of calling
+    the inverse normal CDF again.
+    """
+    k, n = np.broadcast_arrays(np.asarray(k), np.asarray(n))
+    if np.ndim(correction) == 0:
+        n_values, inverse = np.unique(n, return_inverse=True)
+        if n.size and (n_values + 1).sum() <= n.size:
+            tables = [_ppf_lookup(int(v), float(correction)) for v in n_values]
+            offsets = np.cumsum([0] + [len(t) for t in tables[:-1]])
+            return np.concatenate(tables)[offsets[inverse.reshape(n.shape)] + k]
+
+    p = np.divide(k, n, out=np.full(n.shape, 0.5), where=n > 0)
+    return z_transform_batch(p, n, correction)
@@ -1,116 +1,386 @@
-
-import pymc as pm
-import arviz as az
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from pathlib import Path
+from pw_bdt.instrumentation import TuningClock, enabled, profiled, record, sampler_stats, stage
+from pw_bdt.posterior_summary import summarize_posterior
+from pw_bdt.trace_cache import TraceCache, hash_frame, hash_spec, warm_start_step, warm_start_values
+
+# Population d′ is fixed by the thresholding procedure; meta-d′ prior follows Locke (priorMCE)
+HYPER_PRIOR_MU_D = 1.0
+PRIOR_MCE = 0.8
+
+PARAMETERIZATIONS = ('centered', 'non_centered')
+LIKELIHOODS = ('observations', 'sufficient')
+INFERENCE_METHODS = ('nuts', 'advi', 'fullrank_advi', 'laplace')
+
+
+def load_sensitivity(data_path):
+    """
+    Read session-level d′/meta-d′ estimates and index subjects 0..N-1 in sorted order.
+    """
+    df = pd.read_csv(data_path)
+    subjects = sorted(df['subject'].unique())
+    subject_to_idx = {s: i for i, s in enumerate(subjects)}
+    df['subject_idx'] = df['subject'].map(subject_to_idx)
+    return df, subjects
+
+
+def sufficient_statistics(subject_idx, values, n_subjects):
+    """
+    Per-subject count, mean and sum of squared deviations of session-level values.
+    """
+    n = np.bincount(subject_idx, minlength=n_subjects)
+    mean = np.divide(np.bincount(subject_idx, values, minlength=n_subjects), n,
+                     out=np.zeros(n_subjects), where=n > 0)
+    ss = np.bincount(subject_idx, (values - mean[subject_idx]) ** 2, minlength=n_subjects)
+    return n, mean, ss
 
-# Load data
-current_dir = Path(__file__).resolve().parent
-save_csv_path = current_dir.parent / "data" / "locke"
-data_path = current_dir.parent / "data" / "sensitivity_per_subject_per_session.csv"
-df = pd.read_csv(data_path)
 
-# Preprocess subject indices
-subjects = sorted(df['subject'].unique())
-N_subjects = len(subjects)
-subject_to_idx = {s: i for i, s in enumerate(subjects)}
-df['subject_idx'] = df['subject'].map(subject_to_idx)
+def _normal_sufficient_logp(n, mean, ss, mu, sigma):
+    # sum_i log N(y_i | mu, sigma) written in terms of (n, mean, ss) of the y_i
+    import pymc as pm
+    return pm.math.sum(-n * pm.math.log(sigma) - 0.5 * n * np.log(2 * np.pi)
+                       - (ss + n * (mean - mu) ** 2) / (2 * sigma ** 2))
 
-# Extract observed values
-subject_idx = df['subject_idx'].values
 
-d_prime_values = df['d_prime'].values
-meta_d_prime_values = df['meta_d_prime'].values
+def subject_priors(n_subjects, parameterization='centered', mu_d=HYPER_PRIOR_MU_D, prior_mce=PRIOR_MCE,
+                   dims=None):
+    """
+    Population hyperpriors and subject-level d′, meta-d′ and noise of the
+    hierarchical model, added to the model on the context stack.
 
+    The subject vectors have `n_subjects` entries, or span the model
+    dimension `dims` if given. Returns (d_subj, meta_d_subj, sigma_subj).
+    """
+    import pymc as pm
+    size = {'dims': dims} if dims is not None else {'shape': n_subjects}
 
-# Build and sample model
-with pm.Model() as model:
     # Hyperpriors
-    hyper_prior_mu_d = 1.0
     sigma_type1 = pm.Uniform('sigma_type1', lower=0.1, upper=5)
     sigma_type2 = pm.Uniform('sigma_type2', lower=0.1, upper=5)
 
-    # Bounded subject-level parameters
-    # d_subj = pm.TruncatedNormal(
-    #     'd_subj', mu=hyper_prior_mu_d, sigma=sigma_type1, lower=0, upper=3,
-    #     shape=N_subjects
-    # )
-    d_subj = pm.Normal("d_subj", mu=hyper_prior_mu_d, sigma=sigma_type1, shape=N_subjects)
-    
-    # meta_d_subj = pm.TruncatedNormal(
-    #     'meta_d_subj', mu=0.8 * d_subj, sigma=sigma_type2, lower=0, upper=3,
-    #     shape=N_subjects
-    # )
-    
-    meta_d_subj = pm.Normal("meta_d_subj",
-                            mu=0.8 * d_subj,
-                            sigma=sigma_type2,
-                            shape=N_subjects)
-    
-    
+    if parameterization == 'centered':
+        d_subj = pm.Normal("d_subj", mu=mu_d, sigma=sigma_type1, **size)
+        meta_d_subj = pm.Normal("meta_d_subj",
+                                mu=prior_mce * d_subj,
+                                sigma=sigma_type2,
+                                **size)
+    else:
+        d_offset = pm.Normal("d_subj_offset", mu=0.0, sigma=1.0, **size)
+        d_subj = pm.Deterministic("d_subj", mu_d + sigma_type1 * d_offset, dims=dims)
+        meta_d_offset = pm.Normal("meta_d_subj_offset", mu=0.0, sigma=1.0, **size)
+        meta_d_subj = pm.Deterministic("meta_d_subj", prior_mce * d_subj + sigma_type2 * meta_d_offset, dims=dims)
 
     # Subject-specific noise
-    sigma_subj = pm.Uniform('sigma_subj', lower=0.1, upper=5.0, shape=N_subjects)
-
-    # Likelihoods
-    pm.Normal('d_obs', mu=d_subj[subject_idx], sigma=sigma_subj[subject_idx],
-              observed=d_prime_values)
-    pm.Normal('meta_d_obs', mu=meta_d_subj[subject_idx], sigma=sigma_subj[subject_idx],
-              observed=meta_d_prime_values)
-
-    # Sampling
-    trace = pm.sample(2000, tune=2000, chains=4, return_inferencedata=True)
-
-# Save trace
-save_path = current_dir.parent / 'data' / 'sensitivity_hierarchical_trace.nc'
-az.to_netcdf(trace, save_path)
-
-# 4. Extract posterior summaries
-summary = az.summary(trace, hdi_prob=0.95)
-print("_______")
-print(summary.loc['sigma_type2'])
-
-
-# Identify HDI columns dynamically
-hdi_cols = [c for c in summary.columns if c.startswith('hdi_')]
-if len(hdi_cols) < 2:
-    raise ValueError(f"No HDI columns found in summary: {summary.columns}")
-# parse numeric percentiles for sorting (e.g., 'hdi_2.5%', 'hdi_97.5%', or 'hdi_3%', 'hdi_97%')
-def _pct(x):
-    val = x.split('_')[1].strip('%')
-    return float(val)
-hdi_cols_sorted = sorted(hdi_cols, key=_pct)
-hdi_low, hdi_high = hdi_cols_sorted[0], hdi_cols_sorted[-1]
-
-# Helper to extract subject-level parameters
-def extract_df(varname, est_col, low_col, high_col):
-    # Match exactly varname with index pattern varname[n]
-    pattern = rf'^{varname}\['
-    df_var = summary.loc[summary.index.str.match(pattern), ['mean', hdi_low, hdi_high]].copy()
-    df_var.columns = [est_col, low_col, high_col]
-    return df_var.reset_index(drop=True)
-
-# Subject-level tables
-df_d     = extract_df('d_subj',      'muEst',       'muLow95CI',     'muHigh95CI')
-df_md    = extract_df('meta_d_subj', 'mu2Est',      'mu2Low95CI',    'mu2High95CI')
-df_sigma = extract_df('sigma_subj',  'sigmaEst',    'sigmaLow95CI',  'sigmaHigh95CI')
-
-# Population-level parameters
-df_pop = summary.loc[['sigma_type1', 'sigma_type2'], ['mean', hdi_low, hdi_high]].copy()
-df_pop = df_pop.rename(index={'sigma_type1': 'sigmaPop', 'sigma_type2': 'sigmaMCE'},
-                       columns={'mean':'mean', hdi_low:'low95CI', hdi_high:'high95CI'})
-
-# Assemble and write subject-level output
-df_out = pd.concat([df_d, df_md, df_sigma], axis=1)
-# Now df_out has N_subjects rows; assign sID safely
-df_out['sID'] = subjects
-# Reorder columns
-df_out = df_out[['sID', 'muEst','muLow95CI','muHigh95CI',
-                   'mu2Est','mu2Low95CI','mu2High95CI',
-                   'sigmaEst','sigmaLow95CI','sigmaHigh95CI']]
-
-# Save subject-level results
-df_out.to_csv(save_csv_path / 'my_fit_dPrime_hierarchicalBayes_fitData.txt', sep='\t', index=False)
-df_pop.to_csv(save_csv_path / 'my_fit_dPrime_hierarchicalBayes_population_mine.txt',
-               sep='\t', index=False)
\ No newline at end of file
+    sigma_subj = pm.Uniform('sigma_subj', lower=0.1, upper=5.0, **size)
+    return d_subj, meta_d_subj, sigma_subj
+
+
+def build_model(df, n_subjects, parameterization='centered', likelihood='observations',
+                mu_d=HYPER_PRIOR_MU_D, prior_mce=PRIOR_MCE):
+    """
+    Hierarchical model of session-level d′ and meta-d′.
+
+    parameterization='centered' samples d_subj and meta_d_subj directly;
+    'non_centered' samples standard-normal offsets and rebuilds them as
+    deterministics, which avoids funnel geometry when the population
+    sigmas are small relative to the data.
+
+    likelihood='observations' has one Normal per session; 'sufficient'
+    collapses the sessions of each subject into (count, mean, sum of squares)
+    beforehand, giving the same log-density with a cost that scales with
+    subjects rather than sessions.
+
+    mu_d is the population d′ and prior_mce the expected meta-d′ / d′ ratio.
+    """
+    if parameterization not in PARAMETERIZATIONS:
+        raise ValueError(f"Unknown parameterization: {parameterization!r}")
+    if likelihood not in LIKELIHOODS:
+        raise ValueError(f"Unknown likelihood: {likelihood!r}")
+    import pymc as pm
+
+    # Extract observed values
+    subject_idx = df['subject_idx'].values
+    d_prime_values = df['d_prime'].values
+    meta_d_prime_values = df['meta_d_prime'].values
+
+    with pm.Model() as model:
+        d_subj, meta_d_subj, sigma_subj = subject_priors(n_subjects, parameterization, mu_d, prior_mce)
+
+        # Likelihoods
+        if likelihood == 'observations':
+            pm.Normal('d_obs', mu=d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                      observed=d_prime_values)
+            pm.Normal('meta_d_obs', mu=meta_d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                      observed=meta_d_prime_values)
+        else:
+            n, mean, ss = sufficient_statistics(subject_idx, d_prime_values, n_subjects)
+            pm.Potential('d_obs', _normal_sufficient_logp(n, mean, ss, d_subj, sigma_subj))
+            n, mean, ss = sufficient_statistics(subject_idx, meta_d_prime_values, n_subjects)
+            pm.Potential('meta_d_obs', _normal_sufficient_logp(n, mean, ss, meta_d_subj, sigma_subj))
+    return model
+
+
+def sample_model(model, draws=2000, tune=2000, chains=4, **kwargs):
+    import pymc as pm
+    clock = None
+    if enabled():
+        # Time the tuning phase of every chain; sampler stats are recorded below
+        clock = kwargs['callback'] = TuningClock(kwargs.get('callback'))
+    with model:
+        trace = pm.sample(draws, tune=tune, chains=chains, return_inferencedata=True, **kwargs)
+    if clock is not None:
+        record('sampler', **sampler_stats(trace, clock))
+    return trace
+
+
+def laplace_approximation(model, draws=2000, random_seed=None):
+    """
+    Gaussian approximation at the posterior mode in the unconstrained space.
+
+    The mode is found with L-BFGS on the model's log-density (including the
+    Jacobians of the transforms), the covariance is the inverse negative
+    Hessian there, and draws are mapped back to the constrained parameters.
+    The Hessian is taken by central differences of the compiled gradient,
+    which is much cheaper than compiling the symbolic second derivative.
+    """
+    import arviz as az
+    from scipy.optimize import minimize
+    from pymc.blocking import DictToArrayBijection, RaveledVars
+
+    value_vars = model.continuous_value_vars
+    initial_point = model.initial_point()
+    x0 = DictToArrayBijection.map({v.name: initial_point[v.name] for v in value_vars})
+    logp = model.compile_logp()
+    dlogp = model.compile_dlogp()
+
+    def to_point(x):
+        return DictToArrayBijection.rmap(RaveledVars(x, x0.point_map_info))
+
+    def objective(x):
+        point = to_point(x)
+        return -logp(point), -dlogp(point)
+
+    mode = minimize(objective, x0.data, jac=True, method='L-BFGS-B').x
+    step = 1e-5 * np.maximum(1.0, np.abs(mode))
+    neg_hessian = np.array([(objective(mode + h)[1] - objective(mode - h)[1]) / (2 * h[i])
+                            for i, h in enumerate(np.diag(step))])
+    cov = np.linalg.inv((neg_hessian + neg_hessian.T) / 2)
+
+    rng = np.random.default_rng(random_seed)
+    samples = rng.multivariate_normal(mode, cov, size=draws)
+
+    # Constrained free RVs and deterministics as functions of the value variables
+    outputs = model.free_RVs + model.deterministics
+    constrained = model.compile_fn(model.replace_rvs_by_values(outputs), inputs=value_vars,
+                                   on_unused_input='ignore', point_fn=False)
+    values = [constrained(**to_point(x)) for x in samples]
+    posterior = {rv.name: np.stack([v[i] for v in values])[None] for i, rv in enumerate(outputs)}
+    return az.from_dict(posterior=posterior)
+
+
+def fit_model(model, inference='nuts', draws=2000, tune=2000, chains=4, n_fit=30_000, **kwargs):
+    """
+    Fit the model by NUTS or by a fast approximation.
+
+    'advi' and 'fullrank_advi' run pm.fit for n_fit iterations and 'laplace'
+    uses laplace_approximation; both return `draws` samples from the
+    approximation in one chain, so the usual summaries and HDIs apply.
+    """
+    if inference == 'nuts':
+        return sample_model(model, draws=draws, tune=tune, chains=chains, **kwargs)
+    if inference in ('advi', 'fullrank_advi'):
+        import pymc as pm
+        with model:
+            approx = pm.fit(n=n_fit, method=inference, random_seed=kwargs.get('random_seed'),
+                            progressbar=kwargs.get('progressbar', True))
+            return approx.sample(draws, random_seed=kwargs.get('random_seed'))
+    if inference == 'laplace':
+        return laplace_approximation(model, draws=draws, random_seed=kwargs.get('random_seed'))
+    raise ValueError(f"Unknown inference method: {inference!r}")
+
+
+def cached_fit(cache, model, df, spec, warm_start=False, warm_tune=None, **fit_kwargs):
+    """
+    fit_model through a TraceCache.
+
+    The key hashes the model structure and priors (its printed graph plus
+    `spec`), the sampler settings and the input data. With warm_start, a
+    NUTS run on a miss resumes the adaptation of a cached trace of the same
+    model on other data (see warm_start_step): its chains start from that
+    trace's posterior means, with its step size and mass matrix, and tune
+    for only warm_tune steps (default tune // 4). Such a run is stored under
+    its own key, next to the cold run's. Returns the trace and whether it
+    came from the cache.
+    """
+    sampler_spec = {k: v for k, v in fit_kwargs.items() if k not in ('progressbar', 'cores')}
+    model_hash, data_hash = hash_spec(model.str_repr(), spec, sampler_spec), hash_frame(df)
+    key = cache.key(model_hash, data_hash)
+    trace = cache.get(key)
+    if trace is not None:
+        return trace, True
+    if not (warm_start and fit_kwargs.get('inference', 'nuts') == 'nuts'):
+        trace = fit_model(model, **fit_kwargs)
+        cache.put(key, trace)
+        return trace, False
+
+    warm_tune = fit_kwargs.get('tune', 2000) // 4 if warm_tune is None else warm_tune
+    warm_key = cache.key(model_hash, hash_spec(data_hash, 'warm_start', warm_tune))
+    trace = cache.get(warm_key)
+    if trace is not None:
+        return trace, True
+    previous = cache.nearest(key)
+    step = warm_start_step(previous, model) if previous is not None else None
+    if step is None:
+        trace = fit_model(model, **fit_kwargs)
+        cache.put(key, trace)
+        return trace, False
+    trace = fit_model(model, **{**fit_kwargs, 'tune': warm_tune, 'step': step,
+                                'initvals': warm_start_values(previous, model)})
+    cache.put(warm_key, trace)
+    return trace, False
+
+
+def calibration_report(approx_trace, reference_trace, var_names=('d_subj', 'meta_d_subj', 'sigma_subj',
+                                                                 'sigma_type1', 'sigma_type2'), hdi_prob=0.95):
+    """
+    Compare an approximate posterior with a reference (NUTS) posterior, per parameter:
+    means, sds, the mean shift in reference sds, the sd ratio, and the overlap
+    (intersection over union) of the two HDIs.
+    """
+    import arviz as az
+    var_names = list(var_names)
+    approx = az.summary(approx_trace, var_names=var_names, hdi_prob=hdi_prob, kind='stats', round_to='none')
+    reference = az.summary(reference_trace, var_names=var_names, hdi_prob=hdi_prob, kind='stats', round_to='none')
+    low, high = reference.columns[2], reference.columns[3]
+
+    report = pd.DataFrame({
+        'mean_ref': reference['mean'], 'mean_approx': approx['mean'],
+        'sd_ref': reference['sd'], 'sd_approx': approx['sd'],
+    })
+    report['mean_shift_sd'] = (report['mean_approx'] - report['mean_ref']) / report['sd_ref']
+    report['sd_ratio'] = report['sd_approx'] / report['sd_ref']
+    intersection = (np.minimum(approx[high], reference[high]) - np.maximum(approx[low], reference[low])).clip(lower=0)
+    union = np.maximum(approx[high], reference[high]) - np.minimum(approx[low], reference[low])
+    report['hdi_overlap'] = intersection / union
+    return report
+
+
+def summarize_trace(trace, subjects, hdi_prob=0.95, round_to=3, **summary_kwargs):
+    """
+    Subject-level and population-level tables in the layout of Locke's fitData files.
+
+    `trace` is an InferenceData object or the path of a NetCDF trace, which is
+    read lazily; see posterior_summary.summarize_posterior for the chunking options.
+    Values are rounded to `round_to` decimals like az.summary's default
+    (round_to='none' keeps them unrounded).
+    """
+    stats = summarize_posterior(trace, ['d_subj', 'meta_d_subj', 'sigma_subj', 'sigma_type1', 'sigma_type2'],
+                                hdi_prob=hdi_prob, **summary_kwargs)
+
+    # Subject-level table
+    df_out = pd.DataFrame({'sID': subjects})
+    for varname, (est_col, low_col, high_col) in {
+            'd_subj':      ('muEst',    'muLow95CI',    'muHigh95CI'),
+            'meta_d_subj': ('mu2Est',   'mu2Low95CI',   'mu2High95CI'),
+            'sigma_subj':  ('sigmaEst', 'sigmaLow95CI', 'sigmaHigh95CI')}.items():
+        df_out[est_col], df_out[low_col], df_out[high_col] = stats[varname]
+
+    # Population-level parameters
+    df_pop = pd.DataFrame([stats['sigma_type1'], stats['sigma_type2']], dtype=float,
+                          index=['sigmaPop', 'sigmaMCE'], columns=['mean', 'low95CI', 'high95CI'])
+    if round_to not in (None, 'none', 'None'):
+        estimates = df_out.columns.drop('sID')
+        df_out[estimates] = df_out[estimates].round(round_to)
+        df_pop = df_pop.round(round_to)
+    return df_out, df_pop
+
+
+def run_hierarchical(data_path, fit_path, population_path, trace_path=None, parameterization='centered',
+                     likelihood='observations', inference='nuts', mu_d=HYPER_PRIOR_MU_D, prior_mce=PRIOR_MCE,
+                     draws=2000, tune=2000, chains=4, cores=None, random_seed=None, reference_path=None,
+                     calibration_path=None, cache_dir=None, warm_start=False, warm_tune=None,
+                     cache_max_age_s=None, cache_max_bytes=None):
+    """
+    Fit the hierarchical model to one session-level sensitivity table and
+    write the subject and population tables in Locke's fitData layout.
+
+    NUTS traces are saved to trace_path; approximations are compared with
+    the NUTS trace at reference_path, if there is one. With cache_dir, fits
+    go through a TraceCache that evicts entries older than cache_max_age_s
+    and then the least recently used beyond cache_max_bytes (see cached_fit
+    for warm_start and warm_tune).
+    """
+    import arviz as az
+    with stage('load', path=str(data_path)) as st:
+        df, subjects = load_sensitivity(data_path)
+        st.set(rows=len(df), subjects=len(subjects))
+
+    # Build and sample model
+    spec = {'parameterization': parameterization, 'likelihood': likelihood, 'mu_d': mu_d, 'prior_mce': prior_mce}
+    with stage('build_model', **spec):
+        model = build_model(df, len(subjects), parameterization=parameterization, likelihood=likelihood,
+                            mu_d=mu_d, prior_mce=prior_mce)
+    fit_kwargs = dict(inference=inference, draws=draws, tune=tune, chains=chains)
+    if cores is not None:
+        fit_kwargs['cores'] = cores
+    if random_seed is not None:
+        fit_kwargs['random_seed'] = random_seed
+    with stage('fit', inference=inference, draws=draws, tune=tune, chains=chains) as st:
+        if cache_dir is not None:
+            cache = TraceCache(cache_dir, max_age_s=cache_max_age_s, max_bytes=cache_max_bytes)
+            trace, cache_hit = cached_fit(cache, model, df, spec, warm_start=warm_start, warm_tune=warm_tune,
+                                          **fit_kwargs)
+        else:
+            trace, cache_hit = fit_model(model, **fit_kwargs), False
+        st.set(cache_hit=cache_hit)
+
+    if inference == 'nuts':
+        if trace_path is not None:
+            # Save trace, also on a cache hit, so trace_path always holds this run's posterior
+            with stage('save_trace'):
+                az.to_netcdf(trace, trace_path)
+    elif reference_path is not None and Path(reference_path).exists():
+        # Calibrate the approximation against the stored full NUTS trace
+        with stage('calibration'):
+            report = calibration_report(trace, az.from_netcdf(reference_path))
+        print(report[['mean_shift_sd', 'sd_ratio', 'hdi_overlap']].describe())
+        if calibration_path is not None:
+            report.to_csv(calibration_path)
+            print("Saved calibration report to", calibration_path)
+
+    # Extract posterior summaries
+    with stage('summarize') as st:
+        df_out, df_pop = summarize_trace(trace, subjects, hdi_prob=0.95)
+        st.set(rows=len(df_out))
+    print("_______")
+    print(df_pop.loc['sigmaMCE'])
+
+    # Save subject-level results
+    with stage('write_outputs'):
+        df_out.to_csv(fit_path, sep='\t', index=False)
+        df_pop.to_csv(population_path, sep='\t', index=False)
+    return df_out, df_pop
+
+
+def main(parameterization='centered', likelihood='observations', inference='nuts', reference_path=None,
+         use_cache=True, warm_start=False, profile_path=None):
+    current_dir = Path(__file__).resolve().parent
+    # Reruns of the script reuse the traces of unchanged model/data combinations
+    cache_dir = current_dir.parent / 'data' / '.trace_cache' if use_cache else None
+    save_csv_path = current_dir.parent / "data" / "locke"
+    data_path = current_dir.parent / "data" / "sensitivity_per_subject_per_session.csv"
+    trace_path = current_dir.parent / 'data' / 'sensitivity_hierarchical_trace.nc'
+
+    # profile_path collects per-stage timings and sampler stats as JSON lines
+    with profiled(profile_path), stage('run_hierarchical'):
+        run_hierarchical(data_path, save_csv_path / 'my_fit_dPrime_hierarchicalBayes_fitData.txt',
+                         save_csv_path / 'my_fit_dPrime_hierarchicalBayes_population_mine.txt',
+                         trace_path=trace_path, parameterization=parameterization, likelihood=likelihood,
+                         inference=inference, reference_path=trace_path if reference_path is None else reference_path,
+                         calibration_path=current_dir.parent / 'data' / f'hierarchical_calibration_{inference}.csv',
+                         cache_dir=cache_dir, warm_start=warm_start)
+
+
+if __name__ == "__main__":
+    main()
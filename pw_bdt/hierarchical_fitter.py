@@ -0,0 +1,120 @@
+import numpy as np
+from pw_bdt.hierarchical_bayesian_model import (
+    HYPER_PRIOR_MU_D, LIKELIHOODS, PARAMETERIZATIONS, PRIOR_MCE, _normal_sufficient_logp, sample_model,
+    subject_priors, sufficient_statistics, summarize_trace)
+from pw_bdt.instrumentation import stage
+
+
+class HierarchicalFitter:
+    """
+    The hierarchical model of hierarchical_bayesian_model compiled once and
+    refitted on new session-level tables without rebuilding it.
+
+    The data live in pm.Data containers (subject_idx, d′ and meta-d′ per
+    session for likelihood='observations'; per-subject session counts, means
+    and sums of squares for 'sufficient'), and the NUTS step and jittered
+    initial-point functions are compiled together with the model, so `fit`
+    only swaps the data in and samples.
+
+    Subject parameters are padded to `capacity` slots. Slots without sessions
+    only carry their priors, which integrate out of the posterior of the
+    other parameters, and are dropped from the returned trace. A cohort larger
+    than the capacity rebuilds the model with at least twice as many slots.
+
+        fitter = HierarchicalFitter(capacity=64)
+        for df in cohorts:
+            trace = fitter.fit(df, draws=1000, tune=1000)
+            df_out, df_pop = fitter.summarize(trace)
+    """
+
+    def __init__(self, capacity=None, parameterization='centered', likelihood='observations',
+                 mu_d=HYPER_PRIOR_MU_D, prior_mce=PRIOR_MCE, chains=4):
+        if parameterization not in PARAMETERIZATIONS:
+            raise ValueError(f"Unknown parameterization: {parameterization!r}")
+        if likelihood not in LIKELIHOODS:
+            raise ValueError(f"Unknown likelihood: {likelihood!r}")
+        self.capacity = capacity
+        self.parameterization = parameterization
+        self.likelihood = likelihood
+        self.mu_d = mu_d
+        self.prior_mce = prior_mce
+        self.chains = chains
+        self.model = None
+        self.subjects = None
+        self.n_builds = 0
+
+    def _build(self, df, capacity):
+        import pymc as pm
+        from pymc.initial_point import make_initial_point_fns_per_chain
+
+        with stage('compile_model', capacity=capacity, likelihood=self.likelihood):
+            with pm.Model(coords={'subject': np.arange(capacity)}) as model:
+                d_subj, meta_d_subj, sigma_subj = subject_priors(capacity, self.parameterization, self.mu_d,
+                                                                 self.prior_mce, dims='subject')
+                if self.likelihood == 'observations':
+                    subject_idx = pm.Data('subject_idx', np.zeros(len(df), dtype=np.int64))
+                    d_prime = pm.Data('d_prime', np.zeros(len(df)))
+                    meta_d_prime = pm.Data('meta_d_prime', np.zeros(len(df)))
+                    pm.Normal('d_obs', mu=d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                              observed=d_prime, shape=subject_idx.shape)
+                    pm.Normal('meta_d_obs', mu=meta_d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                              observed=meta_d_prime, shape=subject_idx.shape)
+                else:
+                    # Padded slots have no sessions (n = 0) and add nothing to the likelihood
+                    n = pm.Data('n_sessions', np.zeros(capacity), dims='subject')
+                    for name, mu in (('d', d_subj), ('meta_d', meta_d_subj)):
+                        mean = pm.Data(f'{name}_mean', np.zeros(capacity), dims='subject')
+                        ss = pm.Data(f'{name}_ss', np.zeros(capacity), dims='subject')
+                        pm.Potential(f'{name}_obs', _normal_sufficient_logp(n, mean, ss, mu, sigma_subj))
+                self.step = pm.NUTS()
+            self.initial_point_fns = make_initial_point_fns_per_chain(
+                model=model, overrides=None, jitter_rvs=set(model.free_RVs), chains=self.chains)
+        self.model = model
+        self.capacity = capacity
+        self.n_builds += 1
+
+    def set_data(self, df):
+        """
+        Swap a session-level table (subject, d_prime, meta_d_prime) into the
+        model, rebuilding it only if the cohort outgrew the capacity.
+        """
+        import pymc as pm
+        subjects = np.sort(df['subject'].unique())
+        if self.model is None or len(subjects) > self.capacity:
+            capacity = (self.capacity or 0) if self.model is None else 2 * self.capacity
+            self._build(df, max(len(subjects), capacity))
+
+        subject_idx = np.searchsorted(subjects, df['subject'].to_numpy())
+        d_prime = df['d_prime'].to_numpy(dtype=float)
+        meta_d_prime = df['meta_d_prime'].to_numpy(dtype=float)
+        if self.likelihood == 'observations':
+            data = {'subject_idx': subject_idx, 'd_prime': d_prime, 'meta_d_prime': meta_d_prime}
+        else:
+            n, d_mean, d_ss = sufficient_statistics(subject_idx, d_prime, self.capacity)
+            _, meta_mean, meta_ss = sufficient_statistics(subject_idx, meta_d_prime, self.capacity)
+            data = {'n_sessions': n, 'd_mean': d_mean, 'd_ss': d_ss, 'meta_d_mean': meta_mean, 'meta_d_ss': meta_ss}
+        pm.set_data(data, model=self.model)
+        self.subjects = subjects
+
+    def fit(self, df, draws=2000, tune=2000, random_seed=None, **kwargs):
+        """
+        NUTS posterior of the model on df, reusing the compiled step.
+
+        Chains start from jittered initial points as with pm.sample's default
+        init. The returned trace only has the cohort's subjects on its
+        `subject` dimension, labelled with their ids.
+        """
+        self.set_data(df)
+        seeds = np.random.SeedSequence(random_seed).generate_state(self.chains)
+        initvals = [fn(int(seed)) for fn, seed in zip(self.initial_point_fns, seeds)]
+        trace = sample_model(self.model, draws=draws, tune=tune, chains=self.chains, step=self.step,
+                             initvals=initvals, random_seed=random_seed, **kwargs)
+        trace = trace.isel(subject=slice(0, len(self.subjects)))
+        groups = [g for g in trace.groups() if 'subject' in trace[g].dims]
+        return trace.assign_coords(subject=self.subjects, groups=groups)
+
+    def summarize(self, trace, hdi_prob=0.95, **summary_kwargs):
+        """
+        summarize_trace of a trace returned by fit, for the current cohort.
+        """
+        return summarize_trace(trace, list(self.subjects), hdi_prob=hdi_prob, **summary_kwargs)
@@ -0,0 +1,273 @@
+import json
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+import numpy as np
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# The active Recorder, if any. Every hook checks this first, so the pipeline
+# pays one global lookup per stage when instrumentation is off.
+_recorder = None
+
+
+class _NullStage:
+    """
+    Stand-in for Stage while instrumentation is disabled.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **fields):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """
+    One timed pipeline stage; `set()` attaches row counts or other fields.
+
+    Peak memory is taken from tracemalloc relative to the traced memory at
+    the start of the stage. Nested stages reset the tracemalloc peak, so each
+    stage passes its own peak up to the enclosing one. Every stage also
+    records max_rss_mb, the resident-set high-water mark of the process and
+    its finished children (e.g. NUTS chain processes) so far, which needs no
+    tracing.
+    """
+
+    def __init__(self, recorder, name, fields):
+        self.recorder = recorder
+        self.name = name
+        self.fields = fields
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        stack = self.recorder._stack
+        if self.recorder.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, peak)
+            tracemalloc.reset_peak()
+            self._start_bytes = self._peak = current
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall_s = time.perf_counter() - self._start
+        stack = self.recorder._stack
+        stack.pop()
+        event = {'event': 'stage', 'stage': self.name, 'parent': stack[-1].name if stack else None,
+                 'wall_s': wall_s, **self.fields}
+        if self.recorder.trace_memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            event['peak_mb'] = (self._peak - self._start_bytes) / 1e6
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, self._peak)
+            tracemalloc.reset_peak()
+        event['max_rss_mb'] = max_rss_mb()
+        if exc_type is not None:
+            event['error'] = exc_type.__name__
+        self.recorder.emit(event)
+        return False
+
+
+class Recorder:
+    """
+    Collects stage, group and sampler events.
+
+    Events are kept in memory (`events`, `to_json`), appended as JSON lines
+    to log_path as they happen, and logged as JSON on the `pw_bdt.instrumentation`
+    logger at INFO level.
+    """
+
+    def __init__(self, log_path=None, trace_memory=True):
+        self.log_path = log_path
+        self.trace_memory = trace_memory
+        self.events = []
+        self._stack = []
+        self._log = open(log_path, 'a') if log_path is not None else None
+
+    def emit(self, event):
+        event = {'time': datetime.now(timezone.utc).isoformat(), **event}
+        self.events.append(event)
+        line = json.dumps(event, default=_to_json)
+        if self._log is not None:
+            self._log.write(line + '\n')
+            self._log.flush()
+        logger.info(line)
+
+    def stage(self, name, **fields):
+        return Stage(self, name, fields)
+
+    def to_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.events, f, indent=1, default=_to_json)
+
+    def close(self):
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+
+
+def max_rss_mb():
+    """
+    Peak resident set size (MB) of this process or of any of its finished children.
+    """
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return max(own, children) / (1024 ** 2 if sys.platform == 'darwin' else 1024)
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+@contextmanager
+def instrument(log_path=None, json_path=None, trace_memory=True):
+    """
+    Record every instrumented stage run inside the block.
+
+        with instrument(log_path='profile.jsonl') as recorder:
+            run_sensitivity(...)
+
+    log_path gets one JSON line per event, json_path the list of all events
+    when the block ends. trace_memory=False skips tracemalloc, which slows
+    allocation-heavy stages, and only records wall times, row counts and
+    max_rss_mb.
+    """
+    global _recorder
+    previous = _recorder
+    recorder = Recorder(log_path, trace_memory=trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    _recorder = recorder
+    try:
+        yield recorder
+    finally:
+        _recorder = previous
+        if started_tracing:
+            tracemalloc.stop()
+        recorder.close()
+        if json_path is not None:
+            recorder.to_json(json_path)
+
+
+def profiled(log_path=None, trace_memory=False, **kwargs):
+    """
+    instrument(log_path, ...) if log_path is given, else a no-op context.
+
+    tracemalloc is off by default: the profiled mains sample with NUTS, which
+    runs several times slower under tracing (so the timings would not describe
+    the real run) and allocates in chain processes that tracemalloc does not
+    see. The max_rss_mb of every stage covers those.
+    """
+    if log_path is None:
+        return nullcontext()
+    return instrument(log_path, trace_memory=trace_memory, **kwargs)
+
+
+def enabled():
+    return _recorder is not None
+
+
+def stage(name, **fields):
+    """
+    Context manager timing one pipeline stage; a no-op unless instrument() is active.
+    """
+    if _recorder is None:
+        return _NULL_STAGE
+    return _recorder.stage(name, **fields)
+
+
+def record(event, **fields):
+    """
+    Emit a free-form event (no-op unless instrument() is active).
+    """
+    if _recorder is not None:
+        _recorder.emit({'event': event, **fields})
+
+
+def record_groups(stage_name, keys, **columns):
+    """
+    One `group` event per row of the `keys` frame (subject, session, ...), with
+    the matching element of every array in `columns` (row counts, wall times, ...).
+    """
+    if _recorder is None:
+        return
+    values = {name: np.asarray(v).tolist() for name, v in columns.items()}
+    for i, key in enumerate(keys.to_dict('records')):
+        _recorder.emit({'event': 'group', 'stage': stage_name, **key,
+                        **{name: v[i] for name, v in values.items()}})
+
+
+class TuningClock:
+    """
+    pm.sample callback timing the tuning phase of every chain.
+
+    PyMC reports only the total sampling time, so the clock notes when each
+    chain produced its first draw and its first post-tuning draw.
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.first_draw = {}
+        self.tuning_done = {}
+
+    def __call__(self, trace, draw):
+        now = time.perf_counter()
+        self.first_draw.setdefault(draw.chain, now)
+        if not draw.tuning:
+            self.tuning_done.setdefault(draw.chain, now)
+        if self.callback is not None:
+            self.callback(trace=trace, draw=draw)
+
+    def tuning_s(self):
+        return {chain: self.tuning_done[chain] - start for chain, start in self.first_draw.items()
+                if chain in self.tuning_done}
+
+
+def sampler_stats(trace, clock=None):
+    """
+    Per-chain NUTS diagnostics of an InferenceData trace: tuning steps and
+    time, final step size, tree depth, leapfrog steps (mean and total, i.e.
+    gradient evaluations), acceptance rate and divergences. Empty for traces without sample_stats (ADVI, Laplace).
+    """
+    if 'sample_stats' not in trace.groups():
+        return {}
+    sample_stats = trace.sample_stats
+    stats = {'sampling_time_s': sample_stats.attrs.get('sampling_time'),
+             'tuning_steps': sample_stats.attrs.get('tuning_steps'), 'chains': {}}
+    tuning_s = clock.tuning_s() if clock is not None else {}
+    for chain in range(sample_stats.sizes['chain']):
+        per_chain = sample_stats.isel(chain=chain)
+        stats['chains'][chain] = {
+            'tuning_s': tuning_s.get(chain),
+            'step_size': float(per_chain['step_size'][-1]) if 'step_size' in per_chain else None,
+            'tree_depth_mean': float(per_chain['tree_depth'].mean()) if 'tree_depth' in per_chain else None,
+            'tree_depth_max': int(per_chain['tree_depth'].max()) if 'tree_depth' in per_chain else None,
+            'n_steps_mean': float(per_chain['n_steps'].mean()) if 'n_steps' in per_chain else None,
+            'grad_evals': int(per_chain['n_steps'].sum()) if 'n_steps' in per_chain else None,
+            'acceptance_rate': float(per_chain['acceptance_rate'].mean()) if 'acceptance_rate' in per_chain else None,
+            'divergences': int(per_chain['diverging'].sum()) if 'diverging' in per_chain else None,
+        }
+    return stats
@@ -0,0 +1,157 @@
+"""
+Joint hierarchical model of d′ and meta-d′ fitted on trial counts.
+
+Instead of treating the per-session point estimates of sensitivity_fits as
+Normal observations, every session's stimulus × r1 × r2 counts are the data:
+
+    subject:  d_subj, meta_d_subj, sigma_subj      (as in hierarchical_bayesian_model)
+    session:  d_sess ~ N(d_subj, sigma_subj), meta_d_sess ~ N(meta_d_subj, sigma_subj),
+              type-1 criterion c1, confidence criteria c2_low = c1 - exp(b) < c1 < c2_high = c1 + exp(a)
+    counts[stimulus] ~ Multinomial(n[stimulus], p[stimulus, r1, r2])
+
+P(r1 | S) follows the type-1 SDT observer (d_sess, c1) and P(r2 | r1, S)
+the Maniscalco & Lau type-2 observer with sensitivity meta_d_sess. As in
+HMeta-d, the type-2 observer shares the type-1 criterion c1 rather than
+rescaling it by meta-d′ / d′, which would divide by a latent d′.
+
+The likelihood is evaluated on the (sessions, 2, 4) count tensor, so the
+gradient cost grows with sessions × 8 cells, not with trials.
+"""
+import numpy as np
+from pathlib import Path
+from pw_bdt.hierarchical_bayesian_model import (
+    HYPER_PRIOR_MU_D, PARAMETERIZATIONS, PRIOR_MCE, fit_model, subject_priors, summarize_trace)
+from pw_bdt.instrumentation import stage
+from pw_bdt.posterior_summary import summarize_posterior
+from pw_bdt.sensitivity_fits import store_count_tensor
+from pw_bdt.trial_store import open_store
+
+# stimulus means of the evidence, in units of (meta-)d′
+_S = np.array([-0.5, 0.5])
+
+
+def response_probabilities(d_prime, meta_d_prime, c1, c2_low, c2_high):
+    """
+    P(r1, r2 | stimulus) of the joint type-1/type-2 observer as a tensor of
+    shape (n_sessions, 2, 4), ordered [stimulus, (r1, r2)] like a flattened
+    count tensor. All parameters have shape (n_sessions,).
+    """
+    import pytensor.tensor as pt
+    from pymc.distributions.dist_math import normal_lcdf
+
+    def log_phi(x):
+        return normal_lcdf(0, 1, x)
+
+    d, m, c, lo, hi = (x[:, None] for x in (d_prime, meta_d_prime, c1, c2_low, c2_high))
+    # type 1: P(r1 = 1 | S) = Phi(d S - c1)
+    p_r0 = pt.exp(log_phi(c - d * _S))
+    p_r1 = pt.exp(log_phi(d * _S - c))
+    # type 2: P(high | r1, S) under the meta-d′ observer, conditional on its evidence lying on the r1 side of c1
+    p_high_r0 = pt.exp(log_phi(lo - m * _S) - log_phi(c - m * _S))
+    p_high_r1 = pt.exp(log_phi(m * _S - hi) - log_phi(m * _S - c))
+    return pt.stack([p_r0 * (1 - p_high_r0), p_r0 * p_high_r0,
+                     p_r1 * (1 - p_high_r1), p_r1 * p_high_r1], axis=-1)
+
+
+def build_joint_model(groups, counts, parameterization='centered', mu_d=HYPER_PRIOR_MU_D, prior_mce=PRIOR_MCE):
+    """
+    Joint model of a (n_sessions, 2, 2, 2) count tensor indexed [stimulus, r1, r2]
+    with the matching (subject, session) groups frame.
+
+    `parameterization` applies to the subject level, as in build_model; the
+    session level is centred since every session has hundreds of trials.
+    """
+    if parameterization not in PARAMETERIZATIONS:
+        raise ValueError(f"Unknown parameterization: {parameterization!r}")
+    import pymc as pm
+    import pytensor.tensor as pt
+
+    subjects = np.sort(groups['subject'].unique())
+    subject_idx = np.searchsorted(subjects, groups['subject'].to_numpy())
+    n_sessions = len(groups)
+    flat = np.asarray(counts).reshape(n_sessions, 2, 4)
+
+    with pm.Model() as model:
+        d_subj, meta_d_subj, sigma_subj = subject_priors(len(subjects), parameterization, mu_d, prior_mce)
+
+        # Session-level sensitivities around the subject means
+        d_sess = pm.Normal('d_sess', mu=d_subj[subject_idx], sigma=sigma_subj[subject_idx], shape=n_sessions)
+        meta_d_sess = pm.Normal('meta_d_sess', mu=meta_d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                                shape=n_sessions)
+
+        # Session criteria: type-1 bias and log distances of the confidence criteria from it
+        c1 = pm.Normal('c1', mu=0.0, sigma=1.0, shape=n_sessions)
+        log_spread_high = pm.Normal('log_spread_high', mu=0.0, sigma=1.0, shape=n_sessions)
+        log_spread_low = pm.Normal('log_spread_low', mu=0.0, sigma=1.0, shape=n_sessions)
+
+        p = response_probabilities(d_sess, meta_d_sess, c1, c1 - pt.exp(log_spread_low),
+                                   c1 + pt.exp(log_spread_high))
+        pm.Multinomial('counts', n=flat.sum(axis=-1), p=p, observed=flat)
+    return model
+
+
+def summarize_sessions(trace, groups, hdi_prob=0.95, **summary_kwargs):
+    """
+    Session-level posterior means and HDIs of d′, meta-d′ and the criteria, aligned with `groups`.
+    """
+    names = {'d_sess': 'd_prime', 'meta_d_sess': 'meta_d_prime', 'c1': 'c1'}
+    stats = summarize_posterior(trace, list(names), hdi_prob=hdi_prob, **summary_kwargs)
+    result = groups.reset_index(drop=True).copy()
+    for varname, column in names.items():
+        result[column], result[f'{column}_low95CI'], result[f'{column}_high95CI'] = stats[varname]
+    result['m_ratio'] = result['meta_d_prime'] / result['d_prime']
+    return result
+
+
+def run_joint(data_path, fit_path, population_path, session_path, warmup_count=100, by='position',
+              parameterization='centered', inference='nuts', mu_d=HYPER_PRIOR_MU_D, prior_mce=PRIOR_MCE,
+              draws=2000, tune=2000, chains=4, cores=None, random_seed=None, trace_path=None):
+    """
+    Fit the joint model to the trials of one trial log and write the subject
+    and population tables (Locke's fitData layout) and the session table.
+    """
+    with stage('count_tensor') as st:
+        groups, counts = store_count_tensor(open_store(data_path), warmup_count=warmup_count, by=by)
+        st.set(groups=len(groups), rows=int(counts.sum()))
+    subjects = list(np.sort(groups['subject'].unique()))
+
+    with stage('build_model', parameterization=parameterization):
+        model = build_joint_model(groups, counts, parameterization=parameterization, mu_d=mu_d,
+                                  prior_mce=prior_mce)
+    fit_kwargs = dict(inference=inference, draws=draws, tune=tune, chains=chains)
+    if cores is not None:
+        fit_kwargs['cores'] = cores
+    if random_seed is not None:
+        fit_kwargs['random_seed'] = random_seed
+    with stage('fit', inference=inference, draws=draws, tune=tune, chains=chains):
+        trace = fit_model(model, **fit_kwargs)
+    if trace_path is not None:
+        import arviz as az
+        az.to_netcdf(trace, trace_path)
+
+    with stage('summarize'):
+        df_out, df_pop = summarize_trace(trace, subjects, hdi_prob=0.95)
+        df_sessions = summarize_sessions(trace, groups, hdi_prob=0.95)
+    print("_______")
+    print(df_pop.loc['sigmaMCE'])
+
+    df_out.to_csv(fit_path, sep='\t', index=False)
+    df_pop.to_csv(population_path, sep='\t', index=False)
+    df_sessions.to_csv(session_path, index=False)
+    print("Saved session-level posterior to", session_path)
+    return df_out, df_pop, df_sessions
+
+
+def main(parameterization='centered', inference='nuts'):
+    current_dir = Path(__file__).resolve().parent
+    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
+    save_csv_path = current_dir.parent / "data" / "locke"
+
+    run_joint(data_path, save_csv_path / 'my_fit_dPrime_jointBayes_fitData.txt',
+              save_csv_path / 'my_fit_dPrime_jointBayes_population_mine.txt',
+              current_dir.parent / "data" / "sensitivity_joint_per_subject_per_session.csv",
+              parameterization=parameterization, inference=inference)
+
+
+if __name__ == "__main__":
+    main()
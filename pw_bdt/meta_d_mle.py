@@ -0,0 +1,164 @@
+"""
+Maximum-likelihood meta-d' (Maniscalco & Lau, 2012) for binary confidence.
+
+For each subject-session the type-2 counts n[stimulus, r1, r2] are
+modelled with an SDT observer of sensitivity meta-d': internal evidence
+x ~ N(+-meta-d'/2, 1), a type-1 criterion c' = meta-d' * c1 / d' that
+keeps the normalised type-1 bias of the observed data, and confidence
+criteria c2_low = c' - exp(b) < c' < c2_high = c' + exp(a).
+
+    P(high | r1 = 1, S) = Q(c2_high - mu_S) / Q(c' - mu_S)
+    P(high | r1 = 0, S) = Phi(c2_low - mu_S) / Phi(c' - mu_S)
+
+Sessions are fitted jointly in batches: their parameters are independent,
+so the summed negative log-likelihood has a block-diagonal Hessian and one
+L-BFGS-B run with analytic gradients fits a whole batch. The optimiser's
+tolerances apply to the batch total, so every group's own projected
+gradient is checked afterwards and the groups that have not converged are
+refitted alone.
+"""
+import numpy as np
+from scipy.optimize import minimize
+from scipy.special import log_ndtr
+from pw_bdt.helpers.utils import z_transform_counts
+from pw_bdt.sensitivity_fits import meta_dprime_from_counts
+
+_LOG_SQRT_2PI = 0.5 * np.log(2 * np.pi)
+# stimulus means of the evidence, in units of meta-d'
+_S = np.array([-0.5, 0.5])[:, None]
+# response sign: r1 = 0 mirrors the evidence axis so both responses share one formula
+_SIGN = np.array([-1.0, 1.0])[None, :]
+# L-BFGS-B box of [meta-d', a, b]
+_LOWER = np.array([-10.0, -10.0, -10.0])
+_UPPER = np.array([10.0, 3.0, 3.0])
+
+
+def type1_parameters(counts, correction=0.5):
+    """
+    Observed d' and type-1 criterion c1 of a (..., 2, 2, 2) count tensor.
+    """
+    type1 = counts.sum(axis=-1)
+    z_hit = z_transform_counts(type1[..., 1, 1], type1[..., 1, :].sum(axis=-1), correction)
+    z_fa = z_transform_counts(type1[..., 0, 1], type1[..., 0, :].sum(axis=-1), correction)
+    return z_hit - z_fa, -0.5 * (z_hit + z_fa)
+
+
+def _log_q(x):
+    # log of the upper normal tail, log(1 - Phi(x))
+    return log_ndtr(-x)
+
+
+def _log_phi(x):
+    return -0.5 * x ** 2 - _LOG_SQRT_2PI
+
+
+def negative_log_likelihood(params, kappa, n_high, n_low):
+    """
+    Negative type-2 log-likelihood and its gradient for a batch of sessions.
+
+    params is (n_groups, 3) holding [meta-d', a, b]; kappa = c1 / d' per group;
+    n_high and n_low are (n_groups, 2, 2) counts indexed [stimulus, r1].
+    Returns the (n_groups,) negative log-likelihoods and (n_groups, 3) gradient.
+    """
+    m, a, b = params[:, 0], params[:, 1], params[:, 2]
+    spread = np.exp(np.stack([b, a], axis=-1))[:, None, :]          # (G, 1, r1)
+
+    # v: criterion c', u: confidence criterion, both on the response-signed axis
+    dv_dm = _SIGN * (kappa[:, None, None] - _S)                      # (G, S, r1)
+    v = m[:, None, None] * dv_dm
+    u = v + spread
+
+    log_q_u = _log_q(u)
+    log_q_v = _log_q(v)
+    log_ratio = np.minimum(log_q_u - log_q_v, -1e-300)
+    log_d = log_q_v + np.log(-np.expm1(log_ratio))                   # log(Q(v) - Q(u))
+
+    log_p_high = log_q_u - log_q_v
+    log_p_low = log_d - log_q_v
+    nll = -(n_high * log_p_high + n_low * log_p_low).sum(axis=(1, 2))
+
+    mills_u = np.exp(_log_phi(u) - log_q_u)
+    mills_v = np.exp(_log_phi(v) - log_q_v)
+    phi_u_d = np.exp(_log_phi(u) - log_d)
+    phi_v_d = np.exp(_log_phi(v) - log_d)
+
+    g_u = -n_high * mills_u + n_low * phi_u_d
+    g_v = n_high * mills_v + n_low * (mills_v - phi_v_d)
+
+    grad = np.empty_like(params)
+    grad[:, 0] = ((g_u + g_v) * dv_dm).sum(axis=(1, 2))
+    g_spread = (g_u * spread).sum(axis=1)                            # (G, r1)
+    grad[:, 1] = g_spread[:, 1]
+    grad[:, 2] = g_spread[:, 0]
+    return nll, -grad
+
+
+def projected_gradient(params, grad):
+    """
+    Gradient of a (n_groups, 3) batch with the components that push against
+    an active bound of the L-BFGS-B box set to zero.
+    """
+    at_lower = np.isclose(params, _LOWER) & (grad > 0)
+    at_upper = np.isclose(params, _UPPER) & (grad < 0)
+    return np.where(at_lower | at_upper, 0.0, grad)
+
+
+def _fit_batch(x0, kappa, n_high, n_low, maxiter):
+    n_groups = len(x0)
+
+    def objective(x):
+        nll, grad = negative_log_likelihood(x.reshape(n_groups, 3), kappa, n_high, n_low)
+        return nll.sum(), grad.ravel()
+
+    bounds = list(zip(_LOWER, _UPPER)) * n_groups
+    fit = minimize(objective, x0.ravel(), jac=True, method='L-BFGS-B', bounds=bounds,
+                   options={'maxiter': maxiter, 'ftol': 1e-15, 'gtol': 1e-8})
+    return fit.x.reshape(n_groups, 3)
+
+
+def fit_meta_dprime_mle(counts, pad=0.25, meta_d_init=None, maxiter=10_000, correction=0.5, batch_size=256,
+                        gtol=1e-4):
+    """
+    Fit meta-d' by maximum likelihood for every group of a (..., 2, 2, 2)
+    count tensor indexed [stimulus, r1, r2].
+
+    d' and c1 come from the observed type-1 rates (with the z_transform
+    edge `correction`). `pad` is added to every type-2 cell so that empty
+    cells A-D need no 0.5 fallback; M&L suggest 1 / (2 * n_ratings).
+    meta_d_init warm-starts the fit, by default from the closed-form
+    estimate. Groups are fitted batch_size at a time, and every group whose
+    projected gradient still exceeds gtol is refitted on its own.
+    Returns a dict of arrays: meta_d_prime, meta_c1, c2_low, c2_high.
+    """
+    shape = counts.shape[:-3]
+    counts = counts.reshape(-1, 2, 2, 2)
+    n_groups = len(counts)
+
+    d_prime, c1 = type1_parameters(counts, correction)
+    kappa = np.divide(c1, d_prime, out=np.zeros(n_groups), where=d_prime != 0)
+
+    padded = counts + pad
+    n_high, n_low = padded[..., 1], padded[..., 0]
+
+    if meta_d_init is None:
+        meta_d_init = meta_dprime_from_counts(counts, correction)
+    meta_d_init = np.clip(np.nan_to_num(np.reshape(meta_d_init, -1)), -5, 5)
+    x = np.column_stack([meta_d_init, np.zeros(n_groups), np.zeros(n_groups)])
+
+    for start in range(0, n_groups, batch_size):
+        batch = slice(start, start + batch_size)
+        x[batch] = _fit_batch(x[batch], kappa[batch], n_high[batch], n_low[batch], maxiter)
+
+    _, grad = negative_log_likelihood(x, kappa, n_high, n_low)
+    for i in np.flatnonzero(np.abs(projected_gradient(x, grad)).max(axis=1) > gtol):
+        group = slice(i, i + 1)
+        x[group] = _fit_batch(x[group], kappa[group], n_high[group], n_low[group], maxiter)
+    m, a, b = x.T
+
+    meta_c1 = kappa * m
+    return {
+        'meta_d_prime': m.reshape(shape),
+        'meta_c1': meta_c1.reshape(shape),
+        'c2_low': (meta_c1 - np.exp(b)).reshape(shape),
+        'c2_high': (meta_c1 + np.exp(a)).reshape(shape),
+    }
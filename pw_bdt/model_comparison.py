@@ -0,0 +1,315 @@
+"""
+Predictive comparison of hierarchical model variants by PSIS-LOO, with a
+K-fold fallback.
+
+Every model in MODELS is fitted to the same session-level table in a process
+pool. Its pointwise log-likelihood (d′ and meta-d′ of each session summed,
+so the unit left out is one session) is stored with its trace, and PSIS-LOO
+is computed from it. If any Pareto k of any model exceeds the reliability
+threshold, every model is refitted K times instead, each fit leaving out the
+same fold of sessions: K-fold elpd is biased low against LOO (every fit sees
+(K-1)/K of the data), so the models are only ranked on one estimator. The
+folds hold out sessions, like LOO, and are stratified by subject, so every
+subject keeps sessions in every training set. The report ranks the models by
+expected log predictive density, with the SE of the difference to the best
+model and the wall-clock cost of every model's fits.
+
+    python -m pw_bdt.model_comparison --models current old_shared_noise locke --max-workers 4
+"""
+import argparse
+import sys
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from pw_bdt.hierarchical_bayesian_model import (
+    HYPER_PRIOR_MU_D, PRIOR_MCE, build_model, load_sensitivity, subject_priors)
+
+OBSERVED = ('d_obs', 'meta_d_obs')
+
+
+def build_current_model(df, n_subjects):
+    """
+    hierarchical_bayesian_model.build_model: per-subject session noise sigma_subj.
+    """
+    return build_model(df, n_subjects)
+
+
+def build_old_model(df, n_subjects):
+    """
+    The earlier variant (old/hierarchical_bayesian_model_OLD.py): one session
+    noise sigma_obs shared by all subjects.
+    """
+    import pymc as pm
+    subject_idx = df['subject_idx'].values
+    with pm.Model() as model:
+        sigma_type1 = pm.Uniform("sigma_type1", lower=0.1, upper=5.0)
+        d_subj = pm.Normal("d_subj", mu=HYPER_PRIOR_MU_D, sigma=sigma_type1, shape=n_subjects)
+        sigma_obs = pm.Uniform("sigma_obs", lower=0.1, upper=5.0)
+        pm.Normal("d_obs", mu=d_subj[subject_idx], sigma=sigma_obs, observed=df['d_prime'].values)
+        sigma_type2 = pm.Uniform("sigma_type2", lower=0.1, upper=5.0)
+        meta_d_subj = pm.Normal("meta_d_subj", mu=PRIOR_MCE * d_subj, sigma=sigma_type2, shape=n_subjects)
+        pm.Normal("meta_d_obs", mu=meta_d_subj[subject_idx], sigma=sigma_obs, observed=df['meta_d_prime'].values)
+    return model
+
+
+def build_locke_model(df, n_subjects, mu_range=(0.0, 3.0), sigma_range=(0.1, 5.0)):
+    """
+    The structure of Locke's Stan model (data/locke/model_dPrime_hierarchicalBayes2.stan):
+    subject d′/meta-d′ bounded to mu_range with (untruncated) Normal population
+    priors, and every sd uniform on the log scale over sigma_range.
+    """
+    import pymc as pm
+    from pymc.distributions.transforms import Interval
+    subject_idx = df['subject_idx'].values
+    log_low, log_high = np.log(sigma_range[0]), np.log(sigma_range[1])
+    with pm.Model() as model:
+        log_sigma_type1 = pm.Uniform('log_sigma_type1', lower=log_low, upper=log_high)
+        log_sigma_type2 = pm.Uniform('log_sigma_type2', lower=log_low, upper=log_high)
+        log_sigma_subj = pm.Uniform('log_sigma_subj', lower=log_low, upper=log_high, shape=n_subjects)
+        sigma_type1 = pm.Deterministic('sigma_type1', pm.math.exp(log_sigma_type1))
+        sigma_type2 = pm.Deterministic('sigma_type2', pm.math.exp(log_sigma_type2))
+        sigma_subj = pm.Deterministic('sigma_subj', pm.math.exp(log_sigma_subj))
+        # Stan's bounded parameters: the Normal density restricted to mu_range, not renormalised
+        d_subj = pm.Normal('d_subj', mu=HYPER_PRIOR_MU_D, sigma=sigma_type1, shape=n_subjects,
+                           transform=Interval(*mu_range))
+        meta_d_subj = pm.Normal('meta_d_subj', mu=PRIOR_MCE * d_subj, sigma=sigma_type2, shape=n_subjects,
+                                transform=Interval(*mu_range))
+        pm.Normal('d_obs', mu=d_subj[subject_idx], sigma=sigma_subj[subject_idx], observed=df['d_prime'].values)
+        pm.Normal('meta_d_obs', mu=meta_d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                  observed=df['meta_d_prime'].values)
+    return model
+
+
+def build_student_t_model(df, n_subjects):
+    """
+    The current model with Student-t session noise, robust to outlying session estimates.
+    """
+    import pymc as pm
+    subject_idx = df['subject_idx'].values
+    with pm.Model() as model:
+        d_subj, meta_d_subj, sigma_subj = subject_priors(n_subjects)
+        nu = pm.Gamma('nu', alpha=2.0, beta=0.1)
+        pm.StudentT('d_obs', nu=nu, mu=d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                    observed=df['d_prime'].values)
+        pm.StudentT('meta_d_obs', nu=nu, mu=meta_d_subj[subject_idx], sigma=sigma_subj[subject_idx],
+                    observed=df['meta_d_prime'].values)
+    return model
+
+
+def build_separate_noise_model(df, n_subjects):
+    """
+    The current model with separate per-subject session noise for d′ and meta-d′.
+    """
+    import pymc as pm
+    subject_idx = df['subject_idx'].values
+    with pm.Model() as model:
+        d_subj, meta_d_subj, sigma_subj = subject_priors(n_subjects)
+        sigma_meta_subj = pm.Uniform('sigma_meta_subj', lower=0.1, upper=5.0, shape=n_subjects)
+        pm.Normal('d_obs', mu=d_subj[subject_idx], sigma=sigma_subj[subject_idx], observed=df['d_prime'].values)
+        pm.Normal('meta_d_obs', mu=meta_d_subj[subject_idx], sigma=sigma_meta_subj[subject_idx],
+                  observed=df['meta_d_prime'].values)
+    return model
+
+
+# Model builders by name; each takes the session table (with subject_idx) and the number of subjects
+MODELS = {
+    'current': build_current_model,
+    'old_shared_noise': build_old_model,
+    'locke': build_locke_model,
+    'student_t': build_student_t_model,
+    'separate_noise': build_separate_noise_model,
+}
+
+
+def session_log_likelihood(trace, model):
+    """
+    (chain, draw, session) log-likelihood of the model's observations at the
+    posterior draws of trace, d′ and meta-d′ summed per session.
+    """
+    import pymc as pm
+    import xarray as xr
+    log_lik = pm.compute_log_likelihood(trace, var_names=list(OBSERVED), model=model,
+                                        extend_inferencedata=False, progressbar=False)
+    total = sum(log_lik[name].values for name in OBSERVED)
+    return xr.DataArray(total, dims=('chain', 'draw', 'session'))
+
+
+def _pointwise_elpd(log_lik):
+    # log of the posterior mean likelihood of every held-out session
+    from scipy.special import logsumexp
+    draws = log_lik.reshape(-1, log_lik.shape[-1])
+    return logsumexp(draws, axis=0) - np.log(len(draws))
+
+
+def _fit_job(args):
+    """
+    Fit one model to all sessions and store the trace with its pointwise log-likelihood.
+    """
+    name, df, n_subjects, sample_kwargs, trace_path = args
+    import pymc as pm
+    start = time.perf_counter()
+    model = MODELS[name](df, n_subjects)
+    with model:
+        trace = pm.sample(return_inferencedata=True, progressbar=False, compute_convergence_checks=False,
+                          **sample_kwargs)
+    trace.add_groups(log_likelihood=session_log_likelihood(trace, model).to_dataset(name='session_obs'))
+    trace.to_netcdf(trace_path)
+    return name, trace_path, time.perf_counter() - start
+
+
+def _fold_job(args):
+    """
+    Fit one model without one fold of sessions and return the pointwise elpd of the held-out sessions.
+    """
+    name, fold, df, test, n_subjects, sample_kwargs = args
+    import pymc as pm
+    start = time.perf_counter()
+    build = MODELS[name]
+    with build(df[~test], n_subjects):
+        trace = pm.sample(return_inferencedata=True, progressbar=False, compute_convergence_checks=False,
+                          **sample_kwargs)
+    log_lik = session_log_likelihood(trace, build(df[test], n_subjects))
+    return name, fold, _pointwise_elpd(log_lik.values), time.perf_counter() - start
+
+
+def session_folds(df, k, seed=0):
+    """
+    Fold (0..k-1) of every session, stratified by subject: each subject's
+    sessions are shuffled and dealt round-robin, so the held-out unit is a
+    session, not a subject.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(df))
+    rank = pd.Series(order, index=df.index).groupby(df['subject']).rank(method='first').to_numpy(dtype=int) - 1
+    return rank % k
+
+
+def psis_loo(trace_path):
+    """
+    PSIS-LOO of a stored trace: pointwise elpd, Pareto k and the k threshold for its sample size.
+    """
+    import arviz as az
+    trace = az.from_netcdf(trace_path)
+    loo = az.loo(trace, var_name='session_obs', pointwise=True)
+    n_samples = trace.posterior.sizes['chain'] * trace.posterior.sizes['draw']
+    good_k = min(1 - 1 / np.log10(n_samples), 0.7)
+    return loo.loo_i.values, loo.pareto_k.values, good_k, float(loo.p_loo)
+
+
+def compare_models(df, n_subjects, trace_dir, models=tuple(MODELS), k_folds=10, draws=1000, tune=1000,
+                   chains=4, random_seed=0, max_workers=None, force_kfold=False):
+    """
+    Fit every model in a process pool and compare them by PSIS-LOO or, as soon
+    as the Pareto k diagnostics of any model fail (or with force_kfold), by
+    K-fold refits of all of them on the same folds. Returns the ranked report
+    and the pointwise elpd per model.
+    """
+    trace_dir = Path(trace_dir)
+    trace_dir.mkdir(parents=True, exist_ok=True)
+    sample_kwargs = dict(draws=draws, tune=tune, chains=chains, cores=1, random_seed=random_seed)
+    folds = session_folds(df, k_folds, seed=random_seed)
+
+    rows = {name: {'model': name, 'fit_s': 0.0, 'kfold_s': 0.0} for name in models}
+    loo_elpd = {}
+    fold_elpd = {name: np.full(len(df), np.nan) for name in models}
+    pending_folds = {name: 0 for name in models}
+    kfold = force_kfold
+
+    # max_tasks_per_child gives every fit a fresh process, so compiled graphs do not pile up
+    pool_kwargs = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=max_workers, **pool_kwargs) as pool:
+        running = {pool.submit(_fit_job, (name, df, n_subjects, sample_kwargs, trace_dir / f"{name}.nc")): 'fit'
+                   for name in models}
+        kfold_started = set()
+
+        def submit_folds(name):
+            for fold in range(k_folds):
+                running[pool.submit(_fold_job, (name, fold, df, folds == fold, n_subjects, sample_kwargs))] = 'fold'
+            pending_folds[name] = k_folds
+            kfold_started.add(name)
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind = running.pop(future)
+                if kind == 'fit':
+                    name, trace_path, wall_s = future.result()
+                    loo_i, pareto_k, good_k, p_loo = psis_loo(trace_path)
+                    n_high_k = int((pareto_k > good_k).sum())
+                    rows[name].update(fit_s=wall_s, p_loo=p_loo, max_k=float(pareto_k.max()), n_high_k=n_high_k)
+                    loo_elpd[name] = loo_i
+                    print(f"[fit] {name}: {wall_s:.1f}s, {n_high_k} Pareto k > {good_k:.2f}")
+                    kfold = kfold or n_high_k > 0
+                    # once one model needs K-fold, all of them are refitted on the same folds
+                    if kfold:
+                        for other in [m for m in models if m in loo_elpd and m not in kfold_started]:
+                            submit_folds(other)
+                else:
+                    name, fold, elpd_i, wall_s = future.result()
+                    fold_elpd[name][folds == fold] = elpd_i
+                    rows[name]['kfold_s'] += wall_s
+                    pending_folds[name] -= 1
+                    if pending_folds[name] == 0:
+                        print(f"[kfold] {name}: {rows[name]['kfold_s']:.1f}s over {k_folds} refits")
+
+    method = f'{k_folds}_fold' if kfold else 'psis_loo'
+    pointwise = fold_elpd if kfold else loo_elpd
+    for name in models:
+        rows[name]['method'] = method
+
+    report = pd.DataFrame([rows[name] for name in models])
+    report['elpd'] = [pointwise[name].sum() for name in models]
+    report['se'] = [np.sqrt(len(df) * pointwise[name].var()) for name in models]
+    best = models[int(report['elpd'].to_numpy().argmax())]
+    report['elpd_diff'] = report['elpd'].max() - report['elpd']
+    report['dse'] = [np.sqrt(len(df) * (pointwise[best] - pointwise[name]).var()) for name in models]
+    report['wall_s'] = report['fit_s'] + report['kfold_s']
+    report = report.sort_values('elpd', ascending=False, ignore_index=True)
+    report.insert(0, 'rank', np.arange(1, len(report) + 1))
+    columns = ['rank', 'model', 'method', 'elpd', 'se', 'elpd_diff', 'dse', 'p_loo', 'n_high_k', 'max_k',
+               'fit_s', 'kfold_s', 'wall_s']
+    return report[columns], pointwise
+
+
+def run_comparison(data_path, report_path, trace_dir, pointwise_path=None, **compare_kwargs):
+    """
+    compare_models on a session-level sensitivity table; writes the report
+    and, optionally, the pointwise elpd of every model per session.
+    """
+    df, subjects = load_sensitivity(data_path)
+    report, pointwise = compare_models(df, len(subjects), trace_dir, **compare_kwargs)
+    print(report.to_string(index=False))
+    report.to_csv(report_path, index=False)
+    print("Saved model comparison to", report_path)
+    if pointwise_path is not None:
+        df[['subject', 'session']].assign(**pointwise).to_csv(pointwise_path, index=False)
+    return report
+
+
+def main():
+    root = Path(__file__).resolve().parent.parent
+    parser = argparse.ArgumentParser(description="Compare hierarchical model variants by PSIS-LOO / K-fold.")
+    parser.add_argument('--data', type=Path, default=root / "data" / "sensitivity_per_subject_per_session.csv")
+    parser.add_argument('--models', nargs='*', default=list(MODELS), choices=list(MODELS))
+    parser.add_argument('--k-folds', type=int, default=10)
+    parser.add_argument('--force-kfold', action='store_true', help="K-fold every model even if all Pareto k pass")
+    parser.add_argument('--draws', type=int, default=1000)
+    parser.add_argument('--tune', type=int, default=1000)
+    parser.add_argument('--chains', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-workers', type=int, default=None, help="concurrent fits (default: one per CPU)")
+    parser.add_argument('--output', type=Path, default=root / "data" / "model_comparison.csv")
+    parser.add_argument('--trace-dir', type=Path, default=root / "data" / "model_comparison_traces")
+    args = parser.parse_args()
+
+    run_comparison(args.data, args.output, args.trace_dir,
+                   pointwise_path=args.output.with_name(args.output.stem + '_pointwise.csv'),
+                   models=tuple(args.models), k_folds=args.k_folds, force_kfold=args.force_kfold,
+                   draws=args.draws, tune=args.tune, chains=args.chains, random_seed=args.seed,
+                   max_workers=args.max_workers)
+
+
+if __name__ == "__main__":
+    main()
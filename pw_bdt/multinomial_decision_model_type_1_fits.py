@@ -1,17 +1,21 @@
-import pymc as pm
 import numpy as np
-from scipy.stats import norm
+import pandas as pd
+from pathlib import Path
+from scipy.optimize import minimize
+from scipy.special import log_ndtr
+from pw_bdt.sensitivity_fits import build_count_tensor, discard_warmup_trials, dprime_from_counts
+from pw_bdt.trial_store import load_trials
 
 
 
 """
-    
+
     2 x 2 cont table per subject per sess
-    
+
     count tbale is a contingency table of stim x response  with counts in each bin
-    
+
     This is N_{res, stim}
-    
+
     Group the data by participant and session.
 
 Tabulate the counts for (stimulus, r1).
@@ -23,43 +27,141 @@ Shared parameters per participant
 Session-specific priors/payoffs as input to the model
 
 Optimise
-    
+
 """
 
+CONDITION_KEYS = ['subject', 'session', 'pR_pL', 'vR_vL']
 
-def binomial_likelihood():
-    
-    pass
 
-def joint_distribution_r_s(stim, alpha, gamma, d_prime, pR_pL, vR_vL):
-    
+def condition_counts(df):
+    """
+    Stimulus x r1 counts for every (subject, session, pR_pL, vR_vL) cell.
+
+    Returns the cell keys, the (n_cells, 2, 2) counts indexed [stimulus, r1]
+    and the d' of every cell.
+    """
+    cells, counts = build_count_tensor(df, keys=CONDITION_KEYS)
+    return cells, counts.sum(axis=-1), dprime_from_counts(counts)
+
+
+def optimal_criterion(d_prime, pR_pL, vR_vL):
+    """
+    Ideal observer criterion k_opt = ln(beta_opt) / d' for the prior and payoff ratios.
+    """
     # optimal likelihood ratio
-    p_r = pR_pL / 1 + pR_pL
+    p_r = pR_pL / (1 + pR_pL)
     p_l = 1 - p_r
-    
+
     v_r = vR_vL
     v_l = 1
-    
-    ln_beta_opt = np.log(p_l/p_r) + np.log(v_l/v_r)
-    
+
+    ln_beta_opt = np.log(p_l / p_r) + np.log(v_l / v_r)
+
     # Convert to optimal criterion
-    k_opt = 1/d_prime * ln_beta_opt
-    
+    return np.divide(ln_beta_opt, d_prime, out=np.zeros(np.shape(ln_beta_opt)), where=d_prime != 0)
+
+
+def type1_log_likelihood(k1, counts, d_prime, log_ndtr=log_ndtr):
+    """
+    Log-likelihood of (..., 2, 2) stimulus x r1 counts for criteria k1.
+
+    Written as a single array expression so that k1 can be a NumPy array or a
+    PyTensor variable; pass the matching log normal-CDF as `log_ndtr`.
+    """
+    # P(r1 = 0 | left) = Phi(k1 + d'/2), P(r1 = 1 | right) = Phi(d'/2 - k1)
+    z_left = k1 + d_prime / 2
+    z_right = d_prime / 2 - k1
+    return (counts[..., 0, 0] * log_ndtr(z_left) + counts[..., 0, 1] * log_ndtr(-z_left)
+            + counts[..., 1, 1] * log_ndtr(z_right) + counts[..., 1, 0] * log_ndtr(-z_right))
+
+
+def _dlog_ndtr(z):
+    # derivative of log Phi(z): the inverse Mills ratio phi(z) / Phi(z)
+    return np.exp(-0.5 * z ** 2 - 0.5 * np.log(2 * np.pi) - log_ndtr(z))
+
+
+def type1_log_likelihood_grad(k1, counts, d_prime):
+    """
+    Derivative of type1_log_likelihood with respect to k1, per cell.
+    """
+    z_left = k1 + d_prime / 2
+    z_right = d_prime / 2 - k1
+    return (counts[..., 0, 0] * _dlog_ndtr(z_left) - counts[..., 0, 1] * _dlog_ndtr(-z_left)
+            - counts[..., 1, 1] * _dlog_ndtr(z_right) + counts[..., 1, 0] * _dlog_ndtr(-z_right))
+
+
+def criterion_k1(alpha, gamma, k_opt):
+    """
+    Conservative criterion: k1 = alpha * k_opt + gamma.
+    """
     # apply conservatism
-    k_1 = alpha * k_opt + gamma
-    
-    # Compute decision probabilities
-    if stim == 0:  # Left stimulus
-        p_resp_L = norm.cdf(k1 + dprime/2)
-        return {0: p_resp_L, 1: 1 - p_resp_L}
-    else:  # Right stimulus
-        p_resp_R = 1 - norm.cdf(k1 - dprime/2)
-        return {1: p_resp_R, 0: 1 - p_resp_R}
-    
-
-with pm.Model() as model:
-    theta = pm.Uniform('theta', lower=0, upper=1)  # flat prior
-    likelihood = pm.Binomial('obs', n=n, p=theta, observed=k)
-    
-    # MAP estimate (corresponds to ML if prior is uniform)
-    map_estimate = pm.find_MAP()
\ No newline at end of file
+    return alpha * k_opt + gamma
+
+
+def fit_type1_mle(cells, counts, d_prime):
+    """
+    Fit alpha (conservatism) and gamma (bias) per subject by maximum likelihood.
+
+    All subjects are fitted in one L-BFGS-B run over the full count tensor;
+    their parameters are independent, so this equals separate per-subject fits.
+    """
+    subjects, subject_idx = np.unique(cells['subject'].to_numpy(), return_inverse=True)
+    n_subjects = len(subjects)
+    k_opt = optimal_criterion(d_prime, cells['pR_pL'].to_numpy(), cells['vR_vL'].to_numpy())
+
+    def objective(x):
+        alpha, gamma = x[:n_subjects], x[n_subjects:]
+        k1 = criterion_k1(alpha[subject_idx], gamma[subject_idx], k_opt)
+        dk1 = type1_log_likelihood_grad(k1, counts, d_prime)
+        grad = np.r_[np.bincount(subject_idx, dk1 * k_opt, n_subjects),
+                     np.bincount(subject_idx, dk1, n_subjects)]
+        return -type1_log_likelihood(k1, counts, d_prime).sum(), -grad
+
+    x0 = np.r_[np.ones(n_subjects), np.zeros(n_subjects)]
+    fit = minimize(objective, x0, jac=True, method='L-BFGS-B')
+    return pd.DataFrame({'subject': subjects,
+                         'alpha': fit.x[:n_subjects],
+                         'gamma': fit.x[n_subjects:]})
+
+
+def build_pymc_model(cells, counts, d_prime):
+    """
+    PyMC model with per-subject alpha and gamma whose likelihood is the same
+    type1_log_likelihood expression, evaluated on PyTensor variables.
+    """
+    import pymc as pm
+    from pymc.distributions.dist_math import normal_lcdf
+
+    subjects, subject_idx = np.unique(cells['subject'].to_numpy(), return_inverse=True)
+    k_opt = optimal_criterion(d_prime, cells['pR_pL'].to_numpy(), cells['vR_vL'].to_numpy())
+
+    with pm.Model(coords={'subject': subjects}) as model:
+        alpha = pm.Normal('alpha', mu=1.0, sigma=1.0, dims='subject')
+        gamma = pm.Normal('gamma', mu=0.0, sigma=1.0, dims='subject')
+        k1 = criterion_k1(alpha[subject_idx], gamma[subject_idx], k_opt)
+        pm.Potential('type1_loglik',
+                     type1_log_likelihood(k1, counts, d_prime, log_ndtr=lambda z: normal_lcdf(0, 1, z)).sum())
+    return model
+
+
+def main():
+    current_dir = Path(__file__).resolve().parent
+    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
+
+    df = load_trials(data_path, columns=CONDITION_KEYS + ['stimulus', 'r1', 'r2'])
+    df = discard_warmup_trials(df, warmup_count=100)
+    cells, counts, d_prime = condition_counts(df)
+
+    fits = fit_type1_mle(cells, counts, d_prime)
+    print(fits)
+
+    import pymc as pm
+    with build_pymc_model(cells, counts, d_prime):
+        # MAP estimate under the Normal(1, 1) and Normal(0, 1) priors on alpha and gamma,
+        # so it is shrunk slightly towards them relative to fit_type1_mle
+        map_estimate = pm.find_MAP()
+    print(map_estimate['alpha'], map_estimate['gamma'])
+
+
+if __name__ == "__main__":
+    main()
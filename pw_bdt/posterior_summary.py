@@ -0,0 +1,104 @@
+"""
+Lazy posterior summaries for large traces.
+
+Only the requested variables are read, in blocks along their first
+parameter dimension (e.g. subjects) and in chunks along draws, so a trace
+of thousands of subjects never has to be in memory at once. Results are
+arrays indexed like the variable itself, with no string labels involved.
+"""
+from typing import NamedTuple
+import numpy as np
+from pathlib import Path
+
+
+class PosteriorSummary(NamedTuple):
+    mean: np.ndarray
+    hdi_low: np.ndarray
+    hdi_high: np.ndarray
+
+
+def open_posterior(source):
+    """
+    Posterior group of an InferenceData object, or of a NetCDF file opened lazily.
+    """
+    if isinstance(source, (str, Path)):
+        import xarray as xr
+        return xr.open_dataset(source, group='posterior', cache=False)
+    return source.posterior
+
+
+def hdi_sorted(samples, hdi_prob):
+    """
+    Highest density interval of every column of (n_samples, n_params) samples.
+
+    Same algorithm as arviz.hdi: the narrowest of the intervals spanning
+    floor(hdi_prob * n) sorted samples.
+    """
+    samples = np.sort(samples, axis=0)
+    n = samples.shape[0]
+    interval_idx_inc = int(np.floor(hdi_prob * n))
+    if interval_idx_inc >= n:
+        raise ValueError("Too few elements for interval calculation.")
+    widths = samples[interval_idx_inc:] - samples[:n - interval_idx_inc]
+    min_idx = np.argmin(widths, axis=0)[None]
+    return (np.take_along_axis(samples, min_idx, axis=0)[0],
+            np.take_along_axis(samples, min_idx + interval_idx_inc, axis=0)[0])
+
+
+def _read_block(da, block, draw_chunk):
+    """
+    Samples of one parameter block (an index tuple over the parameter
+    dimensions) as an (n_chain * n_draw, n_params) array, read from the
+    (possibly lazy) DataArray in chunks of draw_chunk draws.
+    """
+    n_chain, n_draw = da.shape[:2]
+    first = da[(slice(None), slice(0, 0)) + block]
+    n_params = int(np.prod(first.shape[2:], dtype=int))
+    out = np.empty((n_chain, n_draw, n_params))
+    for start in range(0, n_draw, draw_chunk):
+        stop = min(start + draw_chunk, n_draw)
+        out[:, start:stop] = np.asarray(da[(slice(None), slice(start, stop)) + block].values).reshape(
+            n_chain, stop - start, n_params)
+    return out.reshape(n_chain * n_draw, n_params)
+
+
+def summarize_variable(da, hdi_prob=0.95, draw_chunk=500, max_block_bytes=2 ** 27):
+    """
+    Posterior mean and HDI of one variable, shaped like its parameter dimensions.
+    """
+    da = da.transpose('chain', 'draw', ...)
+    n_chain, n_draw = da.shape[:2]
+    param_shape = da.shape[2:]
+    if not param_shape:
+        blocks = [()]
+    else:
+        # block along the first parameter dimension so that every block fits in max_block_bytes
+        per_row = n_chain * n_draw * int(np.prod(param_shape[1:], dtype=int)) * 8
+        step = max(1, max_block_bytes // per_row)
+        blocks = [(slice(start, start + step),) for start in range(0, param_shape[0], step)]
+
+    means, lows, highs = [], [], []
+    for block in blocks:
+        samples = _read_block(da, block, draw_chunk)
+        means.append(samples.mean(axis=0))
+        low, high = hdi_sorted(samples, hdi_prob)
+        lows.append(low)
+        highs.append(high)
+    return PosteriorSummary(*(np.concatenate(part).reshape(param_shape) for part in (means, lows, highs)))
+
+
+def summarize_posterior(source, var_names, hdi_prob=0.95, draw_chunk=500, max_block_bytes=2 ** 27):
+    """
+    Mean and HDI of the requested variables of a trace (InferenceData or NetCDF path).
+
+    Returns {var_name: PosteriorSummary}, each field an array indexed like the
+    variable's parameter dimensions (a 0-d array for scalars).
+    """
+    posterior = open_posterior(source)
+    try:
+        return {name: summarize_variable(posterior[name], hdi_prob=hdi_prob, draw_chunk=draw_chunk,
+                                         max_block_bytes=max_block_bytes)
+                for name in var_names}
+    finally:
+        if isinstance(source, (str, Path)):
+            posterior.close()
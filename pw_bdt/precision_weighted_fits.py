@@ -0,0 +1,146 @@
+"""
+Precision-weighted criterion model.
+
+The prior ratio pR_pL and payoff ratio vR_vL each imply an optimal
+criterion shift, k_p = ln(pL/pR) / d' and k_v = ln(vL/vR) / d'.
+Observers weight them by alpha_p and alpha_v; when both are shifted in
+the same session the combination is scaled again by alpha_pv:
+
+    k1 = alpha_pv * (alpha_p * k_p + alpha_v * k_v) + gamma
+
+alpha_pv only applies to the sessions where both k_p and k_v are
+non-zero (otherwise it could not be told apart from alpha_p and
+alpha_v), and gamma is the response bias of the neutral condition.
+In the sessions where both are shifted, k_p and k_v have opposite signs,
+so the combination is often close to zero and alpha_pv poorly identified;
+the fits are therefore kept within PARAM_BOUNDS.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from scipy.optimize import minimize
+from pw_bdt.multinomial_decision_model_type_1_fits import (
+    CONDITION_KEYS, condition_counts, type1_log_likelihood, type1_log_likelihood_grad)
+from pw_bdt.sensitivity_fits import discard_warmup_trials
+from pw_bdt.trial_store import load_trials
+
+PARAMS = ['alpha_pv', 'alpha_p', 'alpha_v', 'gamma']
+
+# L-BFGS-B box for every parameter in PARAMS; fits that end on an edge are reported in `at_bound`
+PARAM_BOUNDS = {'alpha_pv': (0.0, 10.0), 'alpha_p': (-5.0, 5.0), 'alpha_v': (-5.0, 5.0), 'gamma': (None, None)}
+
+
+def criterion_components(d_prime, pR_pL, vR_vL):
+    """
+    Prior-driven and value-driven optimal criteria (k_p, k_v) for every condition.
+    """
+    d_prime = np.asarray(d_prime, dtype=float)
+    safe_d = np.where(d_prime != 0, d_prime, np.inf)
+    k_p = np.log(1 / np.asarray(pR_pL)) / safe_d
+    k_v = np.log(1 / np.asarray(vR_vL)) / safe_d
+    return k_p, k_v
+
+
+def precision_weighted_k1(alpha_pv, alpha_p, alpha_v, k_p, k_v, gamma=0.0):
+    """
+    Array version of test.get_k1, with alpha_pv applied only where both
+    the prior and the value criterion are shifted.
+    """
+    weight = np.where((k_p != 0) & (k_v != 0), alpha_pv, 1.0)
+    return weight * ((alpha_p * k_p) + (alpha_v * k_v)) + gamma
+
+
+def _negative_log_likelihood(theta, counts, d_prime, k_p, k_v):
+    alpha_pv, alpha_p, alpha_v, gamma = theta
+    k1 = precision_weighted_k1(alpha_pv, alpha_p, alpha_v, k_p, k_v, gamma)
+
+    both = (k_p != 0) & (k_v != 0)
+    weight = np.where(both, alpha_pv, 1.0)
+    combined = alpha_p * k_p + alpha_v * k_v
+
+    dk1 = type1_log_likelihood_grad(k1, counts, d_prime)
+    grad = np.array([(dk1 * both * combined).sum(),
+                     (dk1 * weight * k_p).sum(),
+                     (dk1 * weight * k_v).sum(),
+                     dk1.sum()])
+    return -type1_log_likelihood(k1, counts, d_prime).sum(), -grad
+
+
+def fit_precision_weighted(counts, d_prime, k_p, k_v, x0=None):
+    """
+    Maximum-likelihood (alpha_pv, alpha_p, alpha_v, gamma) for one set of cells,
+    within PARAM_BOUNDS.
+    """
+    x0 = np.array([1.0, 1.0, 1.0, 0.0]) if x0 is None else np.asarray(x0, dtype=float)
+    fit = minimize(_negative_log_likelihood, x0, args=(counts, d_prime, k_p, k_v),
+                   jac=True, method='L-BFGS-B', bounds=[PARAM_BOUNDS[p] for p in PARAMS],
+                   options={'ftol': 1e-15, 'gtol': 1e-8})
+    return fit.x, fit.fun, fit.success
+
+
+def params_at_bound(theta, rtol=1e-6):
+    """
+    Names of the parameters of a fit that ended on an edge of PARAM_BOUNDS.
+    """
+    at_bound = []
+    for name, value in zip(PARAMS, theta):
+        for edge in PARAM_BOUNDS[name]:
+            if edge is not None and np.isclose(value, edge, rtol=rtol, atol=rtol):
+                at_bound.append(name)
+    return at_bound
+
+
+def _fit_subject(args):
+    subject, counts, d_prime, k_p, k_v, x0 = args
+    theta, nll, converged = fit_precision_weighted(counts, d_prime, k_p, k_v, x0=x0)
+    return {'subject': subject, **dict(zip(PARAMS, theta)), 'nll': nll, 'converged': converged,
+            'at_bound': ','.join(params_at_bound(theta))}
+
+
+def fit_cohort(cells, counts, d_prime, max_workers=None):
+    """
+    Fit the precision-weighted criterion model per subject for a whole cohort.
+
+    A single pooled fit over every subject's cells gives a shared warm start;
+    the per-subject fits then run in parallel across a process pool. The
+    parameters are per subject and shared by all of its sessions, so there
+    is no per-session fit to warm-start from the previous session; the
+    pooled fit plays that role for every subject. The `at_bound` column
+    lists the parameters that ended on an edge of PARAM_BOUNDS, whose
+    estimates are only limits.
+    """
+    k_p, k_v = criterion_components(d_prime, cells['pR_pL'], cells['vR_vL'])
+    pooled, _, _ = fit_precision_weighted(counts, d_prime, k_p, k_v)
+
+    subjects = cells['subject'].to_numpy()
+    jobs = [(s, counts[subjects == s], d_prime[subjects == s], k_p[subjects == s], k_v[subjects == s], pooled)
+            for s in np.unique(subjects)]
+    if max_workers == 1:
+        results = list(map(_fit_subject, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(_fit_subject, jobs, chunksize=max(1, len(jobs) // 64)))
+    fits = pd.DataFrame(results)
+    for _, fit in fits[fits['at_bound'] != ''].iterrows():
+        print(f"Subject {fit['subject']}: {fit['at_bound']} at the edge of PARAM_BOUNDS")
+    return fits
+
+
+def main():
+    current_dir = Path(__file__).resolve().parent
+    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
+    save_path = current_dir.parent / "data" / "precision_weighted_fits_per_subject.csv"
+
+    df = load_trials(data_path, columns=CONDITION_KEYS + ['stimulus', 'r1', 'r2'])
+    df = discard_warmup_trials(df, warmup_count=100)
+    cells, counts, d_prime = condition_counts(df)
+
+    fits = fit_cohort(cells, counts, d_prime)
+    print(fits)
+    fits.to_csv(save_path, index=False)
+    print("Saved precision-weighted fits to", save_path)
+
+
+if __name__ == "__main__":
+    main()
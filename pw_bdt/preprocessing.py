@@ -1,25 +1,35 @@
-import pandas as pd
-import numpy as np
-from scipy.stats import norm
 from pathlib import Path
+from pw_bdt.trial_store import load_trials
 
-# Load data
-current_dir = Path(__file__).resolve().parent
-data_path = current_dir.parent / "data" / "rawChoiceData.txt"
 
-df = pd.read_csv(data_path, sep=",")
+def describe_trials(df):
+    """
+    Number of participants, sessions per participant and trials per session of a trial frame.
+    """
+    return {'n_participants': df['subject'].nunique(),
+            'n_sessions': df['session'].nunique(),
+            'n_trials': df['trial'].nunique()}
 
-# Number of unique participants
-n_participants = df['subject'].nunique()
-print(f"Number of participants: {n_participants}")
 
-# Number of unique sessions
-n_sessions = df['session'].nunique()
-print(f"Number of sessions per participants: {n_sessions}")
+def main():
+    # Load data
+    current_dir = Path(__file__).resolve().parent
+    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
 
-# Number of unique sessions
-n_trials = df['trial'].nunique()
-print(f"Number of trials per session: {n_trials}")
+    df = load_trials(data_path)
+    counts = describe_trials(df)
 
-print(df.columns)
+    # Number of unique participants
+    print(f"Number of participants: {counts['n_participants']}")
 
+    # Number of unique sessions
+    print(f"Number of sessions per participants: {counts['n_sessions']}")
+
+    # Number of unique sessions
+    print(f"Number of trials per session: {counts['n_trials']}")
+
+    print(df.columns)
+
+
+if __name__ == "__main__":
+    main()
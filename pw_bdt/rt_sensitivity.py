@@ -0,0 +1,146 @@
+"""
+d′, meta-d′ and confidence calibration conditioned on response-time quantiles.
+
+Every subject-session's trials are split into `n_bins` quantile bins of RT1
+(and/or RT2), and the stimulus × r1 × r2 counts are tabulated per bin with
+the same bincount as sensitivity_fits, giving a count tensor of shape
+(n_groups, n_bins, ..., 2, 2, 2). The d′/meta-d′ functions work on any
+leading dimensions, so the bins cost one larger bincount, not a pass per bin.
+"""
+import numpy as np
+from pathlib import Path
+from pw_bdt.sensitivity_fits import (
+    count_tensor_from_codes, dprime_from_counts, meta_dprime_from_counts, store_warmup_mask)
+from pw_bdt.trial_store import open_store
+
+
+def quantile_bins(codes, values, n_bins, n_groups=None):
+    """
+    Quantile bin (0..n_bins-1) of every value within its group.
+
+    One lexsort by (group, value) ranks all groups at once; a value's bin is
+    floor(rank * n_bins / group size), so bins hold equal numbers of trials
+    (±1) and ties are split by row order.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    if n_groups is None:
+        n_groups = int(codes.max()) + 1 if codes.size else 0
+    order = np.lexsort((values, codes))
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.cumsum(sizes) - sizes
+    sorted_codes = codes[order]
+    rank = np.arange(len(codes)) - starts[sorted_codes]
+    bins = np.empty(len(codes), dtype=np.int64)
+    bins[order] = rank * n_bins // sizes[sorted_codes]
+    return bins
+
+
+def rt_count_tensor(store, n_bins=4, rt_columns=('RT1',), warmup_count=100, by='position'):
+    """
+    Count tensor of a TrialStore per subject-session and RT quantile bin.
+
+    Quantiles are taken per group after warm-up trimming, separately for
+    every column in rt_columns. Returns the groups, the counts of shape
+    (n_groups, n_bins, ..., 2, 2, 2) with one bin axis per RT column, and
+    {column: mean RT per cell} for every RT column.
+    """
+    codes = store.group_codes()
+    keep = store_warmup_mask(store, codes, warmup_count, by)
+    codes = codes[keep]
+    n_groups = len(store.groups)
+
+    cell_codes = codes.astype(np.int64)
+    for column in rt_columns:
+        cell_codes = cell_codes * n_bins + quantile_bins(codes, store.column(column)[keep], n_bins, n_groups)
+    n_cells = n_groups * n_bins ** len(rt_columns)
+    shape = (n_groups,) + (n_bins,) * len(rt_columns)
+
+    counts = count_tensor_from_codes(cell_codes, n_cells, store.column('stimulus')[keep],
+                                     store.column('r1')[keep], store.column('r2')[keep])
+    n_trials = np.bincount(cell_codes, minlength=n_cells)
+    rt_mean = {column: np.divide(np.bincount(cell_codes, store.column(column)[keep], minlength=n_cells), n_trials,
+                                 out=np.full(n_cells, np.nan), where=n_trials > 0).reshape(shape)
+               for column in rt_columns}
+    return store.groups.copy(), counts.reshape(shape + (2, 2, 2)), rt_mean
+
+
+def confidence_calibration(counts):
+    """
+    Accuracy and confidence measures of a (..., 2, 2, 2) count tensor indexed [stimulus, r1, r2]:
+    accuracy, the high-confidence rate, accuracy after high and low confidence,
+    their difference (resolution) and high-confidence rate minus accuracy
+    (over-confidence). Rates of empty cells are NaN.
+    """
+    correct = counts[..., 0, 0, :] + counts[..., 1, 1, :]      # (..., r2)
+    n_conf = counts.sum(axis=(-3, -2))                         # (..., r2)
+    n = n_conf.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        accuracy = correct.sum(axis=-1) / n
+        high_rate = n_conf[..., 1] / n
+        accuracy_by_conf = correct / n_conf
+    return {
+        'accuracy': accuracy,
+        'high_confidence_rate': high_rate,
+        'accuracy_high': accuracy_by_conf[..., 1],
+        'accuracy_low': accuracy_by_conf[..., 0],
+        'resolution': accuracy_by_conf[..., 1] - accuracy_by_conf[..., 0],
+        'overconfidence': high_rate - accuracy,
+    }
+
+
+def rt_sensitivity_table(groups, counts, rt_mean, correction=0.5):
+    """
+    Tidy table with one row per subject-session and RT bin: the bin indices,
+    trial count and mean RT of every binned column, d′, meta-d′, M-ratio and
+    the confidence_calibration measures. Cells without trials (e.g. joint
+    RT1 x RT2 bins that no trial falls in) get NaN measures.
+    """
+    columns = list(rt_mean)
+    bin_shape = counts.shape[1:-3]
+    n_cells = int(np.prod(bin_shape))
+    bin_index = np.indices(bin_shape).reshape(len(bin_shape), -1)
+
+    result = groups.loc[groups.index.repeat(n_cells)].reset_index(drop=True)
+    for column, index in zip(columns, bin_index):
+        result[f'{column}_bin'] = np.tile(index, len(groups))
+    flat = counts.reshape(-1, 2, 2, 2)
+    result['n_trials'] = flat.sum(axis=(1, 2, 3))
+    for column in columns:
+        result[f'{column}_mean'] = rt_mean[column].reshape(-1)
+
+    # the edge correction would give empty cells d′ = meta-d′ = 0
+    empty = result['n_trials'].to_numpy() == 0
+    result['d_prime'] = np.where(empty, np.nan, dprime_from_counts(flat, correction))
+    result['meta_d_prime'] = np.where(empty, np.nan, meta_dprime_from_counts(flat, correction))
+    result['m_ratio'] = result['meta_d_prime'] / result['d_prime']
+    for name, values in confidence_calibration(flat).items():
+        result[name] = values
+    return result
+
+
+def run_rt_sensitivity(data_path, save_path, n_bins=4, rt_columns=('RT1',), warmup_count=100, by='position',
+                       correction=0.5):
+    """
+    RT-binned sensitivity table of one trial log, written to save_path.
+    """
+    groups, counts, rt_mean = rt_count_tensor(open_store(data_path), n_bins=n_bins, rt_columns=rt_columns,
+                                              warmup_count=warmup_count, by=by)
+    result = rt_sensitivity_table(groups, counts, rt_mean, correction=correction)
+    result.to_csv(save_path, index=False)
+    print("Saved RT-binned sensitivity to", save_path)
+    return result
+
+
+def main(n_bins=4, rt_columns=('RT1',)):
+    current_dir = Path(__file__).resolve().parent
+    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
+    save_path = current_dir.parent / "data" / f"sensitivity_per_{'_'.join(rt_columns)}_bin.csv"
+
+    result = run_rt_sensitivity(data_path, save_path, n_bins=n_bins, rt_columns=rt_columns)
+    bin_columns = [f'{c}_bin' for c in rt_columns]
+    print(result.groupby(bin_columns)[['d_prime', 'meta_d_prime', 'accuracy', 'high_confidence_rate',
+                                       'resolution']].mean())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,125 +1,374 @@
+import hashlib
+import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from pw_bdt.helpers.utils import z_transform
-from pw_bdt.helpers.plots import plot_dprime_per_sub_per_session
+from pw_bdt.helpers.utils import z_transform_counts
+from pw_bdt.instrumentation import profiled, record_groups, stage
+from pw_bdt.trial_store import TRIAL_SCHEMA, open_store
 
-def discard_warmup_trials(df, warmup_count=100):
+def warmup_cutoffs(groups, warmup_count):
+    """
+    Per-group warm-up counts for a frame of (subject, session) groups.
+
+    warmup_count is either a single count for every group or a mapping/Series
+    keyed by (subject, session); groups missing from the mapping keep all trials.
+    """
+    if not isinstance(warmup_count, (dict, pd.Series)):
+        return np.full(len(groups), warmup_count)
+    per_group = pd.Series(warmup_count)
+    return per_group.reindex(pd.MultiIndex.from_frame(groups)).fillna(0).to_numpy(dtype=int)
+
+
+def warmup_mask(df, warmup_count=100, by='position', keys=('subject', 'session')):
+    """
+    Boolean row mask that drops the warm-up trials of each subject-session pair.
+
+    by='position' drops the first N rows of each group, by='trial' drops the
+    rows whose trial number is <= N.
+    """
+    grouped = df.groupby(list(keys), sort=True)
+    codes = grouped.ngroup().to_numpy()
+    cutoffs = warmup_cutoffs(grouped.size().index.to_frame(index=False), warmup_count)
+
+    if by == 'position':
+        position = grouped.cumcount().to_numpy()
+    elif by == 'trial':
+        position = df['trial'].to_numpy() - 1
+    else:
+        raise ValueError(f"Unknown warm-up trimming mode: {by!r}")
+
+    return position >= cutoffs[codes]
+
+
+def discard_warmup_trials(df, warmup_count=100, by='position'):
     """
     Remove the first N (e.g., 100) trials from each subject-session pair.
     """
-    return df.groupby(['subject', 'session'], group_keys=False).apply(lambda g: g.iloc[warmup_count:])
+    return df[warmup_mask(df, warmup_count, by=by)]
 
 
-def compute_dprime(group):
+def count_tensor_from_codes(codes, n_groups, stimulus, r1, r2):
     """
-        Function to compute d' per ppt per session
+    Bincount integer group codes and binary stimulus/r1/r2 columns into a
+    (n_groups, 2, 2, 2) count tensor.
+    """
+    cell = 4 * np.asarray(stimulus, dtype=np.int64) + 2 * np.asarray(r1) + np.asarray(r2)
+    counts = np.bincount(8 * np.asarray(codes, dtype=np.int64) + cell, minlength=8 * n_groups)
+    return counts.reshape(n_groups, 2, 2, 2)
+
+
+def build_count_tensor(df, keys=('subject', 'session')):
+    """
+    Tabulate stimulus x r1 x r2 counts for every group in a single pass.
+
+    Returns the sorted group keys (one row per group) and an integer array of
+    shape (n_groups, 2, 2, 2) indexed as [group, stimulus, r1, r2].
+    """
+    grouped = df.groupby(list(keys), sort=True)
+    codes = grouped.ngroup().to_numpy()
+    groups = grouped.size().index.to_frame(index=False)
+
+    counts = count_tensor_from_codes(codes, len(groups), df['stimulus'], df['r1'], df['r2'])
+    return groups, counts
+
+
+def store_positions(store, codes, by='position'):
+    """
+    0-based position of every store row within its group (by='position') or
+    its trial number - 1 (by='trial'); codes are store.group_codes().
+    """
+    if by == 'position':
+        return np.arange(store.n_rows) - store.offsets[codes]
+    if by == 'trial':
+        return store.column('trial') - 1
+    raise ValueError(f"Unknown warm-up trimming mode: {by!r}")
+
+
+def store_warmup_mask(store, codes, warmup_count=100, by='position'):
+    """
+    Boolean mask of the store rows kept after warm-up trimming; codes are store.group_codes().
+    """
+    cutoffs = warmup_cutoffs(store.groups, warmup_count)
+    return store_positions(store, codes, by) >= cutoffs[codes]
+
+
+def store_count_tensor(store, warmup_count=100, by='position'):
+    """
+    Count tensor of a TrialStore after warm-up trimming, computed straight from
+    the memory-mapped columns and group offsets without building a DataFrame.
+    """
+    codes = store.group_codes()
+    keep = store_warmup_mask(store, codes, warmup_count, by)
+    counts = count_tensor_from_codes(codes[keep], len(store.groups), store.column('stimulus')[keep],
+                                     store.column('r1')[keep], store.column('r2')[keep])
+    return store.groups.copy(), counts
+
+
+class CountAccumulator:
+    """
+    Running per-(subject, session) count tensor that is fed chunks of trials.
+
+    The number of trials already seen in every group is kept, so warm-up
+    trimming by position carries across chunk boundaries. Memory grows with
+    the number of groups, not with the number of trials.
+    """
+
+    def __init__(self, warmup_count=100, by='position'):
+        if by not in ('position', 'trial'):
+            raise ValueError(f"Unknown warm-up trimming mode: {by!r}")
+        self.warmup_count = warmup_count
+        self.by = by
+        self.keys = []
+        self._index = {}
+        self.seen = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros((0, 8), dtype=np.int64)
+
+    def _group_ids(self, keys):
+        new = [key for key in keys if key not in self._index]
+        for key in new:
+            self._index[key] = len(self.keys)
+            self.keys.append(key)
+        if new:
+            self.seen = np.r_[self.seen, np.zeros(len(new), dtype=np.int64)]
+            self.counts = np.vstack([self.counts, np.zeros((len(new), 8), dtype=np.int64)])
+        return np.array([self._index[key] for key in keys], dtype=np.int64)
+
+    def update(self, chunk):
+        """
+        Add a chunk of trials (in log order) to the running counts.
+        """
+        grouped = chunk.groupby(['subject', 'session'], sort=False)
+        local = grouped.ngroup().to_numpy()
+        local_groups = grouped.size()
+        ids = self._group_ids(list(local_groups.index))[local]
+
+        if self.by == 'position':
+            position = self.seen[ids] + grouped.cumcount().to_numpy()
+        else:
+            position = chunk['trial'].to_numpy() - 1
+        cutoffs = warmup_cutoffs(local_groups.index.to_frame(index=False), self.warmup_count)
+        keep = position >= cutoffs[local]
+
+        chunk_counts = count_tensor_from_codes(ids[keep], len(self.keys), chunk['stimulus'].to_numpy()[keep],
+                                               chunk['r1'].to_numpy()[keep], chunk['r2'].to_numpy()[keep])
+        self.counts += chunk_counts.reshape(-1, 8)
+        self.seen += np.bincount(ids, minlength=len(self.keys))
+
+    def save(self, path, **meta):
+        """
+        Persist the running counts (plus any scalar metadata) to an .npz file.
+        """
+        np.savez(path, keys=np.array(self.keys, dtype=np.int64).reshape(-1, 2), seen=self.seen,
+                 counts=self.counts, config=_warmup_config(self.warmup_count, self.by), **meta)
+
+    @classmethod
+    def load(cls, path, warmup_count=100, by='position'):
+        """
+        Restore an accumulator saved with `save`. Returns the accumulator and its
+        metadata, or (None, None) if it was saved with other warm-up settings.
+        """
+        with np.load(path) as state:
+            state = dict(state)
+        if str(state.pop('config')) != _warmup_config(warmup_count, by):
+            return None, None
+        accumulator = cls(warmup_count, by=by)
+        accumulator._group_ids([tuple(key) for key in state.pop('keys').tolist()])
+        accumulator.seen = state.pop('seen')
+        accumulator.counts = state.pop('counts')
+        return accumulator, {key: value[()] for key, value in state.items()}
+
+    def result(self):
+        """
+        Sorted group keys and the (n_groups, 2, 2, 2) count tensor accumulated so far.
+        """
+        order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+        groups = pd.DataFrame([self.keys[i] for i in order], columns=['subject', 'session'])
+        return groups, self.counts[order].reshape(-1, 2, 2, 2)
+
+
+def _warmup_config(warmup_count, by):
+    if isinstance(warmup_count, (dict, pd.Series)):
+        warmup_count = sorted([int(s), int(n), int(w)] for (s, n), w in dict(warmup_count).items())
+    else:
+        warmup_count = int(warmup_count)
+    return json.dumps({'warmup_count': warmup_count, 'by': by})
+
+
+def _estimator_config(method, correction, n_boot):
+    return json.dumps({'method': method, 'correction': float(correction), 'n_boot': int(n_boot or 0)})
+
+
+def _read_chunks(f, header, chunksize):
+    usecols = ['subject', 'session', 'trial', 'stimulus', 'r1', 'r2']
+    return pd.read_csv(f, sep=",", header=None, names=header, usecols=usecols,
+                       dtype={col: TRIAL_SCHEMA[col] for col in usecols}, chunksize=chunksize)
+
+
+def stream_count_tensor(data_path, chunksize=500_000, warmup_count=100, by='position'):
+    """
+    Count tensor of a trial CSV read in chunks of `chunksize` rows.
+    """
+    accumulator = CountAccumulator(warmup_count, by=by)
+    with open(data_path, 'rb') as f:
+        header = f.readline().decode().strip().split(',')
+        for chunk in _read_chunks(f, header, chunksize):
+            accumulator.update(chunk)
+    return accumulator.result()
+
+
+def _tail_digest(data_path, end, n_bytes=1 << 16):
+    # Hash of the last bytes before `end`, used to check the log was only appended to
+    with open(data_path, 'rb') as f:
+        start = max(0, end - n_bytes)
+        f.seek(start)
+        return hashlib.sha256(f.read(end - start)).hexdigest()
+
+
+def incremental_count_tensor(data_path, state_path, chunksize=500_000, warmup_count=100, by='position',
+                             estimator=''):
+    """
+    Update the persisted counts in state_path with the trials appended to
+    data_path since the last run, reading only the new bytes of the log.
+
+    Falls back to a full pass if there is no state, the warm-up settings
+    differ, or the log was rewritten rather than appended to. Returns the
+    group keys, the count tensor and a boolean mask of the groups that
+    received new trials. `estimator` (see _estimator_config) is saved with
+    the counts; if it differs from the last run's, every group is marked,
+    as the outputs of that run came from another estimator.
+    """
+    size = Path(data_path).stat().st_size
+    accumulator, meta = None, None
+    if Path(state_path).exists():
+        accumulator, meta = CountAccumulator.load(state_path, warmup_count, by=by)
+    if accumulator is not None and not (meta['consumed'] <= size
+                                        and _tail_digest(data_path, meta['consumed']) == meta['digest']):
+        accumulator = None
+    if accumulator is None:
+        accumulator = CountAccumulator(warmup_count, by=by)
+
+    seen_before = accumulator.seen.copy()
+    with open(data_path, 'rb') as f:
+        header = f.readline().decode().strip().split(',')
+        if meta is not None and accumulator.keys:
+            f.seek(meta['consumed'])
+        if f.tell() < size:
+            for chunk in _read_chunks(f, header, chunksize):
+                accumulator.update(chunk)
+
+    accumulator.save(state_path, consumed=size, digest=_tail_digest(data_path, size), estimator=estimator)
+
+    touched = accumulator.seen != np.r_[seen_before, np.full(len(accumulator.seen) - len(seen_before), -1)]
+    if meta is None or str(meta.get('estimator')) != estimator:
+        touched[:] = True
+    groups, counts = accumulator.result()
+    order = sorted(range(len(accumulator.keys)), key=accumulator.keys.__getitem__)
+    return groups, counts, touched[order]
+
+
+def dprime_from_counts(counts, correction=0.5):
+    """
+    Compute d' from a (..., 2, 2, 2) count tensor indexed [stimulus, r1, r2].
+
+    `correction` is the Macmillan & Kaplan edge correction of z_transform.
     """
     # Right = signal, Left = noise
-    stim = group['stimulus']
-    resp = group['r1']
-    
-    # Hits: stimulus == 1 and response == 1
-    hits = ((stim == 1) & (resp == 1)).sum()
-    # Rightward stimuli total
-    n_signal = (stim == 1).sum()
+    type1 = counts.sum(axis=-1)
 
-    # False alarms: stimulus == 0 and response == 1
-    false_alarms = ((stim == 0) & (resp == 1)).sum()
-    # Leftward stimuli total
-    n_noise = (stim == 0).sum()
+    hits = type1[..., 1, 1]
+    n_signal = type1[..., 1, :].sum(axis=-1)
+    false_alarms = type1[..., 0, 1]
+    n_noise = type1[..., 0, :].sum(axis=-1)
 
-    # Handle edge cases (avoid div by 0 or z(0/1))
     # assumes chance level responses if no signal or no noise
-    p_hit = hits / n_signal if n_signal > 0 else 0.5 
-    p_fa = false_alarms / n_noise if n_noise > 0 else 0.5
-
-    z_hit = z_transform(p_hit, n_signal)
-    z_fa = z_transform(p_fa, n_noise)
+    z_hit = z_transform_counts(hits, n_signal, correction)
+    z_fa = z_transform_counts(false_alarms, n_noise, correction)
 
     return z_hit - z_fa
 
-def compute_meta_dprime(group):
+
+def meta_dprime_from_counts(counts, correction=0.5):
     """
-    Compute meta-d′ per participant per session from confidence-based pA–pD counts.
-    
-    Assumes 'stimulus', 'r1', and 'confidence' columns exist:
-    - stimulus: 0 (left) or 1 (right)
-    - r1: 0 or 1 (initial binary decision)
-    - confidence: 0 (low) or 1 (high)
+    Compute meta-d' from a (..., 2, 2, 2) count tensor indexed [stimulus, r1, r2],
+    using the high-confidence rates in areas A-D.
     """
-    stim = group['stimulus']
-    resp = group['r1']
-    conf = group['r2']
-    
-    d_prime_emp = compute_dprime(group)
-
-    # Define key high-confidence signal detection outcomes
-    pA = ((stim == 0) & (resp == 0) & (conf == 1)).sum() # High Conf | Correct rejection
-    pB = ((stim == 1) & (resp == 0) & (conf == 1)).sum() # High Conf | Miss
-    pC = ((stim == 0) & (resp == 1) & (conf == 1)).sum() # High Conf | False Alarm
-    pD = ((stim == 1) & (resp == 1) & (conf == 1)).sum() # High Conf | Hit
-    # Add total for each condition to compute probabilities
-    nCR = ((stim == 0) & (resp == 0)).sum()
-    nM  = ((stim == 1) & (resp == 0)).sum()
-    nFA = ((stim == 0) & (resp == 1)).sum()
-    nH  = ((stim == 1) & (resp == 1)).sum()
-    
+    type1 = counts.sum(axis=-1)
 
-    # Avoid div-by-zero and degenerate z-scores
-    p_high_CR = pA / nCR if nCR > 0 else 0.5
-    p_high_M  = pB / nM  if nM > 0 else 0.5
-    p_high_FA = pC / nFA if nFA > 0 else 0.5
-    p_high_H  = pD / nH  if nH > 0 else 0.5
+    # High confidence counts: CR (A), Miss (B), FA (C), Hit (D)
+    pA = counts[..., 0, 0, 1]
+    pB = counts[..., 1, 0, 1]
+    pC = counts[..., 0, 1, 1]
+    pD = counts[..., 1, 1, 1]
+    nCR = type1[..., 0, 0]
+    nM = type1[..., 1, 0]
+    nFA = type1[..., 0, 1]
+    nH = type1[..., 1, 1]
+
+    z_high_CR = z_transform_counts(pA, nCR, correction)
+    z_high_M = z_transform_counts(pB, nM, correction)
+    z_high_FA = z_transform_counts(pC, nFA, correction)
+    z_high_H = z_transform_counts(pD, nH, correction)
 
-    z_high_CR = z_transform(p_high_CR, nCR) # A
-    z_high_M  = z_transform(p_high_M, nM) # B
-    z_high_FA = z_transform(p_high_FA, nFA) # C
-    z_high_H  = z_transform(p_high_H, nH) # D
-    
     k2_low = (z_high_CR - z_high_M)
     k2_high = (z_high_H - z_high_FA)
-    
+
     # Meta-d′ as z(H) - z(FA) using confidence-conditioned responses
-    meta_d_prime = 0.5 * (k2_low + k2_high)
-    
-    # Rescale each k2 into Type-1 space using m-ratio
-    alpha = meta_d_prime / d_prime_emp 
-    k1_low  = alpha * k2_low
-    k1_high = alpha * k2_high
-    
-    # Final meta-d′ in Type-1 units
-    meta_d_prime_space1 = 0.5 * (k1_low + k1_high)
-    
-    # return meta_d_prime_space1
-    return meta_d_prime
+    return 0.5 * (k2_low + k2_high)
 
-    
-    
-    
-    
-    
-def main():
-    current_dir = Path(__file__).resolve().parent
-    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
-    save_path_session = current_dir.parent / "data" / "sensitivity_per_subject_per_session.csv"
-    save_path_subject = current_dir.parent / "data" / "sensitivity_per_subject.csv"
 
+def estimate_meta_dprime(counts, method='closed_form', correction=0.5):
+    """
+    meta-d' of a (..., 2, 2, 2) count tensor with the estimator named by method
+    ('closed_form' or 'mle', see sensitivity_table).
+    """
+    if method == 'closed_form':
+        return meta_dprime_from_counts(counts, correction)
+    if method == 'mle':
+        from pw_bdt.meta_d_mle import fit_meta_dprime_mle
+        return fit_meta_dprime_mle(counts, correction=correction)['meta_d_prime']
+    raise ValueError(f"Unknown meta-d' method: {method!r}")
 
-    df = pd.read_csv(data_path, sep=",")
-    df = discard_warmup_trials(df, warmup_count=100)
 
-    # Per session
-    result = df.groupby(['subject', 'session']).apply(
-        lambda g: pd.Series({
-            'd_prime': compute_dprime(g),
-            'meta_d_prime': compute_meta_dprime(g)
-        })
-    ).reset_index()
-
-    # Compute M-ratio
+def sensitivity_table(groups, counts, method='closed_form', correction=0.5):
+    """
+    Assemble d', meta-d' and M-ratio for every group of a count tensor.
+
+    method='closed_form' uses the z-difference approximation of
+    meta_dprime_from_counts, method='mle' the Maniscalco & Lau fit.
+    """
+    result = groups.copy()
+    result['d_prime'] = dprime_from_counts(counts, correction)
+    result['meta_d_prime'] = estimate_meta_dprime(counts, method=method, correction=correction)
     result['m_ratio'] = result['meta_d_prime'] / result['d_prime']
+    return result
 
-    print(result)
+
+def compute_dprime(group):
+    """
+        Function to compute d' per ppt per session
+    """
+    _, counts = build_count_tensor(group.assign(_group=0), keys=['_group'])
+    return dprime_from_counts(counts)[0]
+
+
+def compute_meta_dprime(group):
+    """
+    Compute meta-d′ per participant per session from confidence-based pA–pD counts.
+    
+    Assumes 'stimulus', 'r1', and 'confidence' columns exist:
+    - stimulus: 0 (left) or 1 (right)
+    - r1: 0 or 1 (initial binary decision)
+    - confidence: 0 (low) or 1 (high)
+    """
+    _, counts = build_count_tensor(group.assign(_group=0), keys=['_group'])
+    return meta_dprime_from_counts(counts)[0]
+
+
+def write_outputs(result, save_path_session, save_path_subject):
+    """
+    Save the session-level table and the per-subject averages across sessions.
+    """
     result.to_csv(save_path_session, index=False)
     print("Saved session-level data to", save_path_session)
 
@@ -127,11 +376,129 @@ def main():
     result_avg = result.groupby("subject")[["d_prime", "meta_d_prime", "m_ratio"]].mean().reset_index()
     result_avg.to_csv(save_path_subject, index=False)
     print("Saved subject-level averages to", save_path_subject)
-    
+    return result_avg
+
+
+def update_outputs(groups, counts, touched, save_path_session, save_path_subject, correction=0.5,
+                   method='closed_form', n_boot=None, max_workers=None):
+    """
+    Recompute only the touched groups and the per-subject averages of their
+    subjects, merging them into the existing output CSVs.
+
+    With n_boot, the CIs of every session of a touched subject are recomputed,
+    since bootstrap_sensitivity resamples a subject's sessions together.
+    Outputs are rewritten in full when every group is touched or when they
+    were written with other columns (e.g. with CIs when none are asked for now).
+    """
+    keys = ['subject', 'session']
+
+    def table(mask):
+        result = sensitivity_table(groups[mask].reset_index(drop=True), counts[mask], method=method,
+                                   correction=correction)
+        if n_boot:
+            from pw_bdt.bootstrap import bootstrap_sensitivity
+            result = result.merge(bootstrap_sensitivity(groups[mask].reset_index(drop=True), counts[mask],
+                                                        n_boot=n_boot, method=method, correction=correction,
+                                                        max_workers=max_workers),
+                                  on=keys)
+        return result
+
+    every_group = np.ones(len(groups), dtype=bool)
+    if touched.all() or not (Path(save_path_session).exists() and Path(save_path_subject).exists()):
+        return write_outputs(table(every_group), save_path_session, save_path_subject)
+
+    if n_boot:
+        touched = groups['subject'].isin(groups.loc[touched, 'subject']).to_numpy()
+    changed = table(touched)
+    previous = pd.read_csv(save_path_session, sep=",", float_precision='round_trip')
+    if list(previous.columns) != list(changed.columns):
+        return write_outputs(table(every_group), save_path_session, save_path_subject)
+
+    stale = pd.MultiIndex.from_frame(previous[keys]).isin(pd.MultiIndex.from_frame(changed[keys]))
+    result = pd.concat([previous[~stale], changed]).sort_values(keys, ignore_index=True)
+    result.to_csv(save_path_session, index=False)
+    print(f"Updated {len(changed)} session rows in", save_path_session)
+
+    subjects = changed['subject'].unique()
+    affected = result[result['subject'].isin(subjects)]
+    affected_avg = affected.groupby("subject")[["d_prime", "meta_d_prime", "m_ratio"]].mean().reset_index()
+    previous_avg = pd.read_csv(save_path_subject, sep=",", float_precision='round_trip')
+    result_avg = pd.concat([previous_avg[~previous_avg['subject'].isin(subjects)], affected_avg])
+    result_avg = result_avg.sort_values("subject", ignore_index=True)
+    result_avg.to_csv(save_path_subject, index=False)
+    print(f"Updated {len(affected_avg)} subject rows in", save_path_subject)
+    return result_avg
+
+
+def run_sensitivity(data_path, save_path_session, save_path_subject, warmup_count=100, by='position',
+                    correction=0.5, method='closed_form', n_boot=None, streaming=False, incremental=False,
+                    state_path=None, chunksize=500_000, max_workers=None):
+    """
+    Session-level and per-subject sensitivity tables of one trial log.
+
+    streaming reads the CSV in chunks, incremental only reads the trials
+    appended since the counts were last saved to state_path; otherwise the
+    trials come from the column store next to data_path. max_workers caps
+    the bootstrap's process pool.
+    """
+    if incremental:
+        # Only the groups with appended trials are recomputed
+        with stage('count_tensor', source='incremental') as st:
+            groups, counts, touched = incremental_count_tensor(data_path, state_path, chunksize=chunksize,
+                                                               warmup_count=warmup_count, by=by,
+                                                               estimator=_estimator_config(method, correction, n_boot))
+            st.set(groups=int(touched.sum()), rows=int(counts[touched].sum()))
+        record_groups('count_tensor', groups[touched], rows=counts[touched].sum(axis=(1, 2, 3)))
+        with stage('write_outputs'):
+            return update_outputs(groups, counts, touched, save_path_session, save_path_subject,
+                                  correction=correction, method=method, n_boot=n_boot, max_workers=max_workers)
+
+    # Per session
+    with stage('count_tensor', source='streaming' if streaming else 'store') as st:
+        if streaming:
+            # Bounded memory: only per-group counts are held, never the whole trial log
+            groups, counts = stream_count_tensor(data_path, chunksize=chunksize, warmup_count=warmup_count, by=by)
+        else:
+            groups, counts = store_count_tensor(open_store(data_path), warmup_count=warmup_count, by=by)
+        st.set(groups=len(groups), rows=int(counts.sum()))
+    record_groups('count_tensor', groups, rows=counts.sum(axis=(1, 2, 3)))
+
+    with stage('sensitivity_table', method=method) as st:
+        result = sensitivity_table(groups, counts, method=method, correction=correction)
+        st.set(rows=len(result))
+
+    if n_boot:
+        # Bootstrap CIs next to the point estimates
+        from pw_bdt.bootstrap import bootstrap_sensitivity
+        with stage('bootstrap', n_boot=n_boot) as st:
+            result = result.merge(bootstrap_sensitivity(groups, counts, n_boot=n_boot, method=method,
+                                                         correction=correction, max_workers=max_workers),
+                                  on=['subject', 'session'])
+            st.set(rows=len(result))
+
+    print(result)
+    with stage('write_outputs'):
+        return write_outputs(result, save_path_session, save_path_subject)
+
+
+def main(streaming=False, incremental=False, chunksize=500_000, n_boot=None, method='closed_form',
+         profile_path=None):
+    current_dir = Path(__file__).resolve().parent
+    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
+    save_path_session = current_dir.parent / "data" / "sensitivity_per_subject_per_session.csv"
+    save_path_subject = current_dir.parent / "data" / "sensitivity_per_subject.csv"
+    state_path = current_dir.parent / "data" / "sensitivity_counts.npz"
+
+    # profile_path collects per-stage/per-group timings as JSON lines (see pw_bdt.instrumentation)
+    with profiled(profile_path), stage('run_sensitivity'):
+        run_sensitivity(data_path, save_path_session, save_path_subject, method=method, n_boot=n_boot,
+                        streaming=streaming, incremental=incremental, state_path=state_path, chunksize=chunksize)
+
     df2 = pd.read_csv(save_path_session, sep=",")
     
+    #from pw_bdt.helpers.plots import plot_dprime_per_sub_per_session
     #plot_dprime_per_sub_per_session(df2)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,91 @@
+"""
+Robustness sweep of d′/meta-d′ over warm-up cutoffs and z-transform corrections.
+
+The trials are read and grouped once. Every trial is assigned to the
+interval of the warm-up grid its position falls in, and one bincount gives
+per-group, per-interval counts. The counts kept by cutoff w are then a
+suffix sum over the intervals (total minus the prefix sum below w), and the
+corrections broadcast through dprime_from_counts / meta_dprime_from_counts
+as an extra leading axis.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from pw_bdt.sensitivity_fits import (
+    count_tensor_from_codes, dprime_from_counts, meta_dprime_from_counts, store_positions)
+from pw_bdt.trial_store import open_store
+
+
+def warmup_count_grid(store, warmup_counts, by='position'):
+    """
+    Count tensors of a TrialStore for every warm-up cutoff in one pass.
+
+    Returns the groups and an array of shape (len(warmup_counts), n_groups, 2, 2, 2)
+    equal to store_count_tensor(store, w, by) for each w, in the given order.
+    """
+    warmup_counts = np.asarray(warmup_counts, dtype=np.int64)
+    grid = np.unique(warmup_counts)
+    codes = store.group_codes()
+    n_groups = len(store.groups)
+
+    # interval i holds positions in [grid[i-1], grid[i]); interval 0 those below grid[0]
+    interval = np.searchsorted(grid, store_positions(store, codes, by), side='right')
+    n_intervals = len(grid) + 1
+    counts = count_tensor_from_codes(codes.astype(np.int64) * n_intervals + interval, n_groups * n_intervals,
+                                     store.column('stimulus'), store.column('r1'), store.column('r2'))
+    counts = counts.reshape(n_groups, n_intervals, 2, 2, 2)
+
+    # kept by cutoff grid[j]: every trial in intervals j+1.. (reverse cumulative sum)
+    kept = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    kept = np.moveaxis(kept, 1, 0)
+    return store.groups.copy(), kept[np.searchsorted(grid, warmup_counts)]
+
+
+def sweep_table(groups, counts, warmup_counts, corrections):
+    """
+    Tidy (correction × warm-up × subject-session) table of d′, meta-d′ and M-ratio
+    from a (len(warmup_counts), n_groups, 2, 2, 2) warm-up grid of count tensors.
+    """
+    corrections = np.asarray(corrections, dtype=float)
+    # (n_corrections, 1, 1) broadcasts against the (n_warmup, n_groups) rates
+    correction = corrections[:, None, None]
+    d_prime = dprime_from_counts(counts, correction)
+    meta_d_prime = meta_dprime_from_counts(counts, correction)
+    shape = d_prime.shape
+
+    n_settings = shape[0] * shape[1]
+    result = pd.DataFrame({
+        'correction': np.repeat(corrections, shape[1] * shape[2]),
+        'warmup_count': np.tile(np.repeat(warmup_counts, shape[2]), shape[0]),
+    })
+    for column in groups.columns:
+        result[column] = np.tile(groups[column].to_numpy(), n_settings)
+    result['n_trials'] = np.tile(counts.sum(axis=(2, 3, 4)).reshape(-1), shape[0])
+    result['d_prime'] = d_prime.reshape(-1)
+    result['meta_d_prime'] = meta_d_prime.reshape(-1)
+    result['m_ratio'] = result['meta_d_prime'] / result['d_prime']
+    return result
+
+
+def sweep_sensitivity(data_path, warmup_counts=(0, 50, 100, 150, 200), corrections=(0.25, 0.5, 1.0),
+                      by='position'):
+    """
+    sensitivity_table for every warm-up cutoff and correction, from one read of the trial log.
+    """
+    groups, counts = warmup_count_grid(open_store(data_path), warmup_counts, by=by)
+    return sweep_table(groups, counts, warmup_counts, corrections)
+
+
+def main():
+    current_dir = Path(__file__).resolve().parent
+    data_path = current_dir.parent / "data" / "rawChoiceData.txt"
+    save_path = current_dir.parent / "data" / "sensitivity_sweep.csv"
+
+    result = sweep_sensitivity(data_path)
+    result.to_csv(save_path, index=False)
+    print("Saved sensitivity sweep to", save_path)
+    print(result.groupby(['correction', 'warmup_count'])[['d_prime', 'meta_d_prime', 'm_ratio']].mean())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Synthetic choice/confidence data from the models fitted in this package.
+
+Every subject-session has a type-1 observer with sensitivity d' whose
+criterion is the precision-weighted combination of the prior and payoff
+criteria (precision_weighted_fits):
+
+    x ~ N(+-d'/2, 1),  r1 = x > k1,  k1 = alpha_pv * (alpha_p * k_p + alpha_v * k_v) + gamma
+
+Confidence follows the meta-d' model of meta_d_mle (Maniscalco & Lau):
+with c' = meta-d' * k1 / d' and confidence criteria c' - conf_low and
+c' + conf_high,
+
+    P(high | r1 = 1, S) = Q(c2_high - mu_S) / Q(c' - mu_S)
+    P(high | r1 = 0, S) = Phi(c2_low - mu_S) / Phi(c' - mu_S),   mu_S = +-meta-d'/2
+
+so d' is recovered from the type-1 rates and meta-d' by the MLE of
+meta_d_mle. The closed-form meta_dprime_from_counts is not the estimator
+of this model and is biased on these data (by about -0.3 for the default
+random_cohort). Response times are shifted log-normals that shorten with
+the distance of x from the criterion (RT1) and with high confidence (RT2).
+
+Trials are written in the rawChoiceData column schema, streamed chunk by
+chunk to a CSV and/or a TrialStore. Every subject draws from its own child
+of SeedSequence(seed), so the data depend only on the seed, not on the
+chunk size.
+
+    python -m pw_bdt.simulate out/synthetic.csv --subjects 1000 --store
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy.special import log_ndtr
+from pw_bdt.precision_weighted_fits import criterion_components, precision_weighted_k1
+from pw_bdt.trial_store import GROUP_KEYS, TRIAL_SCHEMA, _source_stamp, default_store_path
+
+# Prior and payoff ratios of the seven sessions of the bundled experiment
+LOCKE_SCHEDULE = pd.DataFrame({
+    'session': np.arange(1, 8),
+    'pR_pL': [1.0, 3.0, 0.33, 1.0, 1.0, 3.0, 0.33],
+    'vR_vL': [1.0, 1.0, 1.0, 2.0, 0.5, 0.5, 2.0],
+})
+
+# Observer parameters and their defaults; d_prime and meta_d_prime are required
+PARAM_DEFAULTS = {
+    'alpha_pv': 1.0, 'alpha_p': 1.0, 'alpha_v': 1.0, 'gamma': 0.0,
+    'conf_low': 0.5, 'conf_high': 0.5,
+    # RT1 = rt_t0 + exp(rt_mu - rt_slope * |x - k1| + rt_sigma * e1)
+    # RT2 = RT1 + exp(rt2_mu - rt2_high * r2 + rt_sigma * e2)
+    'rt_t0': 0.3, 'rt_mu': -1.0, 'rt_slope': 0.3, 'rt_sigma': 0.4, 'rt2_mu': -1.2, 'rt2_high': 0.3,
+}
+
+
+def random_cohort(n_subjects, seed=0):
+    """
+    Observer parameters for n_subjects drawn around the values of the bundled cohort.
+    """
+    rng = np.random.default_rng(seed)
+    d_prime = rng.normal(1.0, 0.3, n_subjects).clip(0.2)
+    return pd.DataFrame({
+        'subject': np.arange(1, n_subjects + 1),
+        'd_prime': d_prime,
+        'meta_d_prime': rng.normal(0.8 * d_prime, 0.2),
+        'alpha_p': rng.uniform(0.3, 1.0, n_subjects),
+        'alpha_v': rng.uniform(0.3, 1.0, n_subjects),
+        'alpha_pv': rng.uniform(0.7, 1.0, n_subjects),
+        'gamma': rng.normal(0.0, 0.1, n_subjects),
+        'conf_low': rng.uniform(0.2, 1.0, n_subjects),
+        'conf_high': rng.uniform(0.2, 1.0, n_subjects),
+    })
+
+
+def session_table(params, schedule=LOCKE_SCHEDULE, n_trials=700):
+    """
+    One row per subject-session with its condition, trial count, observer
+    parameters and the response probabilities of the generative model.
+
+    params has a 'subject' column (and optionally 'session', for parameters
+    that change between sessions); schedule has session, pR_pL and vR_vL.
+    Columns missing from params take their PARAM_DEFAULTS value.
+    """
+    keys = ['subject', 'session'] if 'session' in params else ['subject']
+    subjects = pd.DataFrame({'subject': np.unique(params['subject'])})
+    sessions = subjects.merge(schedule, how='cross').merge(params, on=keys, how='left')
+    sessions = sessions.sort_values(GROUP_KEYS, ignore_index=True)
+    for name, value in PARAM_DEFAULTS.items():
+        if name not in sessions:
+            sessions[name] = value
+    if 'n_trials' not in sessions:
+        sessions['n_trials'] = n_trials
+
+    d = sessions['d_prime'].to_numpy(dtype=float)
+    meta_d = sessions['meta_d_prime'].to_numpy(dtype=float)
+    k_p, k_v = criterion_components(d, sessions['pR_pL'], sessions['vR_vL'])
+    k1 = precision_weighted_k1(sessions['alpha_pv'].to_numpy(), sessions['alpha_p'].to_numpy(),
+                               sessions['alpha_v'].to_numpy(), k_p, k_v, sessions['gamma'].to_numpy())
+    sessions['k1'] = k1
+    sessions['p_right'] = sessions['pR_pL'] / (1 + sessions['pR_pL'])
+
+    # meta-d' model: type-1 criterion with the same normalised bias, on the meta-d' axis
+    c_meta = np.divide(meta_d * k1, d, out=np.zeros(len(d)), where=d != 0)
+    mu = np.array([-0.5, 0.5]) * meta_d[:, None]                                     # (G, S)
+    c2_high = (c_meta + sessions['conf_high'].to_numpy())[:, None]
+    c2_low = (c_meta - sessions['conf_low'].to_numpy())[:, None]
+    high_r1 = np.exp(log_ndtr(mu - c2_high) - log_ndtr(mu - c_meta[:, None]))
+    high_r0 = np.exp(log_ndtr(c2_low - mu) - log_ndtr(c_meta[:, None] - mu))
+    for s in (0, 1):
+        sessions[f'p_high_s{s}_r0'] = high_r0[:, s]
+        sessions[f'p_high_s{s}_r1'] = high_r1[:, s]
+    return sessions
+
+
+def _subject_blocks(sessions, chunk_size):
+    # Row ranges of `sessions` covering whole subjects and about chunk_size trials each
+    subject_start = np.flatnonzero(np.r_[True, np.diff(sessions['subject'].to_numpy()) != 0])
+    subject_end = np.r_[subject_start[1:], len(sessions)]
+    trials = np.r_[0, np.cumsum(sessions['n_trials'].to_numpy())]
+    blocks, start = [], 0
+    for i, end in enumerate(subject_end):
+        if trials[end] - trials[subject_start[start]] >= chunk_size or i == len(subject_end) - 1:
+            blocks.append((subject_start[start], end, subject_start[start:i + 1], subject_end[start:i + 1]))
+            start = i + 1
+    return blocks
+
+
+def simulate_trials(sessions, chunk_size=1_000_000, seed=0):
+    """
+    Generate the trials of a session_table in chunks of whole subjects.
+
+    Yields dicts of column arrays in TRIAL_SCHEMA dtypes, rows sorted by
+    (subject, session, trial).
+    """
+    n_trials = sessions['n_trials'].to_numpy()
+    subject_seeds = np.random.SeedSequence(seed).spawn(sessions['subject'].nunique())
+    p_high = sessions[[f'p_high_s{s}_r{r}' for s in (0, 1) for r in (0, 1)]].to_numpy()
+    col = {name: sessions[name].to_numpy() for name in
+           ['subject', 'session', 'pR_pL', 'vR_vL', 'd_prime', 'k1', 'p_right'] + list(PARAM_DEFAULTS)}
+
+    subject_no = 0
+    for first, last, starts, ends in _subject_blocks(sessions, chunk_size):
+        g = np.repeat(np.arange(first, last), n_trials[first:last])
+        n = len(g)
+        offsets = np.r_[0, np.cumsum(n_trials[first:last])]
+
+        # Every subject fills its slice of the chunk from its own generator
+        u_stim, u_conf = np.empty(n), np.empty(n)
+        noise = np.empty((n, 3))
+        for s, e in zip(starts, ends):
+            rng = np.random.default_rng(subject_seeds[subject_no])
+            subject_no += 1
+            rows = slice(offsets[s - first], offsets[e - first])
+            rng.random(out=u_stim[rows])
+            rng.random(out=u_conf[rows])
+            rng.standard_normal(out=noise[rows])
+
+        stimulus = u_stim < col['p_right'][g]
+        x = (stimulus - 0.5) * col['d_prime'][g] + noise[:, 0]
+        r1 = x > col['k1'][g]
+        r2 = u_conf < p_high[g, 2 * stimulus + r1]
+
+        rt1 = col['rt_t0'][g] + np.exp(col['rt_mu'][g] - col['rt_slope'][g] * np.abs(x - col['k1'][g])
+                                       + col['rt_sigma'][g] * noise[:, 1])
+        rt2 = rt1 + np.exp(col['rt2_mu'][g] - col['rt2_high'][g] * r2 + col['rt_sigma'][g] * noise[:, 2])
+        # four decimals, as in the bundled data, so the CSV and the store hold the same values
+        rt1, rt2 = np.round(rt1, 4), np.round(rt2, 4)
+
+        yield {
+            'subject': col['subject'][g].astype(TRIAL_SCHEMA['subject']),
+            'session': col['session'][g].astype(TRIAL_SCHEMA['session']),
+            'pR_pL': col['pR_pL'][g].astype(TRIAL_SCHEMA['pR_pL']),
+            'vR_vL': col['vR_vL'][g].astype(TRIAL_SCHEMA['vR_vL']),
+            'trial': (np.arange(n) - np.repeat(offsets[:-1], n_trials[first:last]) + 1).astype(TRIAL_SCHEMA['trial']),
+            'stimulus': stimulus.astype(TRIAL_SCHEMA['stimulus']),
+            'r1': r1.astype(TRIAL_SCHEMA['r1']),
+            'r2': r2.astype(TRIAL_SCHEMA['r2']),
+            'RT1': rt1.astype(TRIAL_SCHEMA['RT1']),
+            'RT2': rt2.astype(TRIAL_SCHEMA['RT2']),
+        }
+
+
+def _ascii_table(strings):
+    return np.array([text.encode() for text in strings]).view(np.uint8).reshape(len(strings), -1)
+
+
+# Fixed-width pieces of a CSV row: ',stimulus,r1,r2,' by 4 * stimulus + 2 * r1 + r2,
+# and the four decimals of an RT followed by its delimiter
+_RESPONSE_TABLE = _ascii_table([f",{code >> 2},{code >> 1 & 1},{code & 1}," for code in range(8)])
+_FRACTION_TABLE = {end: _ascii_table([f".{i:04d}{end}" for i in range(10_000)]) for end in (',', '\n')}
+_DIGIT_TABLE = _ascii_table([f"{i:04d}" for i in range(10_000)])
+
+
+def _digits(values):
+    # ASCII digits of non-negative integers, right-aligned, and the mask of the columns in use
+    values = np.asarray(values, dtype=np.int64)
+    width = len(str(int(values.max()))) if len(values) else 1
+    n_blocks = -(-width // 4)
+    chars = np.empty((len(values), 4 * n_blocks), dtype=np.uint8)
+    rest = values
+    for block in range(n_blocks - 1, -1, -1):
+        chars[:, 4 * block:4 * block + 4] = np.take(_DIGIT_TABLE, rest % 10_000, axis=0)
+        rest = rest // 10_000
+    n_digits = 1 + np.searchsorted(10 ** np.arange(1, 4 * n_blocks), values, side='right')
+    return chars, np.arange(4 * n_blocks) >= 4 * n_blocks - n_digits[:, None]
+
+
+def csv_bytes(chunk):
+    """
+    CSV rows of a simulate_trials chunk, formatted with array operations.
+
+    Every field is built as a block of ASCII columns (plus, for numbers of
+    varying length, a mask of the columns in use); the kept characters, read
+    row by row, are the CSV text. About 15 times faster than DataFrame.to_csv
+    and 10 times faster than np.savetxt, which format value by value
+    (benchmarks/bench_simulate_csv.py), so writing no longer dominates
+    simulations of millions of trials.
+    """
+    n = len(chunk['trial'])
+    keys = np.column_stack([chunk['subject'], chunk['session']])
+    starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+    group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    prefixes = np.array([f"{chunk['subject'][i]},{chunk['session'][i]},{float(chunk['pR_pL'][i])!r},"
+                         f"{float(chunk['vR_vL'][i])!r},".encode() for i in starts])
+    prefix = np.take(prefixes.view(np.uint8).reshape(len(prefixes), -1), group, axis=0)
+
+    responses = 4 * chunk['stimulus'].astype(np.int64) + 2 * chunk['r1'] + chunk['r2']
+    ten_thousandths = [np.rint(chunk[name].astype(np.float64) * 1e4).astype(np.int64) for name in ('RT1', 'RT2')]
+    pieces = [(prefix, prefix != 0), _digits(chunk['trial']),
+              (np.take(_RESPONSE_TABLE, responses, axis=0), None)]
+    for rt, end in zip(ten_thousandths, (',', '\n')):
+        pieces += [_digits(rt // 10_000), (np.take(_FRACTION_TABLE[end], rt % 10_000, axis=0), None)]
+
+    widths = np.cumsum([0] + [chars.shape[1] for chars, _ in pieces])
+    chars = np.empty((n, widths[-1]), dtype=np.uint8)
+    keep = np.ones((n, widths[-1]), dtype=bool)
+    for (piece, mask), start, stop in zip(pieces, widths[:-1], widths[1:]):
+        chars[:, start:stop] = piece
+        if mask is not None:
+            keep[:, start:stop] = mask
+    return chars[keep].tobytes()
+
+
+def write_simulation(sessions, csv_path=None, store_path=None, chunk_size=1_000_000, seed=0):
+    """
+    Stream simulated trials to a rawChoiceData-style CSV and/or a TrialStore.
+
+    When both are written, the store is stamped with the CSV, so open_store
+    and load_trials on the CSV use it without re-ingesting.
+    Returns the number of trials written.
+    """
+    if csv_path is None and store_path is None:
+        raise ValueError("Nothing to write: give csv_path and/or store_path")
+    n_rows = int(sessions['n_trials'].sum())
+
+    columns = {}
+    if store_path is not None:
+        store_path = Path(store_path)
+        store_path.mkdir(parents=True, exist_ok=True)
+        columns = {name: np.lib.format.open_memmap(store_path / f"{name}.npy", mode='w+', dtype=dtype,
+                                                   shape=(n_rows,))
+                   for name, dtype in TRIAL_SCHEMA.items()}
+    csv_file = open(csv_path, 'wb') if csv_path is not None else None
+
+    try:
+        if csv_file is not None:
+            csv_file.write((','.join(TRIAL_SCHEMA) + '\n').encode())
+        row = 0
+        for chunk in simulate_trials(sessions, chunk_size=chunk_size, seed=seed):
+            n = len(chunk['trial'])
+            for name, values in chunk.items():
+                if name in columns:
+                    columns[name][row:row + n] = values
+            if csv_file is not None:
+                csv_file.write(csv_bytes(chunk))
+            row += n
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+
+    if store_path is not None:
+        for values in columns.values():
+            values.flush()
+        offsets = np.r_[0, np.cumsum(sessions['n_trials'].to_numpy())]
+        np.savez(store_path / "index.npz", subject=sessions['subject'].to_numpy(),
+                 session=sessions['session'].to_numpy(), offsets=offsets)
+        meta = {
+            'n_rows': n_rows,
+            'columns': {name: np.dtype(dtype).name for name, dtype in TRIAL_SCHEMA.items()},
+            'source': str(csv_path) if csv_path is not None else f'simulate(seed={seed})',
+            'source_stamp': _source_stamp(csv_path) if csv_path is not None else None,
+        }
+        (store_path / "schema.json").write_text(json.dumps(meta, indent=2))
+    return n_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate choice/confidence trials in the rawChoiceData schema.")
+    parser.add_argument('output', type=Path, help="CSV path (the ground truth goes next to it)")
+    parser.add_argument('--subjects', type=int, default=10)
+    parser.add_argument('--trials', type=int, default=700, help="trials per session")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chunk-size', type=int, default=1_000_000)
+    parser.add_argument('--store', action='store_true', help="also write the columnar store")
+    parser.add_argument('--no-csv', action='store_true', help="only write the columnar store")
+    args = parser.parse_args()
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    sessions = session_table(random_cohort(args.subjects, seed=args.seed), n_trials=args.trials)
+    truth_path = args.output.with_name(args.output.stem + '_truth.csv')
+    sessions.to_csv(truth_path, index=False)
+
+    start = time.perf_counter()
+    n_rows = write_simulation(sessions, csv_path=None if args.no_csv else args.output,
+                              store_path=default_store_path(args.output) if args.store or args.no_csv else None,
+                              chunk_size=args.chunk_size, seed=args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"Simulated {n_rows:,} trials in {elapsed:.2f}s ({n_rows / elapsed:,.0f} trials/s)")
+    print("Saved ground truth to", truth_path)
+
+
+if __name__ == "__main__":
+    main()
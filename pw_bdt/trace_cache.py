@@ -0,0 +1,153 @@
+import hashlib
+import json
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+def hash_frame(df):
+    """
+    Content hash of a DataFrame (column names, dtypes and values, not the index).
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def hash_spec(*parts):
+    """
+    Hash of JSON-serialisable settings (model options, priors, sampler kwargs, ...).
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class TraceCache:
+    """
+    Content-addressed store of NetCDF traces.
+
+    Entries are keyed on (model_hash, data_hash) and stored as
+    `<model_hash>_<data_hash>.nc`, so traces of the same model on other data
+    can be found for warm starts. Reading an entry refreshes its mtime, and
+    eviction removes entries older than max_age_s and then the least recently
+    used ones until the cache fits in max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_age_s=None, max_bytes=None, hash_len=16):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_age_s = max_age_s
+        self.max_bytes = max_bytes
+        self.hash_len = hash_len
+
+    def key(self, model_hash, data_hash):
+        return model_hash[:self.hash_len], data_hash[:self.hash_len]
+
+    def path(self, key):
+        return self.cache_dir / f"{key[0]}_{key[1]}.nc"
+
+    def get(self, key):
+        """
+        Cached InferenceData for key, or None.
+        """
+        path = self.path(key)
+        if not path.exists():
+            return None
+        path.touch()
+        import arviz as az
+        return az.from_netcdf(path)
+
+    def put(self, key, trace):
+        import arviz as az
+        az.to_netcdf(trace, self.path(key))
+        self.evict()
+
+    def nearest(self, key):
+        """
+        Most recently used trace of the same model fitted to different data, or None.
+        """
+        candidates = [p for p in self.cache_dir.glob(f"{key[0]}_*.nc") if p != self.path(key)]
+        if not candidates:
+            return None
+        import arviz as az
+        return az.from_netcdf(max(candidates, key=lambda p: p.stat().st_mtime))
+
+    def entries(self):
+        """
+        Cached files, least recently used first.
+        """
+        return sorted(self.cache_dir.glob("*.nc"), key=lambda p: p.stat().st_mtime)
+
+    def evict(self):
+        entries = self.entries()
+        if self.max_age_s is not None:
+            cutoff = time.time() - self.max_age_s
+            for p in [p for p in entries if p.stat().st_mtime < cutoff]:
+                p.unlink()
+                entries.remove(p)
+        if self.max_bytes is not None:
+            total = sum(p.stat().st_size for p in entries)
+            while entries and total > self.max_bytes:
+                p = entries.pop(0)
+                total -= p.stat().st_size
+                p.unlink()
+
+
+def warm_start_values(trace, model):
+    """
+    Posterior means of a cached trace as initial values for the free variables
+    of `model` whose shapes still match.
+    """
+    initial_point = model.initial_point()
+    values = {}
+    for rv in model.free_RVs:
+        if rv.name not in trace.posterior:
+            continue
+        mean = trace.posterior[rv.name].mean(("chain", "draw")).values
+        value_var = model.rvs_to_values[rv]
+        if np.shape(mean) == np.shape(initial_point[value_var.name]):
+            values[rv.name] = mean
+    return values
+
+
+def _unconstrained_draws(trace, model, value_vars):
+    # Posterior draws of every value variable, mapped through its transform: (n_draws, size) blocks
+    import pytensor
+    import pytensor.tensor as pt
+    rvs = {model.rvs_to_values[rv].name: rv for rv in model.free_RVs}
+    blocks = []
+    for value_var in value_vars:
+        rv = rvs[value_var.name]
+        draws = trace.posterior[rv.name].stack(sample=("chain", "draw")).transpose("sample", ...).values
+        transform = model.rvs_to_transforms.get(rv)
+        if transform is not None:
+            constrained = pt.tensor(dtype=value_var.dtype, shape=(None,) * draws.ndim)
+            draws = pytensor.function([constrained], transform.forward(constrained, *rv.owner.inputs))(draws)
+        blocks.append(draws.reshape(len(draws), -1))
+    return np.concatenate(blocks, axis=1)
+
+
+def warm_start_step(trace, model, initial_weight=10):
+    """
+    NUTS step for `model` that resumes the adaptation of a cached NUTS trace:
+    the diagonal mass matrix starts from the posterior variances of the
+    trace in the unconstrained space (worth `initial_weight` draws), and the
+    step size from its final adapted value. None if the trace has no step
+    sizes or does not cover every free variable of `model` with its shape.
+    """
+    initial_point = model.initial_point()
+    if ('sample_stats' not in trace.groups() or 'step_size' not in trace.sample_stats
+            or set(warm_start_values(trace, model)) != {rv.name for rv in model.free_RVs}):
+        return None
+    import pymc as pm
+    from pymc.step_methods.hmc.quadpotential import QuadPotentialDiagAdapt
+    value_vars = model.continuous_value_vars
+    draws = _unconstrained_draws(trace, model, value_vars)
+    if draws.shape[1] != sum(np.size(initial_point[v.name]) for v in value_vars):
+        return None
+    potential = QuadPotentialDiagAdapt(draws.shape[1], draws.mean(axis=0), draws.var(axis=0), initial_weight)
+    step_size = float(trace.sample_stats['step_size'].isel(draw=-1).mean())
+    # NUTS starts from step_scale / n ** 0.25
+    return pm.NUTS(vars=value_vars, model=model, potential=potential,
+                   step_scale=step_size * draws.shape[1] ** 0.25)
@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# Compact on-disk dtypes for the rawChoiceData columns (see data/info.txt).
+# The reward/prior ratios stay float64 so that values such as 0.33 round-trip exactly.
+TRIAL_SCHEMA = {
+    'subject': np.int16,
+    'session': np.int16,
+    'pR_pL': np.float64,
+    'vR_vL': np.float64,
+    'trial': np.int32,
+    'stimulus': np.int8,
+    'r1': np.int8,
+    'r2': np.int8,
+    'RT1': np.float32,
+    'RT2': np.float32,
+}
+
+GROUP_KEYS = ['subject', 'session']
+
+
+def default_store_path(csv_path):
+    """
+    Location of the columnar store built from a trial CSV, e.g. data/rawChoiceData.store
+    """
+    csv_path = Path(csv_path)
+    return csv_path.with_suffix('.store')
+
+
+def _source_stamp(csv_path):
+    stat = Path(csv_path).stat()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def ingest_csv(csv_path, store_path=None):
+    """
+    Convert a trial CSV into a columnar store: one .npy file per column in
+    TRIAL_SCHEMA dtypes, rows sorted by (subject, session) and an index of
+    the row offsets of every subject-session group.
+
+    The files are written to a temporary directory next to the store and
+    moved into it with os.replace, schema.json last, so readers never see a
+    partly written file and concurrent ingests of one CSV (e.g. batch jobs
+    on the same cohort) do not corrupt each other.
+    """
+    csv_path = Path(csv_path)
+    store_path = Path(store_path) if store_path is not None else default_store_path(csv_path)
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+    # stamped before reading, so a CSV that changes during the ingest leaves the store stale
+    source_stamp = _source_stamp(csv_path)
+
+    df = pd.read_csv(csv_path, sep=",", dtype=TRIAL_SCHEMA)
+    # stable sort keeps the within-session trial order of the log
+    df = df.sort_values(GROUP_KEYS, kind='mergesort', ignore_index=True)
+
+    with tempfile.TemporaryDirectory(prefix=f".{store_path.name}.", dir=store_path.parent) as tmp:
+        tmp = Path(tmp)
+        for col, dtype in TRIAL_SCHEMA.items():
+            np.save(tmp / f"{col}.npy", df[col].to_numpy(dtype=dtype))
+
+        keys = df[GROUP_KEYS].to_numpy()
+        starts = np.flatnonzero(np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)])
+        offsets = np.r_[starts, len(df)]
+        np.savez(tmp / "index.npz",
+                 subject=keys[starts, 0], session=keys[starts, 1], offsets=offsets)
+
+        meta = {
+            'n_rows': len(df),
+            'columns': {col: np.dtype(dtype).name for col, dtype in TRIAL_SCHEMA.items()},
+            'source': str(csv_path),
+            'source_stamp': source_stamp,
+        }
+        (tmp / "schema.json").write_text(json.dumps(meta, indent=2))
+
+        store_path.mkdir(exist_ok=True)
+        for name in [f"{col}.npy" for col in TRIAL_SCHEMA] + ["index.npz", "schema.json"]:
+            os.replace(tmp / name, store_path / name)
+    return TrialStore(store_path)
+
+
+class TrialStore:
+    """
+    Read-only view of a columnar trial store written by ingest_csv.
+
+    Columns are memory-mapped on access, so only the columns and
+    subject-session groups that are actually requested are read from disk.
+    """
+
+    def __init__(self, store_path):
+        self.path = Path(store_path)
+        self.meta = json.loads((self.path / "schema.json").read_text())
+        index = np.load(self.path / "index.npz")
+        self.groups = pd.DataFrame({'subject': index['subject'], 'session': index['session']})
+        self.offsets = index['offsets']
+        self._group_pos = {key: i for i, key in enumerate(zip(index['subject'].tolist(),
+                                                              index['session'].tolist()))}
+
+    @property
+    def n_rows(self):
+        return self.meta['n_rows']
+
+    @property
+    def columns(self):
+        return list(self.meta['columns'])
+
+    def is_current(self, csv_path):
+        """
+        True if the store was built from the current version of csv_path.
+        """
+        return self.meta['source_stamp'] == _source_stamp(csv_path)
+
+    def column(self, name):
+        """
+        Memory-mapped array of one column.
+        """
+        if name not in self.meta['columns']:
+            raise KeyError(f"Column {name!r} not in trial store {self.path}")
+        return np.load(self.path / f"{name}.npy", mmap_mode='r')
+
+    def group_slice(self, subject, session):
+        """
+        Row slice of one subject-session group.
+        """
+        i = self._group_pos[(subject, session)]
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def group_codes(self):
+        """
+        Group number of every row, in the order of self.groups.
+        """
+        return np.repeat(np.arange(len(self.groups)), np.diff(self.offsets))
+
+    def load(self, columns=None, groups=None):
+        """
+        Load a DataFrame with the requested columns, optionally restricted to an
+        iterable of (subject, session) groups.
+        """
+        columns = self.columns if columns is None else list(columns)
+        arrays = {col: self.column(col) for col in columns}
+
+        if groups is not None:
+            slices = [self.group_slice(*key) for key in groups]
+            return pd.DataFrame({col: np.concatenate([arr[s] for s in slices]) if slices
+                                 else arr[:0] for col, arr in arrays.items()})
+        return pd.DataFrame({col: np.asarray(arr) for col, arr in arrays.items()})
+
+
+def open_store(csv_path, store_path=None):
+    """
+    Open the columnar store for csv_path, (re)building it if it is missing or
+    older than the CSV.
+    """
+    store_path = Path(store_path) if store_path is not None else default_store_path(csv_path)
+    if (store_path / "schema.json").exists():
+        store = TrialStore(store_path)
+        if store.is_current(csv_path):
+            return store
+    return ingest_csv(csv_path, store_path)
+
+
+def load_trials(csv_path, columns=None, groups=None):
+    """
+    Load trials from csv_path via its columnar store.
+    """
+    return open_store(csv_path).load(columns=columns, groups=groups)
@@ -0,0 +1,71 @@
+"""
+HierarchicalFitter compiles its model once, and its padded subject slots
+leave the posterior of the cohort's parameters as build_model has it.
+"""
+import numpy as np
+import pytest
+from pathlib import Path
+from scipy.stats import norm
+from pw_bdt.hierarchical_bayesian_model import HYPER_PRIOR_MU_D, PRIOR_MCE, build_model, load_sensitivity
+from pw_bdt.hierarchical_fitter import HierarchicalFitter
+
+pytest.importorskip('pymc')
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "sensitivity_per_subject_per_session.csv"
+SIGMA_BOUNDS = (0.1, 5.0)
+
+
+def cohort(n_subjects):
+    df, _ = load_sensitivity(DATA_PATH)
+    df = df[df['subject_idx'] < n_subjects].reset_index(drop=True)
+    return df
+
+
+def interval(x, lower=SIGMA_BOUNDS[0], upper=SIGMA_BOUNDS[1]):
+    # value of a Uniform(lower, upper) variable on PyMC's unconstrained scale
+    return np.log(x - lower) - np.log(upper - x)
+
+
+def test_second_fit_reuses_the_compiled_model():
+    fitter = HierarchicalFitter(capacity=8, chains=1)
+    kwargs = dict(draws=20, tune=20, random_seed=0, cores=1, progressbar=False, compute_convergence_checks=False)
+    fitter.fit(cohort(6), **kwargs)
+    trace = fitter.fit(cohort(4), **kwargs)
+    assert fitter.n_builds == 1
+    assert list(trace.posterior['subject'].values) == list(range(1, 5))
+
+    # a cohort above the capacity rebuilds with twice the slots
+    fitter.set_data(cohort(9))
+    assert (fitter.n_builds, fitter.capacity) == (2, 16)
+
+
+@pytest.mark.parametrize('likelihood', ['observations', 'sufficient'])
+def test_padded_slots_only_add_their_prior(likelihood):
+    # log p(theta, pad | data) = log p(theta | data) + log p(pad | hyperparameters) up to the
+    # same normalising constant, so the padding integrates out of every other parameter
+    n_subjects, capacity = 5, 9
+    df = cohort(n_subjects)
+    fitter = HierarchicalFitter(capacity=capacity, likelihood=likelihood)
+    fitter.set_data(df)
+    reference = build_model(df, n_subjects, likelihood=likelihood)
+    padded_logp = fitter.model.compile_logp(jacobian=False)
+    reference_logp = reference.compile_logp(jacobian=False)
+
+    rng = np.random.default_rng(0)
+    differences = []
+    for _ in range(5):
+        sigma_type1, sigma_type2 = rng.uniform(0.2, 2.0, 2)
+        d_subj = rng.normal(HYPER_PRIOR_MU_D, sigma_type1, capacity)
+        meta_d_subj = rng.normal(PRIOR_MCE * d_subj, sigma_type2)
+        sigma_subj = rng.uniform(0.2, 2.0, capacity)
+        point = {'sigma_type1_interval__': interval(sigma_type1), 'sigma_type2_interval__': interval(sigma_type2),
+                 'd_subj': d_subj, 'meta_d_subj': meta_d_subj, 'sigma_subj_interval__': interval(sigma_subj)}
+        cohort_point = {**point, 'd_subj': d_subj[:n_subjects], 'meta_d_subj': meta_d_subj[:n_subjects],
+                        'sigma_subj_interval__': point['sigma_subj_interval__'][:n_subjects]}
+
+        pad = slice(n_subjects, capacity)
+        pad_prior = (norm.logpdf(d_subj[pad], HYPER_PRIOR_MU_D, sigma_type1).sum()
+                     + norm.logpdf(meta_d_subj[pad], PRIOR_MCE * d_subj[pad], sigma_type2).sum()
+                     - (capacity - n_subjects) * np.log(SIGMA_BOUNDS[1] - SIGMA_BOUNDS[0]))
+        differences.append(padded_logp(point) - pad_prior - reference_logp(cohort_point))
+    np.testing.assert_allclose(differences, 0.0, atol=1e-8)
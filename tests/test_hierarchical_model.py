@@ -0,0 +1,29 @@
+"""
+The sufficient-statistic likelihood of the hierarchical model against the
+per-session Normal likelihood.
+"""
+import numpy as np
+import pytest
+from pathlib import Path
+from pw_bdt.hierarchical_bayesian_model import build_model, load_sensitivity
+
+pytest.importorskip('pymc')
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "sensitivity_per_subject_per_session.csv"
+
+
+@pytest.mark.parametrize('parameterization', ['centered', 'non_centered'])
+def test_sufficient_likelihood_matches_observations(parameterization):
+    # the log densities may only differ by a constant, so the posteriors are the same
+    df, subjects = load_sensitivity(DATA_PATH)
+    models = {likelihood: build_model(df, len(subjects), parameterization=parameterization, likelihood=likelihood)
+              for likelihood in ('observations', 'sufficient')}
+    logps = {likelihood: model.compile_logp() for likelihood, model in models.items()}
+
+    rng = np.random.default_rng(0)
+    initial_point = models['observations'].initial_point()
+    differences = []
+    for _ in range(5):
+        point = {name: value + rng.normal(0, 0.5, np.shape(value)) for name, value in initial_point.items()}
+        differences.append(logps['sufficient'](point) - logps['observations'](point))
+    assert np.ptp(differences) < 1e-8
@@ -0,0 +1,53 @@
+"""
+Response probabilities of the joint type-1/type-2 observer against a NumPy
+Maniscalco & Lau reference.
+"""
+import numpy as np
+import pytest
+from scipy.stats import norm
+from pw_bdt.joint_hierarchical_model import response_probabilities
+
+pytest.importorskip('pymc')
+
+S = np.array([-0.5, 0.5])[None, :]
+# PyMC's normal_lcdf approximates log Phi below z = -1 to a relative error of about 3e-8
+RTOL = 1e-7
+
+
+def reference_probabilities(d_prime, meta_d_prime, c1, c2_low, c2_high):
+    d, m, c, lo, hi = (np.asarray(x, dtype=float)[:, None] for x in (d_prime, meta_d_prime, c1, c2_low, c2_high))
+    p_r1 = norm.cdf(d * S - c)
+    # M&L: confidence given r1 uses the meta-d' evidence distributions on that side of c1
+    p_high_r1 = norm.sf(hi - m * S) / norm.sf(c - m * S)
+    p_high_r0 = norm.cdf(lo - m * S) / norm.cdf(c - m * S)
+    return np.stack([(1 - p_r1) * (1 - p_high_r0), (1 - p_r1) * p_high_r0,
+                     p_r1 * (1 - p_high_r1), p_r1 * p_high_r1], axis=-1)
+
+
+def parameters(n_sessions=50, seed=0):
+    rng = np.random.default_rng(seed)
+    d_prime = rng.uniform(0.2, 3.0, n_sessions)
+    meta_d_prime = d_prime * rng.uniform(0.0, 1.5, n_sessions)
+    c1 = rng.normal(0, 0.5, n_sessions)
+    return d_prime, meta_d_prime, c1, c1 - rng.uniform(0.1, 2.0, n_sessions), c1 + rng.uniform(0.1, 2.0, n_sessions)
+
+
+def test_probabilities_sum_to_one_per_stimulus():
+    p = response_probabilities(*parameters()).eval()
+    assert p.shape == (50, 2, 4)
+    assert (p >= 0).all()
+    np.testing.assert_allclose(p.sum(axis=-1), 1.0, atol=1e-12)
+
+
+def test_probabilities_match_maniscalco_lau_reference():
+    params = parameters()
+    np.testing.assert_allclose(response_probabilities(*params).eval(), reference_probabilities(*params),
+                               rtol=RTOL, atol=1e-14)
+
+
+def test_ideal_metacognition_is_one_sdt_observer():
+    # with meta-d' = d', P(r1 = 1, high | S) is the tail of the type-1 evidence beyond c2_high
+    d_prime, _, c1, c2_low, c2_high = parameters()
+    p = response_probabilities(d_prime, d_prime, c1, c2_low, c2_high).eval()
+    np.testing.assert_allclose(p[..., 3], norm.sf(c2_high[:, None] - d_prime[:, None] * S), rtol=RTOL)
+    np.testing.assert_allclose(p[..., 1], norm.cdf(c2_low[:, None] - d_prime[:, None] * S), rtol=RTOL)
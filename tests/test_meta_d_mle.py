@@ -0,0 +1,64 @@
+"""
+Analytic gradient and parameter recovery of the batched meta-d' MLE.
+"""
+import numpy as np
+import pytest
+from scipy.optimize import check_grad
+from scipy.stats import norm
+from pw_bdt.meta_d_mle import fit_meta_dprime_mle, negative_log_likelihood
+
+
+def simulate_counts(d_prime, meta_d_prime, c1, spread_low, spread_high, n_per_stimulus, rng):
+    """
+    Multinomial (n_groups, 2, 2, 2) counts of Maniscalco & Lau observers: type-1
+    responses from d' and c1, confidence from meta-d' with c' = meta-d' * c1 / d'.
+    """
+    counts = np.empty((len(d_prime), 2, 2, 2), dtype=np.int64)
+    for i, (d, m, c, lo, hi) in enumerate(zip(d_prime, meta_d_prime, c1, spread_low, spread_high)):
+        c_meta = m * c / d
+        for s, sign in enumerate((-0.5, 0.5)):
+            p_r1 = norm.sf(c - sign * d)
+            p_high_r1 = norm.sf(c_meta + hi - sign * m) / norm.sf(c_meta - sign * m)
+            p_high_r0 = norm.cdf(c_meta - lo - sign * m) / norm.cdf(c_meta - sign * m)
+            p = [(1 - p_r1) * (1 - p_high_r0), (1 - p_r1) * p_high_r0, p_r1 * (1 - p_high_r1), p_r1 * p_high_r1]
+            counts[i, s] = rng.multinomial(n_per_stimulus, p).reshape(2, 2)
+    return counts
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_gradient_matches_finite_differences(seed):
+    rng = np.random.default_rng(seed)
+    kappa = rng.normal(0, 0.3, 1)
+    n_high, n_low = rng.integers(1, 200, (2, 1, 2, 2)) + 0.25
+    params = np.column_stack([rng.uniform(-1, 3, 1), rng.normal(0, 0.5, (1, 2))])
+
+    def nll(x):
+        return negative_log_likelihood(x.reshape(1, 3), kappa, n_high, n_low)[0].sum()
+
+    def grad(x):
+        return negative_log_likelihood(x.reshape(1, 3), kappa, n_high, n_low)[1].ravel()
+
+    error = check_grad(nll, grad, params.ravel())
+    assert error < 1e-5 * max(1.0, np.linalg.norm(grad(params.ravel())))
+
+
+def test_recovers_meta_dprime_of_simulated_observers():
+    rng = np.random.default_rng(0)
+    n_groups = 40
+    d_prime = rng.uniform(0.8, 2.0, n_groups)
+    meta_d_prime = d_prime * rng.uniform(0.4, 1.2, n_groups)
+    counts = simulate_counts(d_prime, meta_d_prime, rng.normal(0, 0.2, n_groups), rng.uniform(0.3, 1.0, n_groups),
+                             rng.uniform(0.3, 1.0, n_groups), 50_000, rng)
+
+    fit = fit_meta_dprime_mle(counts, batch_size=16)
+    np.testing.assert_allclose(fit['meta_d_prime'], meta_d_prime, atol=0.05)
+
+
+def test_batches_agree_with_a_single_fit():
+    rng = np.random.default_rng(1)
+    d_prime = rng.uniform(0.8, 2.0, 30)
+    counts = simulate_counts(d_prime, 0.8 * d_prime, rng.normal(0, 0.2, 30), np.full(30, 0.5), np.full(30, 0.5),
+                             300, rng)
+    batched = fit_meta_dprime_mle(counts, batch_size=7)['meta_d_prime']
+    joint = fit_meta_dprime_mle(counts, batch_size=len(counts))['meta_d_prime']
+    np.testing.assert_allclose(batched, joint, atol=1e-4)
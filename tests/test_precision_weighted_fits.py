@@ -0,0 +1,57 @@
+"""
+Parameter recovery of the precision-weighted criterion model and the
+reporting of fits that end on an edge of PARAM_BOUNDS.
+"""
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from pw_bdt.precision_weighted_fits import (
+    PARAM_BOUNDS, PARAMS, criterion_components, fit_cohort, params_at_bound, precision_weighted_k1)
+
+# prior and payoff ratios of the simulated sessions; in the last two both shift the criterion the same way
+CONDITIONS = [(1.0, 1.0), (2.0, 1.0), (0.5, 1.0), (1.0, 2.0), (1.0, 0.5), (2.0, 2.0), (0.5, 0.5)]
+
+
+def simulate_cells(truth, n_per_stimulus, rng):
+    """
+    Cells, (n_cells, 2, 2) stimulus x r1 counts and d' of observers with the given parameters.
+    """
+    rows, counts, d_primes = [], [], []
+    for subject, params in truth.iterrows():
+        d_prime = rng.uniform(0.8, 1.6)
+        for session, (pR_pL, vR_vL) in enumerate(CONDITIONS, start=1):
+            k_p, k_v = criterion_components(d_prime, pR_pL, vR_vL)
+            k1 = precision_weighted_k1(*params[PARAMS[:3]], k_p, k_v, params['gamma'])
+            p_left = norm.cdf(k1 + d_prime / 2)
+            p_right = norm.cdf(d_prime / 2 - k1)
+            left = rng.binomial(n_per_stimulus, p_left)
+            right = rng.binomial(n_per_stimulus, p_right)
+            rows.append({'subject': subject, 'session': session, 'pR_pL': pR_pL, 'vR_vL': vR_vL})
+            counts.append([[left, n_per_stimulus - left], [n_per_stimulus - right, right]])
+            d_primes.append(d_prime)
+    return pd.DataFrame(rows), np.array(counts), np.array(d_primes)
+
+
+def test_fit_cohort_recovers_simulated_parameters():
+    rng = np.random.default_rng(0)
+    truth = pd.DataFrame({'alpha_pv': rng.uniform(0.6, 1.4, 4), 'alpha_p': rng.uniform(0.3, 1.0, 4),
+                          'alpha_v': rng.uniform(0.3, 1.0, 4), 'gamma': rng.normal(0, 0.2, 4)},
+                         index=pd.Index(np.arange(1, 5), name='subject'))
+    cells, counts, d_prime = simulate_cells(truth, 50_000, rng)
+
+    fits = fit_cohort(cells, counts, d_prime, max_workers=1).set_index('subject')
+    assert fits['converged'].all()
+    assert (fits['at_bound'] == '').all()
+    np.testing.assert_allclose(fits[PARAMS].to_numpy(), truth[PARAMS].to_numpy(), atol=0.05)
+
+
+def test_params_at_bound():
+    interior = np.array([1.0, 0.5, -0.5, 3.0])
+    assert params_at_bound(interior) == []
+
+    lower, upper = PARAM_BOUNDS['alpha_pv']
+    assert params_at_bound(np.array([upper, 0.5, -0.5, 3.0])) == ['alpha_pv']
+    assert params_at_bound(np.array([lower, PARAM_BOUNDS['alpha_p'][1], PARAM_BOUNDS['alpha_v'][0], 0.0])) == [
+        'alpha_pv', 'alpha_p', 'alpha_v']
+    # gamma is unbounded
+    assert params_at_bound(np.array([1.0, 0.5, -0.5, 1e6])) == []
@@ -0,0 +1,64 @@
+"""
+RT-binned count tensors against a groupby / qcut reference, and the
+treatment of RT cells without trials.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+from pw_bdt.rt_sensitivity import rt_count_tensor, rt_sensitivity_table
+from pw_bdt.sensitivity_fits import discard_warmup_trials
+from pw_bdt.trial_store import open_store
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "rawChoiceData.txt"
+WARMUP = 100
+
+
+@pytest.fixture(scope='module')
+def trimmed(tmp_path_factory):
+    # Every group keeps WARMUP + a multiple of 12 trials, so 3 or 4 bins hold
+    # equal counts and qcut's bin edges never fall on a rank
+    df = pd.read_csv(DATA_PATH, sep=",")
+    position = df.groupby(['subject', 'session']).cumcount()
+    size = df.groupby(['subject', 'session'])['trial'].transform('size')
+    df = df[position < WARMUP + (size - WARMUP) // 12 * 12].reset_index(drop=True)
+    path = tmp_path_factory.mktemp("rt") / "rawChoiceData.txt"
+    df.to_csv(path, index=False)
+    return path, discard_warmup_trials(df, warmup_count=WARMUP)
+
+
+def reference_counts(df, n_bins, rt_columns):
+    df = df.copy()
+    for column in rt_columns:
+        df[f'{column}_bin'] = df.groupby(['subject', 'session'])[column].transform(
+            lambda rt: pd.qcut(rt.rank(method='first'), n_bins, labels=False))
+    cells = ['subject', 'session'] + [f'{c}_bin' for c in rt_columns]
+    levels = [sorted(df['subject'].unique()), sorted(df['session'].unique())] + [range(n_bins)] * len(rt_columns)
+    counts = df.groupby(cells + ['stimulus', 'r1', 'r2']).size()
+    counts = counts.reindex(pd.MultiIndex.from_product(levels + [range(2)] * 3), fill_value=0)
+    rt_mean = df.groupby(cells)[list(rt_columns)].mean().reindex(pd.MultiIndex.from_product(levels))
+    return counts, rt_mean
+
+
+@pytest.mark.parametrize('n_bins, rt_columns', [(4, ('RT1',)), (3, ('RT2',)), (3, ('RT1', 'RT2'))])
+def test_rt_count_tensor_matches_groupby_qcut(trimmed, n_bins, rt_columns):
+    path, df = trimmed
+    groups, counts, rt_mean = rt_count_tensor(open_store(path), n_bins=n_bins, rt_columns=rt_columns,
+                                              warmup_count=WARMUP)
+    expected_counts, expected_mean = reference_counts(df, n_bins, rt_columns)
+
+    # every subject has the same sessions, so the product index has no extra groups
+    assert len(groups) * n_bins ** len(rt_columns) == len(expected_mean)
+    np.testing.assert_array_equal(counts.reshape(-1), expected_counts.to_numpy())
+    for column in rt_columns:
+        np.testing.assert_allclose(rt_mean[column].reshape(-1), expected_mean[column].to_numpy())
+
+
+def test_empty_rt_cells_have_no_sensitivity(trimmed):
+    path, _ = trimmed
+    groups, counts, rt_mean = rt_count_tensor(open_store(path), n_bins=3, rt_columns=('RT1', 'RT2'))
+    result = rt_sensitivity_table(groups, counts, rt_mean)
+    empty = result['n_trials'] == 0
+    assert empty.any()
+    assert result.loc[empty, ['d_prime', 'meta_d_prime', 'm_ratio', 'accuracy']].isna().all().all()
+    assert result.loc[~empty, 'd_prime'].notna().all()
@@ -0,0 +1,97 @@
+"""
+The sensitivity tables of every count engine must match the committed CSVs
+in data/ byte for byte, and per-group warm-up mappings must give the same
+counts whichever engine tabulates them.
+"""
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+from pw_bdt.sensitivity_fits import (
+    build_count_tensor, discard_warmup_trials, run_sensitivity, sensitivity_table, store_count_tensor,
+    stream_count_tensor, write_outputs)
+from pw_bdt.trial_store import open_store
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+SESSION_CSV = DATA_DIR / "sensitivity_per_subject_per_session.csv"
+SUBJECT_CSV = DATA_DIR / "sensitivity_per_subject.csv"
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    # a private copy, so the column store is built next to it and not in data/
+    path = tmp_path / "rawChoiceData.txt"
+    shutil.copyfile(DATA_DIR / "rawChoiceData.txt", path)
+    return path
+
+
+def assert_matches_committed(session_path, subject_path):
+    assert Path(session_path).read_bytes() == SESSION_CSV.read_bytes()
+    assert Path(subject_path).read_bytes() == SUBJECT_CSV.read_bytes()
+
+
+@pytest.mark.parametrize('engine', ['store', 'streaming', 'incremental'])
+def test_engine_matches_committed_csvs(data_path, tmp_path, engine):
+    session_path, subject_path = tmp_path / "session.csv", tmp_path / "subject.csv"
+    run_sensitivity(data_path, session_path, subject_path, streaming=engine == 'streaming',
+                    incremental=engine == 'incremental', state_path=tmp_path / "counts.npz", chunksize=50_000)
+    assert_matches_committed(session_path, subject_path)
+
+
+def test_dataframe_route_matches_committed_csvs(data_path, tmp_path):
+    df = pd.read_csv(data_path, sep=",")
+    groups, counts = build_count_tensor(discard_warmup_trials(df, warmup_count=100))
+    session_path, subject_path = tmp_path / "session.csv", tmp_path / "subject.csv"
+    write_outputs(sensitivity_table(groups, counts), session_path, subject_path)
+    assert_matches_committed(session_path, subject_path)
+
+
+def test_incremental_append_matches_committed_csvs(data_path, tmp_path):
+    # first run on the log without its last sessions, then on the appended log
+    lines = data_path.read_bytes().splitlines(keepends=True)
+    split = len(lines) - 3 * len(lines) // 10
+    full = b''.join(lines)
+    data_path.write_bytes(b''.join(lines[:split]))
+
+    session_path, subject_path = tmp_path / "session.csv", tmp_path / "subject.csv"
+    kwargs = dict(incremental=True, state_path=tmp_path / "counts.npz", chunksize=50_000)
+    run_sensitivity(data_path, session_path, subject_path, **kwargs)
+    with open(data_path, 'ab') as f:
+        f.write(full[len(b''.join(lines[:split])):])
+    run_sensitivity(data_path, session_path, subject_path, **kwargs)
+    assert_matches_committed(session_path, subject_path)
+
+
+@pytest.mark.parametrize('by', ['position', 'trial'])
+def test_warmup_mapping_counts_agree_across_engines(data_path, by):
+    groups, _ = store_count_tensor(open_store(data_path), warmup_count=0)
+    rng = np.random.default_rng(0)
+    # every other group gets its own cutoff; the rest are missing from the mapping and keep all trials
+    warmup = {(int(s), int(n)): int(w) for (s, n), w in zip(groups.to_numpy()[::2],
+                                                             rng.integers(0, 300, len(groups)))}
+
+    store_groups, store_counts = store_count_tensor(open_store(data_path), warmup_count=warmup, by=by)
+    stream_groups, stream_counts = stream_count_tensor(data_path, chunksize=7_000, warmup_count=warmup, by=by)
+    df = pd.read_csv(data_path, sep=",")
+    df_groups, df_counts = build_count_tensor(discard_warmup_trials(df, warmup_count=warmup, by=by))
+
+    pd.testing.assert_frame_equal(stream_groups, store_groups, check_dtype=False)
+    pd.testing.assert_frame_equal(df_groups, store_groups, check_dtype=False)
+    np.testing.assert_array_equal(stream_counts, store_counts)
+    np.testing.assert_array_equal(df_counts, store_counts)
+
+
+def test_incremental_rewrites_outputs_when_estimator_changes(data_path, tmp_path):
+    # a second incremental run with another meta-d' method must not keep rows of the first
+    session_path, subject_path = tmp_path / "session.csv", tmp_path / "subject.csv"
+    kwargs = dict(incremental=True, state_path=tmp_path / "counts.npz", chunksize=50_000)
+    run_sensitivity(data_path, session_path, subject_path, method='closed_form', **kwargs)
+    with open(data_path, 'ab') as f:
+        f.write(data_path.read_bytes().splitlines(keepends=True)[-1])
+    run_sensitivity(data_path, session_path, subject_path, method='mle', **kwargs)
+
+    full_session_path, full_subject_path = tmp_path / "full_session.csv", tmp_path / "full_subject.csv"
+    run_sensitivity(data_path, full_session_path, full_subject_path, method='mle')
+    assert session_path.read_bytes() == full_session_path.read_bytes()
+    assert subject_path.read_bytes() == full_subject_path.read_bytes()
@@ -0,0 +1,54 @@
+"""
+The one-pass warm-up grid of sensitivity_sweep against a separate
+store_count_tensor / sensitivity_table run for every setting.
+"""
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+from pw_bdt.sensitivity_fits import sensitivity_table, store_count_tensor
+from pw_bdt.sensitivity_sweep import sweep_table, warmup_count_grid
+from pw_bdt.trial_store import open_store
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "rawChoiceData.txt"
+
+# unsorted, with a repeat, cutoffs next to each other (positions equal to a cutoff are kept)
+# and one past the end of every session
+WARMUP_COUNTS = [100, 0, 1, 99, 100, 250, 5000]
+CORRECTIONS = [0.25, 0.5, 1.0]
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    path = tmp_path_factory.mktemp("sweep") / "rawChoiceData.txt"
+    shutil.copyfile(DATA_PATH, path)
+    return open_store(path)
+
+
+@pytest.mark.parametrize('by', ['position', 'trial'])
+def test_warmup_grid_matches_store_count_tensor(store, by):
+    groups, grid = warmup_count_grid(store, WARMUP_COUNTS, by=by)
+    assert grid.shape[0] == len(WARMUP_COUNTS)
+    for warmup_count, counts in zip(WARMUP_COUNTS, grid):
+        expected_groups, expected = store_count_tensor(store, warmup_count=warmup_count, by=by)
+        pd.testing.assert_frame_equal(groups, expected_groups)
+        np.testing.assert_array_equal(counts, expected)
+    assert grid[-1].sum() == 0
+
+
+@pytest.mark.parametrize('by', ['position', 'trial'])
+def test_sweep_table_matches_sensitivity_table(store, by):
+    groups, grid = warmup_count_grid(store, WARMUP_COUNTS, by=by)
+    result = sweep_table(groups, grid, WARMUP_COUNTS, CORRECTIONS)
+    assert len(result) == len(CORRECTIONS) * len(WARMUP_COUNTS) * len(groups)
+
+    columns = ['subject', 'session', 'd_prime', 'meta_d_prime', 'm_ratio']
+    for (correction, warmup_count), rows in result.groupby(['correction', 'warmup_count'], sort=False):
+        _, counts = store_count_tensor(store, warmup_count=warmup_count, by=by)
+        expected = sensitivity_table(groups, counts, correction=correction)
+        # the repeated cutoff gives two identical blocks
+        for start in range(0, len(rows), len(groups)):
+            block = rows[columns].iloc[start:start + len(groups)].reset_index(drop=True)
+            pd.testing.assert_frame_equal(block, expected[columns])
+        np.testing.assert_array_equal(rows['n_trials'].to_numpy()[:len(groups)], counts.sum(axis=(1, 2, 3)))
@@ -0,0 +1,51 @@
+"""
+The array-built CSV of simulate against DataFrame.to_csv, and recovery of the
+simulated observers by sensitivity_table.
+"""
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from pw_bdt.sensitivity_fits import sensitivity_table, store_count_tensor
+from pw_bdt.simulate import csv_bytes, random_cohort, session_table, simulate_trials, write_simulation
+from pw_bdt.trial_store import TRIAL_SCHEMA, open_store
+
+
+def read_rows(text):
+    return pd.read_csv(io.BytesIO(text), header=None, names=list(TRIAL_SCHEMA), dtype=TRIAL_SCHEMA)
+
+
+@pytest.mark.parametrize('n_subjects, n_trials', [(3, 700), (2, 12_345)])
+def test_csv_bytes_parses_like_to_csv(n_subjects, n_trials):
+    # 12_345 trials give trial numbers of five digits, past one block of _DIGIT_TABLE
+    sessions = session_table(random_cohort(n_subjects, seed=1), n_trials=n_trials)
+    chunk = next(simulate_trials(sessions, seed=1))
+    expected = pd.DataFrame(chunk).to_csv(header=False, index=False, float_format='%.4f').encode()
+
+    pd.testing.assert_frame_equal(read_rows(csv_bytes(chunk)), read_rows(expected))
+    pd.testing.assert_frame_equal(read_rows(csv_bytes(chunk)), pd.DataFrame(chunk))
+
+
+def test_simulated_sensitivity_is_recovered(tmp_path):
+    # d' away from random_cohort's floor of 0.2, where the prior criterion ln(3) / d' puts
+    # nearly every response on one side and d' is barely identified
+    params = random_cohort(5, seed=2)
+    params['d_prime'] = np.linspace(0.6, 1.6, 5)
+    params['meta_d_prime'] = 0.8 * params['d_prime']
+    sessions = session_table(params, n_trials=20_000)
+    csv_path = tmp_path / "synthetic.csv"
+    write_simulation(sessions, csv_path=csv_path, store_path=tmp_path / "synthetic.store",
+                     chunk_size=100_000, seed=2)
+
+    # the CSV parses back to the trials of the store it is stamped on
+    store = open_store(csv_path)
+    assert store.path == tmp_path / "synthetic.store"
+    pd.testing.assert_frame_equal(store.load(), pd.read_csv(csv_path, dtype=TRIAL_SCHEMA))
+
+    groups, counts = store_count_tensor(store, warmup_count=0)
+    result = sensitivity_table(groups, counts, method='mle')
+    truth = groups.merge(sessions, on=['subject', 'session'], how='left')
+    # about 20_000 trials per session: the standard error of d' is near 0.02, of meta-d' near 0.04
+    np.testing.assert_allclose(result['d_prime'], truth['d_prime'], atol=0.08)
+    np.testing.assert_allclose(result['meta_d_prime'], truth['meta_d_prime'], atol=0.16)
+    assert abs((result['d_prime'] - truth['d_prime']).mean()) < 0.02
@@ -0,0 +1,48 @@
+"""
+Gradient of the type-1 likelihood, and its PyTensor evaluation in the PyMC model.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+from pw_bdt.multinomial_decision_model_type_1_fits import (
+    CONDITION_KEYS, build_pymc_model, condition_counts, criterion_k1, optimal_criterion, type1_log_likelihood,
+    type1_log_likelihood_grad)
+from pw_bdt.sensitivity_fits import discard_warmup_trials
+
+DATA_PATH = Path(__file__).resolve().parent.parent / "data" / "rawChoiceData.txt"
+
+
+@pytest.fixture(scope='module')
+def cells():
+    df = pd.read_csv(DATA_PATH, sep=",", usecols=CONDITION_KEYS + ['stimulus', 'r1', 'r2'])
+    return condition_counts(discard_warmup_trials(df, warmup_count=100))
+
+
+def test_gradient_matches_finite_differences(cells):
+    _, counts, d_prime = cells
+    rng = np.random.default_rng(0)
+    for k1 in (rng.normal(0, 0.5, len(counts)), rng.normal(0, 4, len(counts))):
+        h = 1e-6
+        numeric = (type1_log_likelihood(k1 + h, counts, d_prime)
+                   - type1_log_likelihood(k1 - h, counts, d_prime)) / (2 * h)
+        np.testing.assert_allclose(type1_log_likelihood_grad(k1, counts, d_prime), numeric,
+                                   rtol=1e-5, atol=1e-4)
+
+
+def test_pymc_likelihood_matches_numpy(cells):
+    pytest.importorskip('pymc')
+    cell_keys, counts, d_prime = cells
+    model = build_pymc_model(cell_keys, counts, d_prime)
+    potential = model.compile_logp(vars=model.potentials)
+
+    subjects, subject_idx = np.unique(cell_keys['subject'].to_numpy(), return_inverse=True)
+    k_opt = optimal_criterion(d_prime, cell_keys['pR_pL'].to_numpy(), cell_keys['vR_vL'].to_numpy())
+    rng = np.random.default_rng(0)
+    # the wide draws push the criteria far into the normal tails, where PyMC's normal_lcdf
+    # uses its own asymptotic expansion; both agree to well below 1e-8 there
+    for scale in (0.5, 5.0):
+        alpha, gamma = rng.normal(1, scale, len(subjects)), rng.normal(0, scale, len(subjects))
+        expected = type1_log_likelihood(criterion_k1(alpha[subject_idx], gamma[subject_idx], k_opt),
+                                        counts, d_prime).sum()
+        np.testing.assert_allclose(potential({'alpha': alpha, 'gamma': gamma}), expected, rtol=1e-8)